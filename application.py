@@ -1,28 +1,45 @@
 import os
 import time
-import json
 import uuid
 import hashlib
+import io
 import tempfile
 import numpy as np
 import re
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from collections import defaultdict, deque
-from typing import Dict, List, Tuple, Optional, Set, Any
-from flask import Flask, render_template, request, jsonify, make_response, send_file
+from typing import List, Tuple, Optional, Set, Any
+from flask import Flask, render_template, request, jsonify, make_response, send_file, abort, has_request_context
 from flask_socketio import SocketIO, emit
 from flask_cors import CORS
-from openai import OpenAI
 import tiktoken
 from pathlib import Path
 from scipy.io import wavfile
 import base64
-import requests
 from modules.rag_system import RAGSystem
 from modules.speech_processor import SpeechProcessor
+from modules.tts_pipeline import SentenceAudioPipeline
+from modules.single_flight import SingleFlight
+from modules.semantic_cache import SemanticCache
+from modules.bounded_cache import BoundedCache
+from modules.audio_store import AudioStore, AUDIO_MIMETYPES, audio_format, audio_duration
+from modules.static_bundles import StaticBundleStore
+from modules.reading_dictionary import ReadingDictionary
+from modules.static_qa_data import get_suggestion_ids
+from modules.emotion_engine import engine as emotion_engine
+from modules.emotion_engine import CONTEXT_PHRASES, EMOTION_KEYWORDS, normalize_text as normalize_emotion_text
+from modules import tracing
+from modules import metrics
+from modules import backends
+from modules.http_pool import pool as http_pool
+from modules.azure_synthesizer import AzureSynthesizerPool
+from modules.tts_router import TtsRouter
+from modules.tts_engines import (TtsEngineRegistry, AzureSpeechEngine, OpenAITtsEngine,
+                                 elevenlabs_engine_from_env, azure_engine_from_env)
+from modules import circuit_breaker
 from survey_integration import SurveyManager, SURVEY_QUESTIONS
 from pathlib import Path
-import azure.cognitiveservices.speech as speechsdk
 from dotenv import load_dotenv
 
 # 環境変数を読み込み
@@ -51,215 +68,77 @@ socketio = SocketIO(
 ENABLE_USER_TYPE_SELECTION = False  # True: CERA用（属性選択あり）, False: Futaba用（属性選択なし）
 DEFAULT_USER_TYPE = 'default'  # 属性選択無効時のデフォルト値
 
+# ====== 🆕 ストリーミング応答設定 ======
+# True: クライアントがstream=trueを送ってきた場合、RAG応答をresponse_chunkで逐次送信
+ENABLE_RESPONSE_STREAMING = os.getenv('ENABLE_RESPONSE_STREAMING', 'true').lower() == 'true'
+# True: ストリーミング中に文が完成するたびに音声合成し、audio_segmentで順番に送信
+ENABLE_SENTENCE_TTS_PIPELINE = os.getenv('ENABLE_SENTENCE_TTS_PIPELINE', 'true').lower() == 'true'
+# True: 応答ペイロードに処理段階ごとの所要時間（debug.timings）を添付
+ENABLE_DEBUG_TIMINGS = os.getenv('ENABLE_DEBUG_TIMINGS', 'false').lower() == 'true'
+# True: 1ターン1行のトレースをJSONLで記録（TRACE_LOG_PATH、ローテーションあり）
+ENABLE_TRACE_LOG = os.getenv('ENABLE_TRACE_LOG', 'true').lower() == 'true'
+# True: RAG応答の前に質問の埋め込みで言い換えの過去応答を検索（意味キャッシュ）
+ENABLE_SEMANTIC_CACHE = os.getenv('ENABLE_SEMANTIC_CACHE', 'true').lower() == 'true'
+# True: クライアントがdeferAudio=trueを送ってきた場合、テキストを先に送信し音声は後からaudio_readyで送信
+ENABLE_DEFERRED_AUDIO = os.getenv('ENABLE_DEFERRED_AUDIO', 'true').lower() == 'true'
+# True: 合成した音声をディスクにも保存（再起動後も残り、同じディレクトリを使うワーカー間で共有）
+ENABLE_AUDIO_STORE = os.getenv('ENABLE_AUDIO_STORE', 'true').lower() == 'true'
+# True: イベントには音声のURL（/audio/<キー>）だけを載せ、ブラウザがHTTPで取得する（False: Base64で埋め込み）
+ENABLE_AUDIO_URLS = os.getenv('ENABLE_AUDIO_URLS', 'true').lower() == 'true'
+# True: 接続時に audio_transport=binary を指定したクライアントとは、音声をSocket.IOのバイナリ添付で送受信する
+ENABLE_BINARY_AUDIO = os.getenv('ENABLE_BINARY_AUDIO', 'true').lower() == 'true'
+# 🆕 True: 接続時に audio_stream=1 を指定したクライアントには、後送りの音声（ElevenLabs）を合成しながら
+# audio_chunkで断片ごとに送る（ブラウザは最初の断片から再生を始める）
+ENABLE_AUDIO_STREAMING = os.getenv('ENABLE_AUDIO_STREAMING', 'true').lower() == 'true'
+AUDIO_STREAM_CHUNK_BYTES = int(os.getenv('AUDIO_STREAM_CHUNK_BYTES', '4096'))
+# 🆕 Azure Speechの出力形式（優先順）。クライアントが接続時に再生できる形式を伝え、その中から選ぶ
+# （opus: WebM/Opus, ogg: Ogg/Opus, mp3, wav: 非圧縮）。伝えてこないクライアントにはmp3を使う
+AZURE_OUTPUT_FORMATS = [f.strip() for f in os.getenv('AZURE_SPEECH_OUTPUT_FORMATS', 'opus,mp3').split(',') if f.strip()]
+# 🆕 言語ごとに使ってよい音声エンジン（声・品質の優先順）。例: ja=elevenlabs,azure_speech;en=openai_tts
+# 記載のない言語はOpenAI TTS。設定されていないエンジンは除外し、先頭のエンジンで音声キャッシュのキーを作る
+TTS_ENGINE_POLICY = {
+    language.strip(): [engine.strip() for engine in engines.split(',') if engine.strip()]
+    for language, _, engines in (
+        item.partition('=') for item in
+        os.getenv('TTS_ENGINE_POLICY', 'ja=elevenlabs,azure_speech;en=openai_tts').split(';') if item.strip()
+    )
+}
+# 🆕 True: 直近のレイテンシ・エラー率から速くて正常なエンジンを選ぶ（False: ポリシー順で失敗時のみ次へ）
+# 🆕 True: 選んだエンジンが直近の所要時間の TTS_HEDGE_PERCENTILE を過ぎても応答しなければ次のエンジンにも依頼
+# ⚠️ エンジンごとに声が違うため、どちらも有効にすると会話の途中で返答ごとに声が変わることがある。
+# 同じ声のエンジン同士をポリシーに並べた場合や、声の一貫性より応答速度を優先する場合のみ有効にする
+ENABLE_TTS_ROUTING = os.getenv('ENABLE_TTS_ROUTING', 'false').lower() == 'true'
+ENABLE_TTS_HEDGING = os.getenv('ENABLE_TTS_HEDGING', 'false').lower() == 'true'
+# 🆕 True: Azure SpeechをSDKで合成（接続を開いたままのSpeechSynthesizerをプールして使い回す。失敗時はREST API）
+# 有効にした場合のみ、Azureの音声もストリーミング再生（audio_chunk）で合成中から送る
+# SDKはAWS環境で「Error 2176」が発生したため既定は無効。AZURE_SDK_POOL_SIZE はgunicornのスレッド数に合わせる
+ENABLE_AZURE_SDK_SYNTHESIS = os.getenv('ENABLE_AZURE_SDK_SYNTHESIS', 'false').lower() == 'true'
+AZURE_SDK_POOL_SIZE = int(os.getenv('AZURE_SDK_POOL_SIZE', '4'))
+
 # ====== 🎯 感情分析システム(改善版) ======
 class EmotionAnalyzer:
-    def __init__(self):
-        # 感情キーワード辞書(優先度順・拡張版)
-        self.emotion_keywords = {
-            'happy': {
-                'keywords': [
-                    'うれしい', '嬉しい', 'ウレシイ', 'ureshii',
-                    '楽しい', 'たのしい', 'tanoshii',
-                    'ハッピー', 'happy', 'はっぴー',
-                    '喜び', 'よろこび', 'yorokobi',
-                    '幸せ', 'しあわせ', 'shiawase',
-                    '最高', 'さいこう', 'saikou',
-                    'やった', 'yatta',
-                    'わーい', 'わあい', 'waai',
-                    '笑', 'わら', 'wara',
-                    '良い', 'いい', 'よい', 'yoi',
-                    '素晴らしい', 'すばらしい', 'subarashii',
-                    'ありがとう', 'ありがと', 'おかげ',
-                    '感謝', 'かんしゃ', '感動', 'かんどう',
-                    '面白い', 'おもしろい', 'たのしみ',
-                    'ワクワク', 'わくわく', 'ドキドキ',
-                    # 新規追加
-                    'うまい', '美味しい', 'おいしい', '美味',
-                    '完璧', 'かんぺき', 'perfect',
-                    'グッド', 'good', 'nice', 'ナイス',
-                    '愛してる', '大好き', 'だいすき',
-                    'すごく良い', 'とても良い', '非常に良い'
-                ],
-                'patterns': [r'♪+', r'〜+$', r'www', r'笑$'],
-                'weight': 1.3
-            },
-            'sad': {
-                'keywords': [
-                    '悲しい', 'かなしい', 'カナシイ', 'kanashii',
-                    '寂しい', 'さびしい', 'さみしい', 'sabishii',
-                    '泣', 'なく', 'naku',
-                    '涙', 'なみだ', 'namida',
-                    '辛い', 'つらい', 'tsurai',
-                    '苦しい', 'くるしい', 'kurushii',
-                    '切ない', 'せつない', 'setsunai',
-                    'しんどい', 'shindoi',
-                    '失望', 'しつぼう', 'shitsubou',
-                    '落ち込', 'おちこ', 'ochiko',
-                    'がっかり', 'gakkari',
-                    '憂鬱', 'ゆううつ', 'yuuutsu',
-                    'ブルー', 'blue', 'ぶるー',
-                    # 新規追加
-                    '残念', 'ざんねん', 'zannen',
-                    '悔しい', 'くやしい', 'kuyashii',
-                    '孤独', 'こどく', 'kodoku',
-                    'ひとりぼっち', 'hitoribocchi',
-                    '絶望', 'ぜつぼう', 'zetsubou',
-                    'つまらない', 'tsumaranai',
-                    '不幸', 'ふこう', 'fukou'
-                ],
-                'patterns': [r'。。。', r'…+$', r'T[T_]T', r';;', r'泣$'],
-                'weight': 1.2
-            },
-            'angry': {
-                'keywords': [
-                    '怒', 'おこ', 'oko',
-                    'イライラ', 'いらいら', 'iraira',
-                    'ムカつく', 'むかつく', 'mukatsuku',
-                    'ムカムカ', 'むかむか', 'mukamuka',
-                    '腹立', 'はらだ', 'harada',
-                    'キレ', 'きれ', 'kire',
-                    '憤', 'いきどお', 'ikidoo',
-                    'ふざけ', 'fuzake',
-                    '最悪', 'さいあく', 'saiaku',
-                    'うざい', 'うざ', 'uzai',
-                    'やばい', 'yabai',
-                    # 新規追加
-                    '頭にくる', 'あたまにくる', 'atamanikuru',
-                    '許せない', 'ゆるせない', 'yurusenai',
-                    '納得いかない', 'なっとくいかない',
-                    '不愉快', 'ふゆかい', 'fuyukai',
-                    '不満', 'ふまん', 'fuman',
-                    'クソ', 'くそ', 'kuso',
-                    'だめ', 'ダメ', 'dame'
-                ],
-                'patterns': [r'！！+', r'💢', r'怒$', r'ムカ'],
-                'weight': 1.3
-            },
-            'surprised': {
-                'keywords': [
-                    '驚', 'おどろ', 'odoro',
-                    'びっくり', 'ビックリ', 'bikkuri',
-                    'すごい', 'スゴイ', 'sugoi',
-                    'えっ', 'エッ', 'e',
-                    'まじ', 'マジ', 'maji',
-                    '信じられない', 'しんじられない', 'shinjirarenai',
-                    '本当', 'ほんとう', 'hontou',
-                    'やば', 'ヤバ', 'yaba',
-                    'うそ', 'ウソ', '嘘', 'uso',
-                    'なんと', 'ナント', 'nanto',
-                    'まさか', 'マサカ', 'masaka',
-                    # 新規追加
-                    '意外', 'いがい', 'igai',
-                    '予想外', 'よそうがい', 'yosougai',
-                    '衝撃', 'しょうげき', 'shougeki',
-                    'ショック', 'shock', 'しょっく',
-                    '想定外', 'そうていがい', 'souteigai',
-                    '仰天', 'ぎょうてん', 'gyouten'
-                ],
-                'patterns': [r'[!?！？]+', r'。。+', r'ええ[!?！？]'],
-                'weight': 1.1
-            }
-        }
-        
-        # 文脈による感情判定用のフレーズ
-        self.context_phrases = {
-            'happy': [
-                'よかった', '楽しみ', '期待', '頑張', 'がんば', '応援',
-                '成功', 'せいこう', '達成', 'たっせい', '勝利', 'しょうり',
-                '祝福', 'しゅくふく', 'おめでとう', 'congratulations'
-            ],
-            'sad': [
-                '残念', 'ざんねん', '悔しい', 'くやしい', '寂しい',
-                '心配', 'しんぱい', '不安', 'ふあん', '困った', 'こまった',
-                '落胆', 'らくたん', '失望', 'しつぼう',
-                # 🎭 伝統工芸関連の悲しい文脈
-                '深刻な課題', 'しんこくなかだい', '後継者がいない', 'こうけいしゃがいない',
-                '技術が消える', 'ぎじゅつがきえる', '職人が減る', 'しょくにんがへる',
-                '伝統がなくなる', 'でんとうがなくなる', '廃れてしまう', 'すたれてしまう'
-            ],
-            'angry': [
-                '許せない', 'ゆるせない', '納得いかない', 'なっとくいかない',
-                '理解できない', 'りかいできない', '腹が立つ', 'はらがたつ',
-                '不公平', 'ふこうへい', '不当', 'ふとう',
-                '文句', 'もんく', '抗議', 'こうぎ', '反対', 'はんたい'
-            ],
-            'surprised': [
-                '知らなかった', 'しらなかった', '初めて', 'はじめて',
-                '予想外', 'よそうがい', '想定外', 'そうていがい',
-                '驚き', 'おどろき', '発見', 'はっけん'
-            ]
-        }
-        
+    """テキストの感情分析（🆕 キーワード・文脈フレーズ・パターンは emotion_engine で起動時にコンパイル済み）"""
+
+    def __init__(self, engine=None):
+        self.engine = engine or emotion_engine
+        # 感情キーワード辞書(優先度順・拡張版)と文脈による感情判定用のフレーズ
+        self.emotion_keywords = EMOTION_KEYWORDS
+        self.context_phrases = CONTEXT_PHRASES
+
     def analyze_emotion(self, text: str) -> Tuple[str, float]:
         """
         テキストから感情を分析(改善版)
         Returns: (emotion, confidence)
         """
-        if not text:
-            return 'neutral', 0.5
-            
-        # テキストの前処理
-        text_lower = text.lower()
-        text_normalized = self._normalize_text(text)
-        
-        # 各感情のスコアを計算
-        scores: Dict[str, float] = {
-            'happy': 0.0,
-            'sad': 0.0,
-            'angry': 0.0,
-            'surprised': 0.0,
-            'neutral': 0.0
-        }
-        
-        # キーワードマッチング
-        for emotion, config in self.emotion_keywords.items():
-            # キーワードチェック
-            for keyword in config['keywords']:
-                if keyword in text_normalized:
-                    scores[emotion] += 2.0 * config['weight']
-                    
-            # パターンチェック
-            for pattern in config['patterns']:
-                if re.search(pattern, text):
-                    scores[emotion] += 1.0 * config['weight']
-        
-        # 文脈フレーズのチェック
-        for emotion, phrases in self.context_phrases.items():
-            for phrase in phrases:
-                if phrase in text_normalized:
-                    scores[emotion] += 0.5
-        
-        # 文の長さによる調整(短い文は感情が強い傾向)
-        if len(text) < 10 and max(scores.values()) > 0:
-            max_emotion = max(scores, key=scores.get)
-            scores[max_emotion] *= 1.2
-        
-        # 感情強度の判定
-        max_score = max(scores.values())
-        
-        if max_score < 1.0:
-            return 'neutral', 0.5
-            
-        # 最高スコアの感情を選択
-        detected_emotion = max(scores, key=scores.get)
-        confidence = min(scores[detected_emotion] / 10.0, 1.0)
-        
-        # 複数の感情が競合する場合の処理
-        sorted_emotions = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-        if len(sorted_emotions) > 1:
-            # 2番目に高いスコアとの差が小さい場合は信頼度を下げる
-            if sorted_emotions[0][1] - sorted_emotions[1][1] < 1.0:
-                confidence *= 0.8
-        
-        return detected_emotion, confidence
-        
+        return self.engine.analyze(text)
+
+    def analyze_emotions(self, texts: List[str]) -> List[Tuple[str, float]]:
+        """🆕 複数テキストをまとめて分析"""
+        return self.engine.analyze_batch(texts)
+
     def _normalize_text(self, text: str) -> str:
         """テキストの正規化"""
-        # 記号やスペースを除去
-        text = re.sub(r'[^\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FAF\w\s]', '', text)
-        # 全角英数字を半角に変換
-        text = text.translate(str.maketrans('０１２３４５６７８９ＡＢＣＤＥＦ', '0123456789ABCDEF'))
-        return text.lower()
+        return normalize_emotion_text(text)
 
 # EmotionAnalyzerのインスタンス化
 emotion_analyzer = EmotionAnalyzer()
@@ -289,8 +168,59 @@ mental_state_histories = defaultdict(lambda: deque(maxlen=30))
 emotion_transition_stats = defaultdict(lambda: defaultdict(int))
 
 # キャッシュ(会話履歴用)
-conversation_cache = {}
-audio_cache = {}
+# 🆕 LRU順・有効期限・合計バイト数の上限付き（期限切れはバックグラウンドで掃除）
+conversation_cache = BoundedCache(
+    'conversation',
+    max_entries=int(os.getenv('CONVERSATION_CACHE_MAX_ENTRIES', '2000')),
+    max_bytes=int(os.getenv('CONVERSATION_CACHE_MAX_BYTES', str(8 * 1024 * 1024))),
+    ttl_seconds=24 * 60 * 60
+)
+audio_cache = BoundedCache(
+    'audio',
+    max_bytes=int(os.getenv('AUDIO_CACHE_MAX_BYTES', str(128 * 1024 * 1024))),
+    ttl_seconds=int(os.getenv('AUDIO_CACHE_TTL', str(24 * 60 * 60)))
+)
+# 🆕 ディスク上の音声キャッシュ（内容アドレス方式・合計サイズの上限付き）
+audio_store = AudioStore(
+    os.getenv('AUDIO_STORE_DIR', str(Path(__file__).parent / 'data' / 'audio_store')),
+    max_bytes=int(os.getenv('AUDIO_STORE_MAX_BYTES', str(512 * 1024 * 1024)))
+) if ENABLE_AUDIO_STORE else None
+
+# 🆕 同じキャッシュキーの生成処理を1件にまとめる（同時タップ時のGPT-4・TTS重複呼び出し防止）
+conversation_flights = SingleFlight('conversation')
+audio_flights = SingleFlight('audio')
+# 後続リクエストが先行処理を待つ上限（秒）。超えたら個別に生成する
+SINGLE_FLIGHT_TIMEOUT = float(os.getenv('SINGLE_FLIGHT_TIMEOUT', '60'))
+
+# 🆕 事前コンパイル済みの静的Q&Aバンドル（サジェスチョンIDで即座に応答・音声も作成済み）
+static_bundles = StaticBundleStore()
+
+# 🆕 意味キャッシュ（言い換えの質問にGPT-4を呼ばずに応答）
+def embed_question(question):
+    """質問の埋め込みベクトル（OpenAI embeddings）"""
+    with circuit_breaker.guard('openai_embeddings'):
+        return chatbot.embeddings.embed_query(question)
+
+semantic_cache = SemanticCache(
+    embed_fn=embed_question,
+    threshold=float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.93')),
+    max_entries=int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', '500'))
+)
+
+# 🆕 音声合成用ワーカープール（文単位パイプライン・音声の後送り用）
+tts_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('TTS_WORKERS', '4')),
+    thread_name_prefix='tts'
+)
+
+# 🆕 音声エンジンの選択（直近のレイテンシ・エラー率によるルーティングとヘッジ）
+tts_router = TtsRouter(
+    adaptive=ENABLE_TTS_ROUTING,
+    hedging=ENABLE_TTS_HEDGING,
+    hedge_percentile=float(os.getenv('TTS_HEDGE_PERCENTILE', '0.9')),
+    min_hedge_delay=float(os.getenv('TTS_HEDGE_MIN_DELAY', '0.5')),
+    max_workers=int(os.getenv('TTS_WORKERS', '4')) * 2
+)
 
 # ====== クイズシステムデータ ======
 QUIZ_DATA = {
@@ -366,289 +296,32 @@ quiz_sessions = {}
 # アンケートマネージャー
 survey_manager = None
 
-# ElevenLabsクライアント
-elevenlabs_client = None
-use_elevenlabs = False
-
-# Azure Speech Serviceクライアント
-azure_speech_client = None
-use_azure_speech = False
-
 # SpeechProcessor (音声認識)
 speech_processor = None
 
-# 🐶 京友禅用語辞書
-kyoyuzen_terms = {}
+# 🐶 京友禅用語辞書（🆕 最長一致の正規表現にコンパイル済み・ファイル更新時は自動で再読み込み）
+kyoyuzen_terms = ReadingDictionary(
+    Path(__file__).parent / 'kyoyuzen_terms.json',
+    check_interval=float(os.getenv('KYOYUZEN_TERMS_CHECK_INTERVAL', '2'))
+)
 
 # ====== 🐶 京友禅用語辞書の読み込み ======
 def load_kyoyuzen_terms():
     """京友禅用語の読み仮名辞書を読み込む"""
-    global kyoyuzen_terms
     try:
-        terms_file = Path(__file__).parent / 'kyoyuzen_terms.json'
-        if terms_file.exists():
-            with open(terms_file, 'r', encoding='utf-8') as f:
-                kyoyuzen_terms = json.load(f)
+        if kyoyuzen_terms.load():
             print(f"✅ 京友禅用語辞書読み込み成功: {len(kyoyuzen_terms)}語")
         else:
-            print(f"⚠️ 京友禅用語辞書が見つかりません: {terms_file}")
+            print(f"⚠️ 京友禅用語辞書が見つかりません: {kyoyuzen_terms.path}")
     except Exception as e:
         print(f"❌ 京友禅用語辞書読み込みエラー: {e}")
-        kyoyuzen_terms = {}
 
 def apply_kyoyuzen_terms(text):
-    """テキストに京友禅用語の読み仮名を適用"""
-    if not kyoyuzen_terms:
-        return text
-    
-    # 長い単語から優先的に置換（部分一致を防ぐため）
-    sorted_terms = sorted(kyoyuzen_terms.items(), key=lambda x: len(x[0]), reverse=True)
-    
-    result = text
-    for kanji, hiragana in sorted_terms:
-        result = result.replace(kanji, hiragana)
-    
-    return result
-
-# ====== Azure Speech Serviceの音声合成クラス ======
-class AzureSpeechClient:
-    """Azure Speech Service音声合成クライアント"""
-    
-    def __init__(self, speech_key=None, speech_region=None, voice_name=None):
-        self.speech_key = speech_key
-        self.speech_region = speech_region
-        self.voice_name = voice_name or 'ja-JP-NanamiNeural'
-        
-    def test_connection(self):
-        """接続テスト"""
-        if not self.speech_key or not self.speech_region:
-            return False
-        try:
-            speech_config = speechsdk.SpeechConfig(
-                subscription=self.speech_key, 
-                region=self.speech_region
-            )
-            return True
-        except Exception as e:
-            print(f"Azure Speech接続エラー: {e}")
-            return False
-    
-    def generate_voice(self, text, voice_name=None, emotion='neutral', speed=1.0):
-        """音声生成（REST API使用）
-        
-        主な日本語音声:
-        - 'ja-JP-NanamiNeural' (女性、優しい声) ← デフォルト
-        - 'ja-JP-AoiNeural' (女性、明るい声)
-        - 'ja-JP-MayuNeural' (女性、落ち着いた声)
-        - 'ja-JP-ShioriNeural' (女性、若い声)
-        """
-        if not self.speech_key or not self.speech_region:
-            raise ValueError("Azure Speech APIの認証情報が設定されていません")
-        
-        # 音声名の決定
-        voice = voice_name or self.voice_name
-        
-        # 感情スタイルのマッピング
-        emotion_styles = {
-            'happy': 'cheerful',
-            'sad': 'sad',
-            'angry': 'angry',
-            'surprised': 'excited',
-            'neutral': 'general',
-            'start': 'cheerful',
-            'dangerquestion': 'serious',
-            'neutraltalking': 'general',
-            'responseready': 'general'
-        }
-        style = emotion_styles.get(emotion, 'general')
-        
-        # スピード調整
-        speech_rate = f"{int((speed - 1) * 100):+d}%"
-        
-        # 抑揚の強さを設定（感情によって変える）
-        style_degree = "2"  # 1.0（デフォルト）～ 2.0（最大）、抑揚を強くする
-        if emotion in ['happy', 'surprised', 'start']:
-            style_degree = "2"  # 明るい感情は抑揚を最大に
-        elif emotion in ['sad', 'angry']:
-            style_degree = "1.8"  # 悲しみや怒りも抑揚を強めに
-        else:
-            style_degree = "1.5"  # 通常は1.5倍
-        
-        # SSML（音声合成マークアップ）を作成
-        ssml = f"""
-        <speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis" 
-               xmlns:mstts="https://www.w3.org/2001/mstts" xml:lang="ja-JP">
-            <voice name="{voice}">
-                <mstts:express-as style="{style}" styledegree="{style_degree}">
-                    <prosody rate="{speech_rate}" pitch="+5%">
-                        {text}
-                    </prosody>
-                </mstts:express-as>
-            </voice>
-        </speak>
-        """
-        
-        # Azure Speech REST APIを使用（SDKの代わり）
-        # ⚠️ SDKはAWS環境で「Error 2176」が発生するため、REST APIを使用
-        try:
-            import requests
-            
-            # REST API エンドポイント
-            url = f"https://{self.speech_region}.tts.speech.microsoft.com/cognitiveservices/v1"
-            
-            headers = {
-                'Ocp-Apim-Subscription-Key': self.speech_key,
-                'Content-Type': 'application/ssml+xml',
-                'X-Microsoft-OutputFormat': 'riff-24khz-16bit-mono-pcm',  # WAV形式
-                'User-Agent': 'REI-Avatar-System'
-            }
-            
-            response = requests.post(url, headers=headers, data=ssml.encode('utf-8'), timeout=30)
-            
-            if response.status_code == 200:
-                audio_data = response.content
-                print(f"✅ Azure音声生成成功 (REST API): {len(audio_data)} bytes")
-                return audio_data
-            else:
-                error_msg = f"Azure Speech REST API Error: {response.status_code} - {response.text}"
-                print(f"❌ {error_msg}")
-                raise Exception(error_msg)
-                
-        except Exception as e:
-            print(f"❌ Azure音声生成エラー (REST API): {e}")
-            import traceback
-            traceback.print_exc()
-            raise
-
-# ====== ElevenLabs音声合成クラス ======
-class ElevenLabsClient:
-    """ElevenLabs音声合成クライアント"""
-    
-    def __init__(self, api_key=None, voice_id=None, model_id=None, pronunciation_dictionary_id=None):
-        self.api_key = api_key
-        self.voice_id = voice_id or "21m00Tcm4TlvDq8ikWAM"  # デフォルト音声
-        self.model_id = model_id or "eleven_multilingual_v2"  # デフォルトモデル
-        self.pronunciation_dictionary_id = pronunciation_dictionary_id  # 発音辞書ID（オプション）
-        self.base_url = "https://api.elevenlabs.io/v1"
-
-    
-    def normalize_japanese_text(self, text):
-        """日本語テキストを音声合成向けに正規化
-        
-        1. 京友禅用語辞書を適用（漢字→ひらがな）
-        2. 記号の正規化
-        
-        Args:
-            text: 元のテキスト
-        
-        Returns:
-            str: 正規化されたテキスト
-        """
-        import re
-        
-        normalized_text = text
-        
-        # 🐶 京友禅用語辞書を適用（漢字→ひらがな置換）
-        normalized_text = apply_kyoyuzen_terms(normalized_text)
-        
-        # 記号の正規化（最小限）
-        normalized_text = normalized_text.replace('...', '。')
-        normalized_text = normalized_text.replace('…', '。')
-        
-        # 連続する句読点を整理
-        normalized_text = re.sub(r'[、。]{2,}', '。', normalized_text)
-        
-        return normalized_text
-        
-    def test_connection(self):
-        """接続テスト"""
-        if not self.api_key:
-            return False
-        
-        headers = {'xi-api-key': self.api_key}
-        try:
-            response = requests.get(f"{self.base_url}/voices", headers=headers, timeout=10)
-            return response.status_code == 200
-        except Exception as e:
-            print(f"ElevenLabs接続テストエラー: {e}")
-            return False
+    """テキストに京友禅用語の読み仮名を適用（長い用語を優先し、1回の走査で置換）"""
+    return kyoyuzen_terms.apply(text)
 
-    
-    def generate_voice(self, text, emotion='neutral', speed=1.0):
-        """音声生成
-        
-        Args:
-            text: 読み上げテキスト
-            emotion: 感情（'neutral', 'happy', 'sad', 'angry', 'surprised'）
-            speed: 速度（未使用、互換性のため保持）
-        
-        Returns:
-            bytes: MP3音声データ
-        """
-        if not self.api_key:
-            raise ValueError("ElevenLabs APIキーが設定されていません")
-        
-        headers = {
-            'xi-api-key': self.api_key,
-            'Content-Type': 'application/json'
-        }
-        
-        # 🔧 ElevenLabs公式推奨設定
-        # 参考: https://elevenlabs.io/docs/product-guides/playground/text-to-speech
-        
-        # UIのデフォルト値に完全一致させる
-        stability = 0.5
-        similarity_boost = 0.75
-        style = 0.0
-        
-        # 🆕 日本語テキストを正規化（ElevenLabs UIの自動正規化を再現）
-        normalized_text = self.normalize_japanese_text(text)
-        
-        # デバッグ用：送信するテキストを常に表示
-        print(f"🎤 ElevenLabsに送信するテキスト:")
-        print(f"   {normalized_text[:100]}{'...' if len(normalized_text) > 100 else ''}")
-        
-        data = {
-            'text': normalized_text,
-            'model_id': self.model_id,
-            'voice_settings': {
-                'stability': stability,
-                'similarity_boost': similarity_boost,
-                'style': style,
-                'use_speaker_boost': True
-            }
-        }
-        
-        # 🆕 Pronunciation Dictionary（発音辞書）を追加（設定されている場合）
-        if self.pronunciation_dictionary_id:
-            data['pronunciation_dictionary_locators'] = [{
-                'pronunciation_dictionary_id': self.pronunciation_dictionary_id,
-                'version_id': 'latest'
-            }]
-            print(f"📚 発音辞書を使用: {self.pronunciation_dictionary_id}")
-        
-        try:
-            response = requests.post(
-                f"{self.base_url}/text-to-speech/{self.voice_id}",
-                headers=headers,
-                json=data,
-                timeout=60  # タイムアウトを60秒に延長
-            )
-            
-            if response.status_code == 200:
-                print(f"✅ ElevenLabs音声生成成功: {len(response.content)} bytes")
-                return response.content
-            else:
-                error_msg = f"ElevenLabs API Error: {response.status_code} - {response.text}"
-                print(f"❌ {error_msg}")
-                raise Exception(error_msg)
-                
-        except Exception as e:
-            print(f"❌ ElevenLabs音声生成エラー: {e}")
-            print(f"📊 エラータイプ: {type(e).__name__}")
-            import traceback
-            traceback.print_exc()
-            raise
+# 🆕 音声合成エンジンのレジストリ（initialize_systemで使用できるエンジンを登録する）
+tts_engines = TtsEngineRegistry(readings=apply_kyoyuzen_terms)
 
 # ====== 【修正箇所】理解度レベル管理システム ======
 def calculate_relationship_level(conversation_count):
@@ -684,9 +357,15 @@ def get_relationship_adjusted_greeting(language, relationship_style):
     return greetings.get(language, greetings['ja']).get(relationship_style, greetings[language]['formal'])
 
 # ====== 初期化処理 ======
+def create_azure_synthesizer_pool(speech_key, speech_region):
+    """🆕 AzureのSDKのSpeechSynthesizerのプールを作成し、メトリクスに登録"""
+    synthesizer_pool = AzureSynthesizerPool(speech_key, speech_region, pool_size=AZURE_SDK_POOL_SIZE)
+    metrics.registry.add_collector(synthesizer_pool.collect_metrics)
+    return synthesizer_pool
+
 def initialize_system():
     """システムの初期化"""
-    global client, chatbot, elevenlabs_client, use_elevenlabs, azure_speech_client, use_azure_speech, speech_processor
+    global client, chatbot, speech_processor
     
     print("🚀 システム初期化中...")
     
@@ -695,10 +374,15 @@ def initialize_system():
     
     # OpenAI API初期化
     api_key = os.getenv('OPENAI_API_KEY')
+    if backends.using_stubs():
+        print(f"🧪 スタブバックエンドを使用: {backends.STUB_BACKENDS_URL}")
+        api_key = api_key or 'stub'
     if not api_key:
         print("⚠️ 警告: OPENAI_API_KEYが設定されていません")
     else:
-        client = OpenAI(api_key=api_key)
+        client = backends.openai_client(api_key=api_key)
+        # 🆕 OpenAI TTS（英語は nova、それ以外は alloy）
+        tts_engines.register(OpenAITtsEngine(client))
         print("✅ OpenAI API初期化完了")
     
     # SpeechProcessor初期化（音声認識用）
@@ -709,52 +393,63 @@ def initialize_system():
         print(f"⚠️ SpeechProcessor初期化失敗: {e}")
     
     # 🆕 ElevenLabs初期化（日本語用 - 最優先）
-    elevenlabs_key = os.getenv('ELEVENLABS_API_KEY')
-    elevenlabs_voice_id = os.getenv('ELEVENLABS_VOICE_ID', '21m00Tcm4TlvDq8ikWAM')
-    elevenlabs_model_id = os.getenv('ELEVENLABS_MODEL_ID', 'eleven_multilingual_v2')
-    elevenlabs_pronunciation_dict_id = os.getenv('ELEVENLABS_PRONUNCIATION_DICTIONARY_ID')  # オプション
-    elevenlabs_enabled = os.getenv('ELEVENLABS_ENABLED', 'false').lower() == 'true'
-    
-    if elevenlabs_enabled and elevenlabs_key:
-        try:
-            elevenlabs_client = ElevenLabsClient(
-                elevenlabs_key, 
-                elevenlabs_voice_id, 
-                elevenlabs_model_id,
-                elevenlabs_pronunciation_dict_id
-            )
-            if elevenlabs_client.test_connection():
-                use_elevenlabs = True
-                dict_info = f", 発音辞書: {elevenlabs_pronunciation_dict_id[:8]}..." if elevenlabs_pronunciation_dict_id else ""
-                print(f"✅ ElevenLabs初期化完了 (音声ID: {elevenlabs_voice_id}, モデル: {elevenlabs_model_id}{dict_info})")
-            else:
-                print("⚠️ ElevenLabs接続テスト失敗")
-        except Exception as e:
-            print(f"⚠️ ElevenLabs初期化エラー: {e}")
-            print("ℹ️ ElevenLabsをスキップしてフォールバックを使用します")
-    else:
-        print("ℹ️ ElevenLabsは設定されていません")
+    try:
+        elevenlabs_engine = elevenlabs_engine_from_env()
+        if not elevenlabs_engine:
+            print("ℹ️ ElevenLabsは設定されていません")
+        elif elevenlabs_engine.test_connection():
+            tts_engines.register(elevenlabs_engine)
+            dict_id = elevenlabs_engine.pronunciation_dictionary_id
+            dict_info = f", 発音辞書: {dict_id[:8]}..." if dict_id else ""
+            print(f"✅ ElevenLabs初期化完了 (音声ID: {elevenlabs_engine.voice}, モデル: {elevenlabs_engine.model_id}{dict_info})")
+        else:
+            print("⚠️ ElevenLabs接続テスト失敗")
+    except Exception as e:
+        print(f"⚠️ ElevenLabs初期化エラー: {e}")
+        print("ℹ️ ElevenLabsをスキップしてフォールバックを使用します")
     
-    # Azure Speech Service初期化（フォールバック用 - ElevenLabsが無い場合）
-    azure_key = os.getenv('AZURE_SPEECH_KEY')
-    azure_region = os.getenv('AZURE_SPEECH_REGION', 'japaneast')
-    azure_voice = os.getenv('AZURE_VOICE_NAME', 'ja-JP-NanamiNeural')
+    # Azure Speech Service初期化（🆕 ElevenLabsと併用する場合はルーターのヘッジ・フォールバック先）
+    azure_in_policy = any('azure_speech' in engines for engines in TTS_ENGINE_POLICY.values())
     
-    if not use_elevenlabs and azure_key and azure_region:
+    if azure_in_policy:
         try:
-            azure_speech_client = AzureSpeechClient(azure_key, azure_region, azure_voice)
-            if azure_speech_client.test_connection():
-                use_azure_speech = True
-                print(f"✅ Azure Speech Service初期化完了 (音声: {azure_voice})")
+            # 🆕 SDKのSpeechSynthesizerのプール（スタブバックエンドはREST APIのみ対応）
+            synthesizer_pool_factory = None
+            if ENABLE_AZURE_SDK_SYNTHESIS and not backends.using_stubs():
+                synthesizer_pool_factory = create_azure_synthesizer_pool
+            azure_engine = azure_engine_from_env(output_format=negotiate_output_format(None),
+                                                 synthesizer_pool_factory=synthesizer_pool_factory)
+            if not azure_engine:
+                print("ℹ️ Azure Speech Serviceは設定されていません")
+            elif azure_engine.test_connection():
+                tts_engines.register(azure_engine)
+                api = 'SDK' if azure_engine.synthesizer_pool else 'REST API'
+                print(f"✅ Azure Speech Service初期化完了 (音声: {azure_engine.voice_name}, 形式: {', '.join(AZURE_OUTPUT_FORMATS)}, {api})")
             else:
                 print("⚠️ Azure Speech Service接続テスト失敗")
         except Exception as e:
             print(f"⚠️ Azure Speech Service初期化エラー: {e}")
             print("ℹ️ Azure Speech Serviceをスキップしてフォールバックを使用します")
-    elif use_elevenlabs:
-        print("ℹ️ ElevenLabsを使用するため、Azureは無効化されています")
     else:
-        print("ℹ️ Azure Speech Serviceは設定されていません")
+        print("ℹ️ TTS_ENGINE_POLICYにazure_speechがないため、Azureは無効化されています")
+    
+    # 🆕 ターンごとのトレースログ
+    if ENABLE_TRACE_LOG:
+        try:
+            tracing.configure_trace_log(
+                os.getenv('TRACE_LOG_PATH', 'logs/trace.jsonl'),
+                max_bytes=int(os.getenv('TRACE_LOG_MAX_BYTES', str(10 * 1024 * 1024))),
+                backup_count=int(os.getenv('TRACE_LOG_BACKUPS', '5'))
+            )
+            print("✅ トレースログ設定完了")
+        except Exception as e:
+            print(f"⚠️ トレースログ設定エラー: {e}")
+    
+    # 🆕 静的Q&Aバンドル読み込み（build_static_bundles.pyで作成）
+    try:
+        static_bundles.load()
+    except Exception as e:
+        print(f"❌ 静的Q&Aバンドル読み込みエラー: {e}")
     
     # RAGChatbot初期化
     try:
@@ -776,7 +471,10 @@ def initialize_system():
         print("⚠️ アンケートシステムは無効化されています")
     
     print("🎉 システム初期化完了")
-    print(f"📊 音声エンジン状況: ElevenLabs={use_elevenlabs}, Azure={use_azure_speech}, OpenAI TTS=常に利用可能")
+    print(f"📊 音声エンジン: {', '.join(tts_engines.label(name) for name in tts_engines.names()) or 'なし'}")
+    for language in TTS_ENGINE_POLICY:
+        print(f"  - {language}: {' → '.join(voice_engines(language))} "
+              f"(ルーティング: {ENABLE_TTS_ROUTING}, ヘッジ: {ENABLE_TTS_HEDGING})")
 
 # ====== ユーティリティ関数 ======
 def get_session_data(session_id):
@@ -819,123 +517,309 @@ def get_visitor_data(visitor_id):
     return visitor_data[visitor_id]
 
 # ====== 音声生成関数 ======
-def generate_audio_by_language(text, language='ja', emotion_params='neutral'):
-    """言語に応じた音声生成（ElevenLabs優先）"""
-    # 音声キャッシュのチェック
-    cache_key = hashlib.md5(f"{text}_{language}_{emotion_params}".encode()).hexdigest()
-    if cache_key in audio_cache:
-        print(f"🎵 音声キャッシュヒット: {cache_key[:8]}")
-        return audio_cache[cache_key]
-    
-    audio_base64 = None
-    engine_used = None
-    
+def voice_engines(language):
+    """🆕 この言語で使える音声エンジン（ポリシーの優先順。tts_enginesに登録されていないエンジンは除く）"""
+    engines = [engine for engine in TTS_ENGINE_POLICY.get(language, ['openai_tts']) if engine in tts_engines]
+    return engines or ['openai_tts']
+
+def active_voice_engine(language):
+    """この言語で使われる音声エンジン名（🆕 ポリシーの先頭。音声キャッシュのキー・静的バンドルに使う）"""
+    return voice_engines(language)[0]
+
+def audio_cache_key(text, language, emotion_params, output_format=None):
+    """🆕 音声キャッシュのキー（ポリシーの先頭のエンジンで、正規化後のテキストから計算）"""
+    return tts_engines.cache_key(active_voice_engine(language), text, language, emotion_params, output_format)
+
+def negotiate_output_format(client_formats):
+    """🆕 Azure Speechの出力形式を決める（サーバーの優先順のうち、クライアントが再生できる最初のもの）
+
+    Args:
+        client_formats: クライアントが再生できる形式（カンマ区切り）。Noneなら伝えてこなかったクライアント
+    """
+    available = [f for f in AZURE_OUTPUT_FORMATS if f in AzureSpeechEngine.OUTPUT_FORMATS]
+    if client_formats:
+        playable = {f.strip() for f in client_formats.split(',')}
+        for output_format in available:
+            if output_format in playable:
+                return output_format
+    # どのブラウザでも再生できるmp3（サーバーがwavのみを指定した場合はwav）
+    return 'mp3' if 'mp3' in available or not available else available[0]
+
+def load_stored_audio(cache_key):
+    """🆕 ディスクの音声キャッシュからBase64で取得（なければNone）"""
+    if audio_store is None:
+        return None
     try:
-        # 🆕 日本語の場合、ElevenLabsを最優先
-        if language == 'ja' and use_elevenlabs:
-            try:
-                print(f"🎤 ElevenLabsで音声生成中... (感情: {emotion_params})")
-                audio_content = elevenlabs_client.generate_voice(
-                    text, 
-                    emotion=emotion_params,
-                    speed=1.0
-                )
-                
-                # MP3を直接Base64エンコード
-                audio_base64 = base64.b64encode(audio_content).decode('utf-8')
-                engine_used = 'ElevenLabs'
-                
-                print(f"✅ ElevenLabs音声生成成功: {len(audio_content)} バイト")
-                
-            except Exception as e:
-                print(f"❌ ElevenLabs音声生成エラー: {e}")
-                print("⚠️ Azureにフォールバック")
-                # Azureにフォールバック
-                if use_azure_speech:
-                    audio_content = azure_speech_client.generate_voice(
-                        text, 
-                        emotion=emotion_params,
-                        speed=1.0
-                    )
-                    
-                    # WAVファイルとして一時保存
-                    with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tmp_file:
-                        tmp_file.write(audio_content)
-                        tmp_path = tmp_file.name
-                    
-                    # Base64エンコード
-                    with open(tmp_path, 'rb') as f:
-                        audio_base64 = base64.b64encode(f.read()).decode('utf-8')
-                    
-                    # 一時ファイル削除
-                    os.unlink(tmp_path)
-                    engine_used = 'Azure Speech (フォールバック)'
-                    
-                    print(f"✅ Azure音声生成成功 (フォールバック): {len(audio_content)} バイト")
-            
-        # フォールバック: 日本語 + Azure Speech Service（ElevenLabsが無い場合）
-        elif language == 'ja' and use_azure_speech:
-            print(f"🎤 Azure Speech Serviceで音声生成中... (感情: {emotion_params})")
-            audio_content = azure_speech_client.generate_voice(
-                text, 
-                emotion=emotion_params,
-                speed=1.0
-            )
-            
-            # WAVファイルとして一時保存
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tmp_file:
-                tmp_file.write(audio_content)
-                tmp_path = tmp_file.name
-            
-            # Base64エンコード
-            with open(tmp_path, 'rb') as f:
-                audio_base64 = base64.b64encode(f.read()).decode('utf-8')
-            
-            # 一時ファイル削除
-            os.unlink(tmp_path)
-            engine_used = 'Azure Speech'
-            
-            print(f"✅ Azure音声生成成功: {len(audio_content)} バイト")
-            
-        # その他の言語（英語など） → OpenAI TTS
-        else:
-            print(f"🎤 OpenAI TTSで音声生成中... (言語: {language})")
-            if not client:
-                print("⚠️ OpenAI clientが初期化されていません")
+        with audio_store.open(cache_key) as data:
+            if data is None:
                 return None
-                
-            voice = 'nova' if language == 'en' else 'alloy'
-            
-            speech_response = client.audio.speech.create(
-                model="tts-1",
-                voice=voice,
-                input=text
-            )
-            
-            # MP3をBase64エンコード
-            audio_content = speech_response.content
-            audio_base64 = base64.b64encode(audio_content).decode('utf-8')
-            engine_used = 'OpenAI TTS'
-            print(f"✅ OpenAI TTS音声生成成功")
-        
-        # キャッシュに保存(最大100件)
-        if audio_base64:
-            if len(audio_cache) >= 100:
-                # 古いエントリを削除
-                oldest_key = next(iter(audio_cache))
-                del audio_cache[oldest_key]
-            
-            audio_cache[cache_key] = audio_base64
-            
-            print(f"🎵 音声生成完了: {cache_key[:8]} (エンジン: {engine_used})")
-        
-        return audio_base64
-        
+            return base64.b64encode(data).decode('utf-8')
+    except OSError as e:
+        print(f"⚠️ 音声ストアの読み込みエラー: {e}")
+        return None
+
+def lookup_audio(cache_key):
+    """🆕 キャッシュ済みの音声をBase64で取得（メモリ → ディスクの順。なければNone）"""
+    cached_audio = audio_cache.get(cache_key)
+    if cached_audio:
+        print(f"🎵 音声キャッシュヒット: {cache_key[:8]}")
+        tracing.annotate(audio_engine='cache')
+        return cached_audio
+
+    # ディスクの音声キャッシュ（再起動前や他のワーカーが合成したもの）
+    stored_audio = load_stored_audio(cache_key)
+    if stored_audio:
+        audio_cache.set(cache_key, stored_audio)
+        print(f"💾 音声ストアヒット: {cache_key[:8]}")
+        tracing.annotate(audio_engine='disk_cache')
+        return stored_audio
+    return None
+
+def generate_audio(text, language='ja', emotion_params='neutral', output_format=None):
+    """🆕 音声を生成し、(キャッシュキー, 音声のBase64) を返す（生成できなければ (None, None)）
+
+    エンジンは TTS_ENGINE_POLICY とルーターで選ぶ。
+    output_format: Azure Speechの出力形式（省略時はクライアントの既定。ElevenLabs・OpenAIはmp3固定）
+    キャッシュはポリシーの先頭のエンジンのキーで探す。フォールバックしたエンジンの音声は
+    そのエンジンのキーで保存されるため、返されるキーは audio_cache_key() と異なる場合がある。
+    """
+    cache_key = audio_cache_key(text, language, emotion_params, output_format)
+    cached_audio = lookup_audio(cache_key)
+    if cached_audio:
+        return cache_key, cached_audio
+    
+    # 🆕 同じ音声を合成中なら、その結果を待って共有
+    with tracing.span('tts'):
+        result, shared = audio_flights.do(
+            cache_key,
+            lambda: _synthesize_audio(text, language, emotion_params, output_format),
+            timeout=SINGLE_FLIGHT_TIMEOUT
+        )
+    if shared:
+        print(f"🎵 合成中の音声を共有: {cache_key[:8]}")
+        tracing.annotate(audio_engine='coalesced')
+    return result
+
+def _synthesize_audio(text, language, emotion_params, output_format=None):
+    """音声合成を実行し、成功した場合は合成したエンジンのキーでキャッシュに保存
+
+    🆕 エンジンは TTS_ENGINE_POLICY の順に試し、失敗すれば次のエンジンで再試行する
+    （ENABLE_TTS_ROUTING / ENABLE_TTS_HEDGING を有効にした場合は、ルーターが速いエンジンを選び・ヘッジする）。
+
+    Returns:
+        (cache_key, audio_base64): 生成できなければ (None, None)
+    """
+    engines = voice_engines(language)
+    # 🆕 サーキットブレーカーが開いているエンジンは待たずに飛ばす（全て開いていればそのまま試す）
+    candidates = [engine for engine in engines if not circuit_breaker.is_open(engine)] or engines
+    try:
+        engine, audio_content = tts_router.call(
+            candidates,
+            lambda engine: tts_engines.synthesize(engine, text, language, emotion_params, output_format)
+        )
     except Exception as e:
         print(f"❌ 音声生成エラー: {e}")
-        import traceback
-        traceback.print_exc()
-        return None
+        return None, None
+    
+    # 🆕 一時ファイルを経由せずBase64エンコード
+    audio_base64 = base64.b64encode(audio_content).decode('utf-8')
+    engine_used = tts_engines.label(engine)
+    if engine != engines[0]:
+        engine_used += ' (フォールバック)'
+    # 🆕 キーには実際に合成したエンジン・声を含める（先頭のエンジンのキーで別の声を再生しない）
+    cache_key = tts_engines.cache_key(engine, text, language, emotion_params, output_format)
+    _remember_audio(cache_key, audio_base64, audio_content, engine_used)
+    return cache_key, audio_base64
+
+def _remember_audio(cache_key, audio_base64, audio_content, engine_used):
+    """合成した音声をキャッシュに保存（合計バイト数の上限を超えたら使われていないものから削除）"""
+    audio_cache.set(cache_key, audio_base64)
+    tracing.annotate(audio_engine=engine_used)
+    # 🆕 ディスクにも元のバイト列で保存
+    if audio_store is not None:
+        try:
+            audio_store.put(cache_key, audio_content)
+        except OSError as e:
+            print(f"⚠️ 音声ストアへの保存エラー: {e}")
+    
+    print(f"🎵 音声生成完了: {cache_key[:8]} (エンジン: {engine_used})")
+
+# ====== 🆕 音声のストリーミング合成 ======
+def stream_audio_by_language(text, language, emotion_params, on_chunk, output_format=None):
+    """音声を合成しながら、届いたMP3の断片を on_chunk(seq, chunk) で渡す
+
+    ストリーミングできるのはポリシーの先頭のエンジンがストリーミングに対応している場合のみ
+    （ElevenLabs・SDKのプールを使うAzure。断片はMediaSourceで再生できるmp3で、キャッシュキーもmp3の形式）。
+    ルーターが別のエンジンを選ぶ場合・キャッシュにある音声・同じ音声を他のリクエストが合成中の場合は、
+    通常どおり音声全体を返す（on_chunkは呼ばれない）。
+    ストリーミングが途中で失敗した場合は通常の合成（他のエンジンへのフォールバックを含む）でやり直す。
+
+    Returns:
+        (cache_key, audio_base64, streamed): 音声のキャッシュキーとBase64（generate_audio と同じ）と、
+        全ての断片をon_chunkで渡し終えたか
+    """
+    engines = voice_engines(language)
+    engine = tts_engines.get(engines[0])
+    if engine is not None and engine.streaming:
+        output_format = 'mp3'
+    cache_key = audio_cache_key(text, language, emotion_params, output_format)
+    if (engine is None or not engine.streaming or tts_router.order(engines)[0] != engines[0]
+            or circuit_breaker.is_open(engines[0]) or has_audio(cache_key)):
+        return generate_audio(text, language, emotion_params, output_format) + (False,)
+
+    streamed = []
+
+    def synthesize():
+        started = time.perf_counter()
+        try:
+            audio_base64 = _stream_synthesize(engine, text, language, emotion_params, cache_key, on_chunk)
+            tts_router.record(engine.name, time.perf_counter() - started, True)
+            streamed.append(True)
+            return cache_key, audio_base64
+        except Exception as e:
+            tts_router.record(engine.name, time.perf_counter() - started, False)
+            print(f"⚠️ {engine.label}のストリーミング合成エラー、通常の合成で再試行: {e}")
+            return _synthesize_audio(text, language, emotion_params, output_format)
+
+    with tracing.span('tts'):
+        result, shared = audio_flights.do(cache_key, synthesize, timeout=SINGLE_FLIGHT_TIMEOUT)
+    if shared:
+        print(f"🎵 合成中の音声を共有: {cache_key[:8]}")
+        tracing.annotate(audio_engine='coalesced')
+    return result + (bool(streamed),)
+
+def _stream_synthesize(engine, text, language, emotion_params, cache_key, on_chunk):
+    """ストリーミング合成。全ての断片を渡し終えたら、つなげた音声をキャッシュに保存"""
+    chunks = []
+    for chunk in tts_engines.stream(engine.name, text, language, emotion_params, chunk_size=AUDIO_STREAM_CHUNK_BYTES):
+        on_chunk(len(chunks), chunk)
+        chunks.append(chunk)
+
+    audio_content = b''.join(chunks)
+    if not audio_content:
+        raise Exception(f"{engine.label}のストリーミング応答が空です")
+    print(f"✅ {engine.label}ストリーミング音声生成成功: {len(audio_content)} バイト ({len(chunks)}断片)")
+
+    audio_base64 = base64.b64encode(audio_content).decode('utf-8')
+    _remember_audio(cache_key, audio_base64, audio_content, f'{engine.label} (ストリーミング)')
+    return audio_base64
+
+# ====== 🆕 音声のURL配信 ======
+# 音声のURLはキャッシュキー（読み上げる内容のハッシュ）なので、同じURLの中身は変わらない
+AUDIO_URL_MAX_AGE = 365 * 24 * 60 * 60
+AUDIO_KEY_PATTERN = re.compile(r'[0-9a-f]{64}')
+
+def has_audio(cache_key):
+    """音声がメモリかディスクのキャッシュにあるか（統計には数えない）"""
+    return cache_key in audio_cache or (audio_store is not None and audio_store.contains(cache_key))
+
+def find_audio(cache_key):
+    """キャッシュキーの音声を探す
+
+    Returns:
+        (path, data): ディスクにあればファイルのパス、メモリにだけあればバイト列（なければ両方None）
+    """
+    if audio_store is not None and audio_store.contains(cache_key):
+        return audio_store.path(cache_key), None
+    audio_base64 = audio_cache.get(cache_key)
+    if audio_base64:
+        return None, base64.b64decode(audio_base64)
+    return None, None
+
+def audio_url_fields(cache_key):
+    """イベントに載せる音声の項目（URLと再生時間の推定値）"""
+    info = audio_store.describe(cache_key) if audio_store is not None else None
+    if info is None:
+        _, data = find_audio(cache_key)
+        if not data:
+            return {}
+        info = (audio_format(data), len(data), audio_duration(data, len(data)))
+    _, size, duration = info
+    return {'audioUrl': f'/audio/{cache_key}', 'audioDuration': duration, 'audioBytes': size}
+
+def audio_binary_fields(cache_key):
+    """イベントに載せる音声の項目（バイト列のまま。Socket.IOのバイナリ添付として送られる）"""
+    path, data = find_audio(cache_key)
+    if path:
+        data = audio_store.get(cache_key)
+    if not data:
+        return {}
+    return {
+        'audio': data,
+        'audioFormat': AUDIO_MIMETYPES[audio_format(data)],
+        'audioDuration': audio_duration(data, len(data))
+    }
+
+def base64_audio_fields(audio_base64):
+    """イベントに載せる音声の項目（Base64。mp3以外の形式もあるので形式を添える）"""
+    return {
+        'audio': audio_base64,
+        'audioFormat': AUDIO_MIMETYPES[audio_format(base64.b64decode(audio_base64[:16]))]
+    }
+
+def resolve_audio_transport(requested=None):
+    """音声の受け渡し方式（'binary' は接続時にクライアントが指定した場合のみ）"""
+    if requested == 'binary' and ENABLE_BINARY_AUDIO:
+        return 'binary'
+    if requested == 'base64' or not ENABLE_AUDIO_URLS:
+        return 'base64'
+    return 'url'
+
+def _session_info(session_id=None):
+    """session_idを省略した場合はSocket.IOハンドラーのリクエストのセッション"""
+    if session_id is None and has_request_context():
+        session_id = getattr(request, 'sid', None)
+    return (session_data.get(session_id) if session_id else None) or {}
+
+def session_audio_transport(session_id=None):
+    """セッションの音声の受け渡し方式"""
+    return _session_info(session_id).get('audio_transport') or resolve_audio_transport()
+
+def session_audio_streaming(session_id=None):
+    """🆕 セッションのクライアントがストリーミング再生（audio_chunk）に対応しているか"""
+    return ENABLE_AUDIO_STREAMING and bool(_session_info(session_id).get('audio_stream'))
+
+def session_output_format(session_id=None):
+    """🆕 セッションのAzure Speechの出力形式（接続時にクライアントと決めたもの）"""
+    return _session_info(session_id).get('output_format') or negotiate_output_format(None)
+
+def generate_audio_fields(text, language='ja', emotion_params='neutral', transport=None, output_format=None):
+    """音声を生成し、イベントに載せる項目を返す
+
+    受け渡し方式（省略時はセッションの方式）:
+        url: audioUrl（と再生時間）だけを載せ、音声本体はブラウザが /audio/<キー> から取得する
+        binary: audio にバイト列のまま載せる（Socket.IOのバイナリ添付）
+        base64: audio にBase64で埋め込む（従来の方式）
+    output_format（Azure Speechの出力形式）も省略時はセッションの形式。生成できなければ空のdict。
+    """
+    transport = transport or session_audio_transport()
+    output_format = output_format or session_output_format()
+    if transport != 'base64':
+        cache_key = audio_cache_key(text, language, emotion_params, output_format)
+        if has_audio(cache_key):
+            tracing.annotate(audio_engine='cache')
+            return audio_fields_for_key(cache_key, None, transport)
+
+    cache_key, audio_base64 = generate_audio(text, language, emotion_params, output_format)
+    return audio_fields_for_key(cache_key, audio_base64, transport) if audio_base64 else {}
+
+def audio_fields_for_key(cache_key, audio_base64, transport):
+    """🆕 キャッシュ済みの音声をイベントに載せる項目（base64方式では audio_base64 を使う）"""
+    if transport == 'base64':
+        return base64_audio_fields(audio_base64)
+    return audio_binary_fields(cache_key) if transport == 'binary' else audio_url_fields(cache_key)
+
+def audio_fields_for_bundle(bundle, audio_base64, transport=None):
+    """静的バンドルの作成済み音声をイベントに載せる項目（URL・バイナリ方式ではメモリキャッシュに登録して参照する）"""
+    transport = transport or session_audio_transport()
+    if transport == 'base64':
+        return base64_audio_fields(audio_base64)
+    # バンドルの音声はビルド時の形式（Azureの場合は形式ごとに別のキー）
+    bundle_format = audio_format(base64.b64decode(audio_base64[:16]))
+    cache_key = audio_cache_key(bundle['text'], bundle['language'], bundle['emotion'], bundle_format)
+    if not has_audio(cache_key):
+        audio_cache.set(cache_key, audio_base64)
+    return audio_binary_fields(cache_key) if transport == 'binary' else audio_url_fields(cache_key)
 
 # ====== カスタム応答調整 ======
 def adjust_response_style(response, language='ja', relationship_style='formal'):
@@ -961,21 +845,22 @@ def adjust_response_style(response, language='ja', relationship_style='formal'):
         if relationship_style == 'casual':
             # カジュアルな英語に変換
             try:
-                translation = client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {
-                            "role": "system", 
-                            "content": "Convert this text to casual, friendly English. Use contractions and informal language. Maintain the casual, friendly tone."
-                        },
-                        {
-                            "role": "user", 
-                            "content": response
-                        }
-                    ],
-                    temperature=0.7,
-                    max_tokens=100
-                )
+                with tracing.span('style_rewrite'), circuit_breaker.guard('openai_chat'):
+                    translation = client.chat.completions.create(
+                        model="gpt-3.5-turbo",
+                        messages=[
+                            {
+                                "role": "system", 
+                                "content": "Convert this text to casual, friendly English. Use contractions and informal language. Maintain the casual, friendly tone."
+                            },
+                            {
+                                "role": "user", 
+                                "content": response
+                            }
+                        ],
+                        temperature=0.7,
+                        max_tokens=100
+                    )
                 return translation.choices[0].message.content
             except Exception as e:
                 print(f"翻訳エラー: {e}")
@@ -992,75 +877,15 @@ def analyze_emotion(text):
     Returns: 感情文字列 ('neutral', 'happy', 'sad', 'angry', 'surprise', 
              'dangerquestion', 'responseready', 'start')
     """
-    if not text:
-        return 'neutral'
+    # 🆕 判定ルールは emotion_engine.LIVE2D_RULES['application']（1回の走査で全キーワードを照合）
+    emotion = emotion_engine.classify(text, 'application')
     
-    text_lower = text.lower().strip()
-    
-    # 1. DangerQuestion判定(不適切な質問) - 最優先
-    danger_keywords = [
-        # 日本語
-        'セクシー', 'エロ', '裸', '脱', '下着', '胸', 'おっぱい',
-        'パンツ', 'ブラ', 'きわどい', 'えっち', 'いやらしい',
-        # 英語
-        'sexy', 'nude', 'naked', 'breast', 'underwear', 'erotic',
-        'strip', 'panties', 'bra', 'inappropriate'
-    ]
-    
-    if any(keyword in text_lower for keyword in danger_keywords):
+    if emotion == 'dangerquestion':
         print(f"🚫 DangerQuestion detected: {text[:30]}...")
-        return 'dangerquestion'
-    
-    # 2. ResponseReady判定(真剣な質問)
-    serious_indicators = 0
-    
-    # 質問マーカーチェック
-    question_markers = ['?', '?', 'どう', 'なぜ', 'なに', '教えて', 
-                       'how', 'why', 'what', 'explain']
-    if any(marker in text_lower for marker in question_markers):
-        serious_indicators += 1
-    
-    # 長文チェック(50文字以上)
-    if len(text) > 50:
-        serious_indicators += 1
-    
-    # 専門用語チェック
-    technical_terms = ['方法', '手順', '技術', '仕組み', 'やり方', 
-                      '原理', 'システム', '詳しく', '具体的']
-    if any(term in text_lower for term in technical_terms):
-        serious_indicators += 1
-    
-    if serious_indicators >= 2:
+    elif emotion == 'responseready':
         print(f"📚 ResponseReady detected: {text[:30]}...")
-        return 'responseready'
-    
-    # 3. 基本感情の判定
-    # Happy
-    happy_words = ['嬉しい', 'うれしい', '楽しい', 'たのしい', 'わくわく',
-                   'やった', '最高', 'happy', 'glad', 'excited', 'joy', 'great']
-    if any(word in text_lower for word in happy_words):
-        return 'happy'
-    
-    # Sad
-    sad_words = ['悲しい', 'かなしい', '寂しい', 'さみしい', '辛い', 'つらい',
-                 '泣', '涙', 'sad', 'lonely', 'cry', 'tear', 'depressed']
-    if any(word in text_lower for word in sad_words):
-        return 'sad'
-    
-    # Angry
-    angry_words = ['怒', 'おこ', 'むかつく', 'イライラ', '腹立', 'ムカ',
-                   'angry', 'mad', 'furious', 'annoyed', 'pissed']
-    if any(word in text_lower for word in angry_words):
-        return 'angry'
-    
-    # Surprise
-    surprise_words = ['驚', 'びっくり', 'すごい', 'まさか', 'えっ', 'わっ',
-                      'surprise', 'amazing', 'wow', 'incredible', 'unbelievable']
-    if any(word in text_lower for word in surprise_words):
-        return 'surprise'
-    
-    # デフォルト
-    return 'neutral'
+    
+    return emotion
 
 # ====== 【新規追加】感情タグ抽出関数 ======
 def extract_emotion_tag(response_text):
@@ -1099,6 +924,44 @@ def extract_emotion_tag(response_text):
     print(f"⚠️ 感情タグなし → neutral")
     return response_text, 'neutral'
 
+# ====== 🆕 ストリーミング用: 感情タグのフィルタ ======
+class EmotionTagStreamFilter:
+    """ストリーミング中の差分テキストから[EMOTION:xxx]タグを取り除く
+
+    タグはトークン単位で分割されて届く（例: "[EMO" + "TION:ha" + "ppy]"）ため、
+    タグの途中かもしれない末尾部分は次の差分が届くまで保留する。
+    タグ自体の抽出は、連結した全文に対してextract_emotion_tag()で行う。
+    """
+    TAG_PREFIX = '[EMOTION:'
+
+    def __init__(self):
+        self.pending = ''
+
+    def feed(self, delta):
+        """差分を受け取り、クライアントに表示してよいテキストを返す"""
+        text = re.sub(r'\[EMOTION:\w+\]', '', self.pending + delta)
+        self.pending = ''
+
+        start = text.rfind('[')
+        if start != -1 and self._may_be_tag(text[start:]):
+            self.pending = text[start:]
+            text = text[:start]
+
+        return text
+
+    def flush(self):
+        """ストリーム終了時に保留中のテキストを返す（タグでなかった場合）"""
+        text = re.sub(r'\[EMOTION:\w+\]', '', self.pending)
+        self.pending = ''
+        return text
+
+    def _may_be_tag(self, fragment):
+        """fragmentが未完成の感情タグである可能性があるか"""
+        head = fragment[:len(self.TAG_PREFIX)]
+        if not self.TAG_PREFIX.startswith(head):
+            return False
+        return re.fullmatch(r'\w*', fragment[len(self.TAG_PREFIX):]) is not None
+
 # ====== 【追加箇所4】感情検証ヘルパー関数 ======
 def validate_emotion(emotion):
     """感情の検証と正規化"""
@@ -1275,6 +1138,148 @@ def update_emotion_history(session_id, emotion, mental_state=None):
                 'timestamp': datetime.now().isoformat()
             })
 
+def stream_rag_response(message, language, conversation_history, message_id, audio_pipeline=None, query_embedding=None):
+    """RAG応答をストリーミング生成し、差分をresponse_chunkで送信する
+
+    audio_pipelineが渡された場合は、表示用テキストを文単位の音声合成にも流す。
+    query_embeddingは意味キャッシュで計算済みの質問の埋め込み（類似検索に再利用）。
+
+    Returns:
+        (str, bool): 連結・整形済みの応答全文（[EMOTION:xxx]タグ付き）と、最後まで生成できたか
+        （途中で失敗した場合は届いた分までの応答を返す。キャッシュには登録しないこと）
+    """
+    tag_filter = EmotionTagStreamFilter()
+    parts = []
+    complete = True
+
+    def send_visible(visible_text):
+        if not visible_text:
+            return
+        emit('response_chunk', {'messageId': message_id, 'text': visible_text})
+        if audio_pipeline:
+            audio_pipeline.feed(visible_text)
+
+    deltas = chatbot.get_response_stream(
+        message,
+        language=language,
+        conversation_history=conversation_history,
+        query_embedding=query_embedding
+    )
+    while True:
+        # 生成側の失敗だけを捕まえる（送信側の例外は呼び出し元のエラー処理へ）
+        try:
+            delta = next(deltas)
+        except StopIteration:
+            break
+        except Exception as e:
+            print(f"⚠️ ストリーミング応答が途中で失敗（届いた分までを送信・キャッシュしない）: {e}")
+            complete = False
+            break
+        parts.append(delta)
+        send_visible(tag_filter.feed(delta))
+
+    send_visible(tag_filter.flush())
+
+    return chatbot.trim_incomplete_answer(''.join(parts), language), complete
+
+def create_sentence_audio_pipeline(session_id, message_id, language, relationship_style, trace=None):
+    """文単位の音声合成パイプラインを作成（音声はaudio_segmentで順番に送信）
+
+    感情タグは応答の最後に届くため、文単位の音声は'neutral'スタイルで合成する。
+    traceを渡すと全ての文の合成が終わるまでトレースの書き出しを遅らせる。
+    """
+    if trace:
+        trace.hold()
+    transport = session_audio_transport(session_id)
+    output_format = session_output_format(session_id)
+
+    def synthesize(text):
+        text = adjust_response_style(text, language, relationship_style)
+        if trace:
+            with trace.activated():
+                return generate_audio_fields(text, language, emotion_params='neutral',
+                                             transport=transport, output_format=output_format)
+        return generate_audio_fields(text, language, emotion_params='neutral',
+                                     transport=transport, output_format=output_format)
+
+    def on_segment(index, text, audio_fields):
+        print(f"🔊 音声セグメント送信: #{index} ({len(text)}文字)")
+        socketio.emit('audio_segment', {
+            'messageId': message_id,
+            'index': index,
+            'text': text,
+            **audio_fields
+        }, to=session_id)
+
+    def on_complete(total):
+        socketio.emit('audio_segments_done', {
+            'messageId': message_id,
+            'total': total
+        }, to=session_id)
+        if trace:
+            trace.annotate(audio_segments=total)
+            trace.release()
+
+    return SentenceAudioPipeline(tts_executor, synthesize, on_segment, on_complete)
+
+def stream_audio_fields(session_id, message_id, text, language, emotion, transport, output_format):
+    """🆕 音声をストリーミングで合成し、届いた断片をaudio_chunk（バイナリ添付）で送る
+
+    全ての断片を送れた場合はaudio_readyに音声本体を載せない（streamed=True と再生時間のみ）。
+    ストリーミングしなかった場合は generate_audio_fields と同じ項目を返す。
+    """
+    def on_chunk(seq, chunk):
+        socketio.emit('audio_chunk', {
+            'messageId': message_id,
+            'seq': seq,
+            'chunk': chunk,
+            'audioFormat': AUDIO_MIMETYPES['mp3']
+        }, to=session_id)
+
+    cache_key, audio_base64, streamed = stream_audio_by_language(text, language, emotion, on_chunk, output_format)
+    if not audio_base64:
+        return {}
+    if streamed:
+        data = base64.b64decode(audio_base64)
+        return {'streamed': True, 'audioDuration': audio_duration(data, len(data))}
+    # キャッシュに入ったので、通常の項目はキャッシュから作る（フォールバックした場合はそのエンジンのキー）
+    return audio_fields_for_key(cache_key, audio_base64, transport)
+
+def deliver_audio_async(session_id, message_id, text, language, emotion, trace=None):
+    """音声合成をワーカープールで実行し、完成したらaudio_readyで送信する
+
+    Socket.IOハンドラーのスレッドをTTS待ちで塞がないための後送り処理。
+    traceを渡すと音声の送信後にトレースを書き出す。
+    🆕 クライアントがストリーミング再生に対応していれば、合成中の音声をaudio_chunkで先に送る。
+    """
+    trace = trace.hold() if trace else tracing.Trace(trace_id=message_id, session_id=session_id)
+    transport = session_audio_transport(session_id)
+    output_format = session_output_format(session_id)
+    streaming = session_audio_streaming(session_id)
+
+    def job():
+        try:
+            with trace.activated():
+                if streaming:
+                    audio_fields = stream_audio_fields(session_id, message_id, text, language, emotion,
+                                                       transport, output_format)
+                else:
+                    audio_fields = generate_audio_fields(text, language, emotion_params=emotion,
+                                                         transport=transport, output_format=output_format)
+        except Exception as e:
+            print(f"❌ 音声生成エラー(後送り): {e}")
+            audio_fields = {}
+
+        socketio.emit('audio_ready', {
+            'messageId': message_id,
+            **audio_fields,
+            'emotion': emotion
+        }, to=session_id)
+        print(f"🔊 audio_ready送信: {message_id[:8]} (音声={'あり' if audio_fields else 'なし'})")
+        trace.release()
+
+    tts_executor.submit(job)
+
 def normalize_question(question):
     """質問を正規化(重複判定用)"""
     return question.lower().replace('?', '').replace('?', '').replace('。', '').replace('、', '').replace('!', '').replace('!', '').strip()
@@ -1282,8 +1287,19 @@ def normalize_question(question):
 def print_cache_stats():
     """キャッシュ統計を表示"""
     print(f"📊 キャッシュ統計:")
-    print(f"  - 会話キャッシュ: {len(conversation_cache)} エントリ")
-    print(f"  - 音声キャッシュ: {len(audio_cache)} エントリ")
+    for cache in (conversation_cache, audio_cache):
+        stats = cache.stats()
+        label = '会話キャッシュ' if cache is conversation_cache else '音声キャッシュ'
+        print(f"  - {label}: {stats['entries']} エントリ / {stats['bytes'] / 1024:.0f} KB "
+              f"(ヒット率 {stats['hit_rate']:.0%}, 削除 {stats['evictions']}, 期限切れ {stats['expirations']})")
+    if audio_store is not None:
+        store_stats = audio_store.stats()
+        print(f"  - 音声ストア: {store_stats['bytes'] / 1024 / 1024:.1f} MB "
+              f"(ヒット率 {store_stats['hit_rate']:.0%}, 保存 {store_stats['writes']}, 削除 {store_stats['evictions']})")
+    print(f"  - 合流したリクエスト: 会話 {conversation_flights.coalesced} / 音声 {audio_flights.coalesced}")
+    semantic_stats = semantic_cache.stats()
+    print(f"  - 意味キャッシュ: {semantic_stats['entries']} エントリ "
+          f"(ヒット {semantic_stats['hits']} / ミス {semantic_stats['misses']}, 閾値 {semantic_stats['threshold']})")
     print(f"  - アクティブセッション: {len(session_data)}")
     print(f"  - 登録訪問者: {len(visitor_data)}")
 
@@ -1295,8 +1311,11 @@ def index():
 @app.route('/health')
 def health_check():
     """ヘルスチェックエンドポイント"""
+    breakers = circuit_breaker.stats()
+    azure_engine = tts_engines.get('azure_speech')
     return jsonify({
-        'status': 'healthy',
+        # 🆕 サーキットブレーカーが開いている外部依存があれば degraded
+        'status': 'degraded' if any(b['state'] == 'open' for b in breakers.values()) else 'healthy',
         'timestamp': datetime.now().isoformat(),
         'active_sessions': len(session_data),
         'visitors': len(visitor_data),
@@ -1304,13 +1323,127 @@ def health_check():
             'conversation': len(conversation_cache),
             'audio': len(audio_cache)
         },
+        'cache_stats': {
+            'conversation': conversation_cache.stats(),
+            'audio': audio_cache.stats()
+        },
+        'semantic_cache': semantic_cache.stats(),
+        'audio_store': audio_store.stats() if audio_store is not None else None,
+        'tts_router': tts_router.stats(),
+        'circuit_breakers': breakers,
+        'tts_engines': tts_engines.stats(),
+        'azure_sdk': (azure_engine.synthesizer_pool.stats()
+                      if azure_engine is not None and azure_engine.synthesizer_pool else None),
         'services': {
             'openai': client is not None,
             'rag': chatbot is not None,
-            'coefont': use_coe_font
+            'elevenlabs': 'elevenlabs' in tts_engines,
+            'azure_speech': 'azure_speech' in tts_engines
         }
     })
 
+@app.route('/audio/<cache_key>')
+def serve_audio(cache_key):
+    """🆕 合成済み音声の配信（内容が変わらないのでimmutable。ETag・Rangeリクエストに対応）"""
+    if not AUDIO_KEY_PATTERN.fullmatch(cache_key):
+        abort(404)
+
+    path, data = find_audio(cache_key)
+    response = None
+    if path:
+        try:
+            with open(path, 'rb') as f:
+                mimetype = AUDIO_MIMETYPES[audio_format(f.read(12))]
+            response = send_file(path, mimetype=mimetype, conditional=True,
+                                 etag=cache_key, max_age=AUDIO_URL_MAX_AGE)
+        except FileNotFoundError:
+            # 確認した直後に削除された（他のワーカーによる削除）→ メモリのキャッシュを確認
+            audio_base64 = audio_cache.get(cache_key)
+            data = base64.b64decode(audio_base64) if audio_base64 else None
+    if response is None:
+        if not data:
+            abort(404)
+        response = send_file(io.BytesIO(data), mimetype=AUDIO_MIMETYPES[audio_format(data)],
+                             conditional=True, etag=cache_key, max_age=AUDIO_URL_MAX_AGE)
+
+    response.headers['Cache-Control'] = f'public, max-age={AUDIO_URL_MAX_AGE}, immutable'
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus形式のメトリクス（段階別・外部依存別のレイテンシ、キャッシュ、接続数）"""
+    response = make_response(metrics.registry.render())
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return response
+
+def collect_cache_metrics():
+    """スクレイプ時にキャッシュの統計を出力（各キャッシュが保持しているカウンターを読むだけ）"""
+    caches = {
+        'conversation': conversation_cache.stats(),
+        'audio': audio_cache.stats(),
+        'semantic': semantic_cache.stats()
+    }
+    lines = [
+        '# HELP futaba_cache_hits_total Cache hits',
+        '# TYPE futaba_cache_hits_total counter'
+    ]
+    lines += [f'futaba_cache_hits_total{{cache="{name}"}} {s["hits"]}' for name, s in caches.items()]
+    lines += [
+        '# HELP futaba_cache_misses_total Cache misses',
+        '# TYPE futaba_cache_misses_total counter'
+    ]
+    lines += [f'futaba_cache_misses_total{{cache="{name}"}} {s["misses"]}' for name, s in caches.items()]
+    lines += [
+        '# HELP futaba_cache_hit_ratio Cache hit ratio since start',
+        '# TYPE futaba_cache_hit_ratio gauge'
+    ]
+    lines += [f'futaba_cache_hit_ratio{{cache="{name}"}} {s["hit_rate"]}' for name, s in caches.items()]
+    lines += [
+        '# HELP futaba_cache_entries Cache entries',
+        '# TYPE futaba_cache_entries gauge'
+    ]
+    lines += [f'futaba_cache_entries{{cache="{name}"}} {s["entries"]}' for name, s in caches.items()]
+    lines += [
+        '# HELP futaba_cache_bytes Approximate cache size in bytes',
+        '# TYPE futaba_cache_bytes gauge',
+        f'futaba_cache_bytes{{cache="conversation"}} {caches["conversation"]["bytes"]}',
+        f'futaba_cache_bytes{{cache="audio"}} {caches["audio"]["bytes"]}',
+        '# HELP futaba_coalesced_requests_total Requests that shared an in-flight result',
+        '# TYPE futaba_coalesced_requests_total counter',
+        f'futaba_coalesced_requests_total{{cache="conversation"}} {conversation_flights.coalesced}',
+        f'futaba_coalesced_requests_total{{cache="audio"}} {audio_flights.coalesced}',
+        '# HELP futaba_single_flight_inflight Keys currently being generated',
+        '# TYPE futaba_single_flight_inflight gauge',
+        f'futaba_single_flight_inflight{{cache="conversation"}} {conversation_flights.in_flight()}',
+        f'futaba_single_flight_inflight{{cache="audio"}} {audio_flights.in_flight()}'
+    ]
+    # 🆕 ディスクの音声ストア
+    if audio_store is not None:
+        store = audio_store.stats()
+        lines += [
+            '# HELP futaba_audio_store_lookups_total Disk audio store lookups',
+            '# TYPE futaba_audio_store_lookups_total counter',
+            f'futaba_audio_store_lookups_total{{result="hit"}} {store["hits"]}',
+            f'futaba_audio_store_lookups_total{{result="miss"}} {store["misses"]}',
+            '# HELP futaba_audio_store_writes_total Audio files written to the disk store',
+            '# TYPE futaba_audio_store_writes_total counter',
+            f'futaba_audio_store_writes_total {store["writes"]}',
+            '# HELP futaba_audio_store_evictions_total Audio files evicted from the disk store',
+            '# TYPE futaba_audio_store_evictions_total counter',
+            f'futaba_audio_store_evictions_total {store["evictions"]}',
+            '# HELP futaba_audio_store_bytes Total size of the disk audio store',
+            '# TYPE futaba_audio_store_bytes gauge',
+            f'futaba_audio_store_bytes {store["bytes"]}'
+        ]
+    return lines
+
+metrics.registry.add_collector(collect_cache_metrics)
+metrics.registry.add_collector(http_pool.collect_metrics)
+metrics.registry.add_collector(tts_router.collect_metrics)
+metrics.registry.add_collector(circuit_breaker.collect_metrics)
+metrics.registry.add_collector(tts_engines.collect_metrics)
+tracing.add_span_listener(metrics.observe_stage)
+
 @app.route('/api/coefont/status')
 def coefont_status():
     """CoeFont APIの状態を確認"""
@@ -1520,26 +1653,26 @@ def handle_user_type_selection(data):
     # 音声生成
     try:
         print(f"🎤 音声生成開始: テキスト長={len(message)}, 言語={language}, 感情=neutraltalking")
-        audio_data = generate_audio_by_language(message, language, emotion_params='neutraltalking')
+        audio_fields = generate_audio_fields(message, language, emotion_params='neutraltalking')
         
-        if audio_data:
-            audio_size = len(audio_data) if isinstance(audio_data, str) else 0
-            print(f"✅ 音声生成成功: {audio_size} bytes")
+        if audio_fields:
+            print(f"✅ 音声生成成功: {audio_fields.get('audioBytes') or len(audio_fields.get('audio') or '')} bytes")
         else:
-            print(f"⚠️ 音声生成失敗: audio_data is None")
+            print(f"⚠️ 音声生成失敗: 音声なし")
             
     except Exception as e:
         print(f"❌ 音声生成エラー: {e}")
         import traceback
         traceback.print_exc()
-        audio_data = None
+        audio_fields = {}
     
     # クライアントに送信
     emit('user_type_selected', {
         'message': message,
         'emotion': 'neutraltalking',
-        'audio': audio_data,
+        **audio_fields,
         'suggestions': phase1_suggestions,
+        'suggestionIds': get_suggestion_ids(phase1_suggestions, language),
         'userType': user_type,
         'language': language
     })
@@ -1551,6 +1684,7 @@ def handle_user_type_selection(data):
 def handle_connect():
     """WebSocket接続時の処理"""
     session_id = request.sid
+    metrics.active_connections.inc()
     visitor_id = request.args.get('visitor_id', str(uuid.uuid4()))
     
     print(f"🔗 新規接続: Session={session_id}, Visitor={visitor_id}")
@@ -1574,9 +1708,18 @@ def handle_connect():
             },
             'selected_suggestions': [],
             'current_emotion': 'neutral',
-            'relationship_style': 'formal'
+            'relationship_style': 'formal',
+            # 🆕 音声の受け渡し方式（接続時のクエリ audio_transport=binary でバイナリ添付）
+            'audio_transport': resolve_audio_transport(request.args.get('audio_transport')),
+            # 🆕 Azure Speechの出力形式（接続時のクエリ audio_formats=opus,mp3 でクライアントが再生できる形式を伝える）
+            'output_format': negotiate_output_format(request.args.get('audio_formats')),
+            # 🆕 ストリーミング再生（MediaSource）に対応したクライアントは audio_stream=1 を指定する
+            'audio_stream': request.args.get('audio_stream') == '1'
         }
         
+        # 🆕 音声エンジンの接続を準備（Azure SpeechのSDKなど。gunicornのワーカーごとに初回だけ。バックグラウンドで実行）
+        tts_engines.warm_up(session_data[session_id]['output_format'])
+        
         # 🐶 Futaba用: 属性選択無効時は自動的にuser_typeを設定
         if not ENABLE_USER_TYPE_SELECTION:
             session_data[session_id]['user_type'] = DEFAULT_USER_TYPE
@@ -1594,23 +1737,23 @@ def handle_connect():
                 
                 # 音声生成
                 try:
-                    audio_data = generate_audio_by_language(
+                    audio_fields = generate_audio_fields(
                         intro_message, 
                         'ja', 
                         emotion_params=intro_emotion
                     )
                 except Exception as e:
                     print(f"❌ 挨拶音声生成エラー: {e}")
-                    audio_data = None
+                    audio_fields = {}
                 
                 # 初回挨拶データ
                 greeting_data = {
                     'message': intro_message,
                     'emotion': intro_emotion,
-                    'audio': audio_data,
+                    **audio_fields,
                     'isGreeting': True,
                     'language': 'ja',
-                    'voice_engine': 'elevenlabs' if use_elevenlabs else ('azure_speech' if use_azure_speech else 'openai_tts'),
+                    'voice_engine': active_voice_engine('ja'),
                     'relationshipLevel': 'formal',
                     'mentalState': session_data[session_id]['mental_state'],
                     'enableUserTypeSelection': ENABLE_USER_TYPE_SELECTION  # 🐶 フラグを送信
@@ -1630,6 +1773,7 @@ def handle_connect():
                         print(f"⚠️ サジェスチョン生成エラー: {e}")
                         greeting_data['suggestions'] = []
                 
+                greeting_data['suggestionIds'] = get_suggestion_ids(greeting_data['suggestions'], 'ja')
                 emit('greeting', greeting_data)
                 
                 # 感情履歴を更新
@@ -1675,22 +1819,22 @@ def handle_connect():
         update_emotion_history(session_id, greeting_emotion)
         
         try:
-            audio_data = generate_audio_by_language(
+            audio_fields = generate_audio_fields(
                 greeting_message, 
                 language, 
                 emotion_params=greeting_emotion
             )
         except Exception as e:
             print(f"❌ 挨拶音声生成エラー: {e}")
-            audio_data = None
+            audio_fields = {}
         
         greeting_data = {
             'message': greeting_message,
             'emotion': greeting_emotion,
-            'audio': audio_data,
+            **audio_fields,
             'isGreeting': True,
             'language': language,
-            'voice_engine': 'elevenlabs' if (use_elevenlabs and language == 'ja') else ('azure_speech' if (use_azure_speech and language == 'ja') else 'openai_tts'),
+            'voice_engine': active_voice_engine(language),
             'relationshipLevel': relationship_style,
             'mentalState': data['mental_state'],
             'enableUserTypeSelection': ENABLE_USER_TYPE_SELECTION  # 🐶 フラグを送信
@@ -1736,6 +1880,7 @@ def handle_connect():
                 print(f"⚠️ サジェスチョン生成エラー: {e}")
                 greeting_data['suggestions'] = []
         
+        greeting_data['suggestionIds'] = get_suggestion_ids(greeting_data['suggestions'], language)
         emit('greeting', greeting_data)
     
     emit('status', {'message': '接続成功'})
@@ -1774,22 +1919,22 @@ def handle_set_language(data):
     greeting_emotion = "start"
     
     try:
-        audio_data = generate_audio_by_language(
+        audio_fields = generate_audio_fields(
             greeting_message, 
             language, 
             emotion_params=greeting_emotion
         )
     except Exception as e:
         print(f"❌ 挨拶音声生成エラー: {e}")
-        audio_data = None
+        audio_fields = {}
     
     greeting_data = {
         'message': greeting_message,
         'emotion': greeting_emotion,
-        'audio': audio_data,
+        **audio_fields,
         'isGreeting': True,
         'language': language,
-        'voice_engine': 'elevenlabs' if (use_elevenlabs and language == 'ja') else ('azure_speech' if (use_azure_speech and language == 'ja') else 'openai_tts'),
+        'voice_engine': active_voice_engine(language),
         'relationshipLevel': relationship_style,
         'mentalState': session_info['mental_state'],
         'enableUserTypeSelection': ENABLE_USER_TYPE_SELECTION  # 🐶 フラグを送信
@@ -1837,11 +1982,13 @@ def handle_set_language(data):
             print(f"⚠️ サジェスチョン生成エラー: {e}")
             greeting_data['suggestions'] = []
     
+    greeting_data['suggestionIds'] = get_suggestion_ids(greeting_data['suggestions'], language)
     emit('greeting', greeting_data)
 
 @socketio.on('disconnect')
 def handle_disconnect():
     session_id = request.sid
+    metrics.active_connections.dec()
     
     # セッション終了時に訪問者データを更新
     if session_id in session_data:
@@ -1860,16 +2007,25 @@ def handle_disconnect():
 @socketio.on('audio_message')
 def handle_audio_message(data):
     """音声入力からテキストへ変換してメッセージ処理"""
+    # 🆕 音声認識から応答までを1ターンとして計測
+    trace = tracing.Trace(session_id=request.sid, from_audio=True)
+    with trace.activated(), metrics.track_inflight('audio_message'):
+        try:
+            _handle_audio_message(data, trace)
+        finally:
+            trace.release()
+
+def _handle_audio_message(data, trace):
     session_id = request.sid
     
     try:
         print(f"🎤 音声メッセージ受信: Session={session_id}")
         
-        # 音声データを取得
-        audio_base64 = data.get('audio')
+        # 音声データを取得（Base64のデータURL、または🆕 バイナリ添付のバイト列）
+        audio_input = data.get('audio')
         language = data.get('language', 'ja')
         
-        if not audio_base64:
+        if not audio_input:
             print("❌ 音声データが空です")
             emit('error', {
                 'message': '音声データを受信できませんでした。' if language == 'ja' else 'Failed to receive audio data.'
@@ -1879,7 +2035,8 @@ def handle_audio_message(data):
         # 音声→テキスト変換
         try:
             print("🔄 音声認識開始...")
-            text = speech_processor.transcribe_audio(audio_base64, language)
+            with trace.span('whisper'):
+                text = speech_processor.transcribe_audio(audio_input, language)
             
             if not text or text.strip() == "":
                 print("⚠️ 音声認識結果が空です")
@@ -1906,6 +2063,8 @@ def handle_audio_message(data):
                 'interactionCount': data.get('interactionCount', 0),
                 'relationshipLevel': data.get('relationshipLevel', 'formal'),
                 'selectedSuggestions': data.get('selectedSuggestions', []),
+                'stream': data.get('stream', False),
+                'deferAudio': data.get('deferAudio', False),
                 'fromAudio': True  # 音声入力であることを示すフラグ
             }
             
@@ -1933,8 +2092,23 @@ def handle_audio_message(data):
 # ====== 【修正2】🧠 会話記憶対応メッセージハンドラー(感情履歴管理強化版 + suggestion即座記録) ======
 @socketio.on('message')
 def handle_message(data):
+    # 🆕 処理段階ごとの計測（audio_messageから呼ばれた場合は音声認識から続けて計測）
+    trace = tracing.current()
+    if trace is None:
+        trace = tracing.Trace(trace_id=data.get('messageId'), session_id=request.sid)
+    else:
+        trace.hold()
+    with trace.activated(), metrics.track_inflight('message'):
+        try:
+            _handle_message(data, trace)
+        finally:
+            trace.release()
+
+def _handle_message(data, trace):
     global chatbot
     start_time = time.time()
+    conversation_flight = None
+    audio_pipeline = None
     
     try:
         session_id = request.sid
@@ -1946,6 +2120,11 @@ def handle_message(data):
         conversation_history = data.get('conversationHistory', [])
         interaction_count = data.get('interactionCount', session_info['interaction_count'])
         selected_suggestions_from_client = data.get('selectedSuggestions', [])
+        message_id = data.get('messageId') or trace.trace_id
+        trace.trace_id = message_id
+        trace.annotate(language=language, streamed=bool(data.get('stream', False)))
+        stream_requested = ENABLE_RESPONSE_STREAMING and data.get('stream', False)
+        defer_audio = ENABLE_DEFERRED_AUDIO and data.get('deferAudio', False)
         
         # インタラクション数を更新
         session_info['interaction_count'] = interaction_count + 1
@@ -1981,16 +2160,49 @@ def handle_message(data):
         cache_key = hashlib.md5(f"{normalized_message}_{language}".encode()).hexdigest()
         
         # キャッシュチェック
+        # 🆕 サジェスチョンIDまたはサジェスチョン文の完全一致で事前コンパイル済みバンドルを検索
+        static_bundle = None
+        with trace.span('static_bundle'):
+            if data.get('suggestionId'):
+                static_bundle = static_bundles.get(data['suggestionId'], language)
+            if not static_bundle:
+                static_bundle = static_bundles.find(language, message)
+        
+        # （24時間の有効期限はconversation_cache側で判定）
         cached_response = None
-        if cache_key in conversation_cache:
-            cached_data = conversation_cache[cache_key]
-            # キャッシュの有効期限チェック(24時間)
-            if datetime.now() - cached_data['timestamp'] < timedelta(hours=24):
-                cached_response = cached_data['response']
+        if not static_bundle:
+            cached_response = conversation_cache.get(cache_key)
+            if cached_response:
                 print(f"💾 キャッシュヒット: {cache_key[:8]}")
+                trace.annotate(cache='conversation')
+        
+        # 🆕 同じ質問を生成中なら、その結果を待って共有（キャッシュヒットとして扱う）
+        if not static_bundle and not cached_response:
+            flight, is_leader = conversation_flights.begin(cache_key)
+            if is_leader:
+                conversation_flight = flight
+            else:
+                print(f"⏳ 同じ質問を生成中のため結果を待機: {cache_key[:8]}")
+                with trace.span('coalesce_wait'):
+                    completed = flight.wait(SINGLE_FLIGHT_TIMEOUT)
+                if completed and flight.result:
+                    cached_response = flight.result
+                    print(f"💾 生成中の応答を共有: {cache_key[:8]}")
+                    trace.annotate(cache='coalesced')
+                else:
+                    print(f"⚠️ 先行リクエストの結果が得られないため個別に生成: {cache_key[:8]}")
         
         # RAGシステムでの応答生成(キャッシュミスの場合)
-        if cached_response:
+        if static_bundle:
+            # 🆕 バンドルのテキスト・感情を使用（静的Q&Aと同じく関係性に応じたスタイル調整を行う）
+            response = static_bundle['text']
+            emotion = validate_emotion(static_bundle['emotion'])
+            mental_state = calculate_mental_state(session_info)
+            with trace.span('style'):
+                response = adjust_response_style(response, language, relationship_style)
+            print(f"📦 静的Q&Aバンドル使用: {static_bundle['id']} emotion={emotion}")
+            trace.annotate(cache='static_bundle')
+        elif cached_response:
             response = cached_response['message']
             emotion = cached_response['emotion']
             mental_state = cached_response.get('mental_state')
@@ -2004,13 +2216,15 @@ def handle_message(data):
                 user_type = DEFAULT_USER_TYPE
             language = session_info.get('language', 'ja')
             static_response = None
+            response_complete = True  # 🆕 Falseならストリーミングが途中で失敗（キャッシュしない）
             
             try:
                 from modules.static_qa_data import get_response_for_user, get_current_phase
                 
                 # まず静的Q&Aをチェック
                 current_phase = get_current_phase(session_info.get('selected_suggestions_count', 0))
-                static_response = get_response_for_user(message, user_type, current_phase, language)
+                with trace.span('static_qa'):
+                    static_response = get_response_for_user(message, user_type, current_phase, language)
                 
                 if static_response:
                     print(f"✅ 静的Q&Aヒット: {user_type} - {current_phase}")
@@ -2019,29 +2233,71 @@ def handle_message(data):
             
             # RAG応答生成
             if chatbot:
+                # 🆕 静的Q&Aがない場合は意味キャッシュ（言い換えの過去応答）を検索
+                semantic_hit = None
+                question_vector = None
+                if not static_response and ENABLE_SEMANTIC_CACHE:
+                    with trace.span('semantic_lookup'):
+                        semantic_hit, semantic_score, question_vector = semantic_cache.lookup(message, language)
+                
                 # 🆕 静的Q&Aがあればそれを使用、なければRAG
                 if static_response:
                     response = static_response['text']
                     emotion = static_response.get('emotion', 'neutral')
                     print(f"✅ 静的Q&A使用: emotion={emotion}")
+                    trace.annotate(cache='static_qa')
+                elif semantic_hit:
+                    response = semantic_hit['answer']
+                    emotion = semantic_hit['emotion']
+                    print(f"✅ 意味キャッシュ使用: 類似度={semantic_score:.3f}, emotion={emotion}")
+                    trace.annotate(cache='semantic', semantic_score=round(semantic_score, 4))
+                elif stream_requested:
+                    # 🆕 文単位の音声合成パイプライン
+                    # （英語casualはGPTで全文を書き換えるため対象外）
+                    if ENABLE_SENTENCE_TTS_PIPELINE and not (language == 'en' and relationship_style == 'casual'):
+                        audio_pipeline = create_sentence_audio_pipeline(
+                            session_id, message_id, language, relationship_style, trace
+                        )
+                    
+                    # 🆕 RAG応答をストリーミング生成（差分はresponse_chunkで送信済み）
+                    trace.annotate(cache='miss')
+                    with trace.span('rag'):
+                        response, response_complete = stream_rag_response(
+                            message, language, conversation_history, message_id, audio_pipeline,
+                            query_embedding=question_vector
+                        )
+                    response, emotion = extract_emotion_tag(response)
+                    
+                    if audio_pipeline:
+                        audio_pipeline.finish(response)
                 else:
                     # RAG応答生成
-                    response = chatbot.get_response(
-                        message,
-                        language=language,
-                        conversation_history=conversation_history
-                    )
+                    trace.annotate(cache='miss')
+                    with trace.span('rag'):
+                        response = chatbot.get_response(
+                            message,
+                            language=language,
+                            conversation_history=conversation_history,
+                            query_embedding=question_vector
+                        )
                     # 応答から感情タグを抽出（RAG応答の場合のみ）
                     response, emotion = extract_emotion_tag(response)
                 
                 # 感情を検証
                 emotion = validate_emotion(emotion)
                 
+                # 🆕 RAGで生成した応答を意味キャッシュに登録（スタイル調整前・エラー応答・途中で切れた応答は除く）
+                if (question_vector is not None and not static_response and not semantic_hit
+                        and chatbot.db is not None and response_complete
+                        and response != chatbot._generation_error_message(language)):
+                    semantic_cache.add(message, language, response, emotion, question_vector)
+                
                 # 精神状態の計算
                 mental_state = calculate_mental_state(session_info)
                 
                 # 関係性に応じた応答調整
-                response = adjust_response_style(response, language, relationship_style)
+                with trace.span('style'):
+                    response = adjust_response_style(response, language, relationship_style)
                 
             else:
                 # chatbotが初期化されていない場合は再初期化を試行
@@ -2071,29 +2327,55 @@ def handle_message(data):
                     emotion = 'neutral'
                     mental_state = session_info.get('mental_state')
             
-            # キャッシュに保存
-            conversation_cache[cache_key] = {
-                'response': {
-                    'message': response,
-                    'emotion': emotion,
-                    'mental_state': mental_state
-                },
-                'timestamp': datetime.now()
+            # キャッシュに保存（🆕 ストリーミングが途中で失敗した応答は保存・共有しない）
+            new_cached_response = {
+                'message': response,
+                'emotion': emotion,
+                'mental_state': mental_state
             }
+            if response_complete:
+                conversation_cache.set(cache_key, new_cached_response)
+            
+            # 🆕 待機中の同じ質問のリクエストに結果を渡す（途中で切れた応答なら各自で生成し直す）
+            if conversation_flight:
+                conversation_flights.finish(cache_key, conversation_flight,
+                                            new_cached_response if response_complete else None)
+                conversation_flight = None
         
         # 感情履歴を更新(🎯 重要)
         update_emotion_history(session_id, emotion, mental_state)
         
+        # 🆕 ストリーミング時はテキスト確定を先に通知（音声合成の前）
+        if stream_requested:
+            emit('response_done', {
+                'messageId': message_id,
+                'message': response,
+                'emotion': emotion
+            })
+        
         # 音声生成
-        try:
-            audio_data = generate_audio_by_language(response, language, emotion_params=emotion)
-            if audio_data:
-                print(f"🔊 音声データ準備完了: {len(audio_data)} バイト")
-            else:
-                print("⚠️ 音声データが生成されませんでした")
-        except Exception as e:
-            print(f"❌ 音声生成エラー: {e}")
-            audio_data = None
+        # （スタイル調整でテキストが変わった場合、バンドルの音声は使わずに合成する）
+        bundle_audio = None
+        if static_bundle and response == static_bundle['text']:
+            bundle_audio = static_bundles.audio(static_bundle, active_voice_engine(language))
+        audio_pending = defer_audio and audio_pipeline is None and not bundle_audio
+        if bundle_audio:
+            # 🆕 バンドルに作成済みの音声（外部API呼び出しなし）
+            audio_fields = audio_fields_for_bundle(static_bundle, bundle_audio)
+            trace.annotate(audio_engine='static_bundle')
+        elif audio_pipeline or audio_pending:
+            # 🆕 文単位で合成済み（audio_segment）または応答送信後に後送り（audio_ready）
+            audio_fields = {}
+        else:
+            try:
+                audio_fields = generate_audio_fields(response, language, emotion_params=emotion)
+                if audio_fields:
+                    print(f"🔊 音声データ準備完了: {audio_fields.get('audioUrl') or len(audio_fields['audio'])}")
+                else:
+                    print("⚠️ 音声データが生成されませんでした")
+            except Exception as e:
+                print(f"❌ 音声生成エラー: {e}")
+                audio_fields = {}
         
         # 🆕 サジェスチョンカウントの更新（選択済みサジェスチョン数から計算）
         if selected_suggestions_from_client:
@@ -2140,30 +2422,43 @@ def handle_message(data):
         
         # メディアデータの取得（元の質問から独立取得）
         media_data = None
-        try:
-            from modules.static_qa_data import get_qa_media
-            media_data = get_qa_media(message)  # 元の質問を使用
-            if media_data:
-                print(f"📷 メディアデータ取得: images={len(media_data.get('images', []))}, videos={len(media_data.get('videos', []))}")
-        except ImportError as e:
-            print(f"⚠️ メディアモジュールのインポートエラー: {e}")
-        except Exception as e:
-            print(f"⚠️ メディア取得エラー: {e}")
+        if static_bundle:
+            # 🆕 バンドルに作成済みのメディア
+            media_data = static_bundle.get('media')
+        else:
+            try:
+                from modules.static_qa_data import get_qa_media
+                media_data = get_qa_media(message)  # 元の質問を使用
+                if media_data:
+                    print(f"📷 メディアデータ取得: images={len(media_data.get('images', []))}, videos={len(media_data.get('videos', []))}")
+            except ImportError as e:
+                print(f"⚠️ メディアモジュールのインポートエラー: {e}")
+            except Exception as e:
+                print(f"⚠️ メディア取得エラー: {e}")
         
         # レスポンスデータの構築
         response_data = {
+            'messageId': message_id,
             'message': response,
             'emotion': emotion,
-            'audio': audio_data,
+            **audio_fields,
             'language': language,
-            'voice_engine': 'elevenlabs' if (use_elevenlabs and language == 'ja') else ('azure_speech' if (use_azure_speech and language == 'ja') else 'openai_tts'),
+            'voice_engine': active_voice_engine(language),
             'processingTime': round(processing_time, 2),
             'suggestions': suggestions,
+            'suggestionIds': get_suggestion_ids(suggestions, language),
             'relationshipLevel': relationship_style,
             'interactionCount': session_info['interaction_count'],
-            'mentalState': mental_state
+            'mentalState': mental_state,
+            'audioSegmented': audio_pipeline is not None,
+            'audioPending': audio_pending
         }
         
+        # 🆕 デバッグモードでは処理段階ごとの所要時間を添付
+        trace.annotate(audio_mode='bundle' if bundle_audio else 'segmented' if audio_pipeline else 'deferred' if audio_pending else 'inline')
+        if ENABLE_DEBUG_TIMINGS:
+            response_data['debug'] = {'timings': trace.timings()}
+        
         # メディアデータがある場合のみ追加（後方互換性維持）
         if media_data:
             response_data['media'] = media_data
@@ -2172,6 +2467,10 @@ def handle_message(data):
         # Socket.IOで送信
         emit('response', response_data)
         
+        # 🆕 音声はテキスト送信後にワーカープールで合成してaudio_readyで送信
+        if response_data['audioPending']:
+            deliver_audio_async(session_id, message_id, response, language, emotion, trace)
+        
         # 統計出力
         print(f"⏱️ 処理時間: {processing_time:.2f}秒")
         print(f"🎭 感情: {emotion}")
@@ -2183,6 +2482,14 @@ def handle_message(data):
         import traceback
         traceback.print_exc()
         
+        # 🆕 生成に失敗した場合も待機中のリクエストを解放（各自で生成し直す）
+        if conversation_flight:
+            conversation_flights.finish(cache_key, conversation_flight)
+        
+        # 🆕 文単位の音声合成を締め切る（送信済みの数でaudio_segments_doneを送り、トレースの保留を解除）
+        if audio_pipeline is not None:
+            audio_pipeline.abort()
+        
         emit('error', {
             'message': '申し訳ございません。エラーが発生しました。',
             'emotion': 'neutral'
@@ -2207,15 +2514,15 @@ def handle_request_quiz_proposal(data):
     
     # 音声生成
     try:
-        audio_data = generate_audio_by_language(message, language, emotion_params=emotion)
+        audio_fields = generate_audio_fields(message, language, emotion_params=emotion)
     except Exception as e:
         print(f"❌ クイズ提案音声生成エラー: {e}")
-        audio_data = None
+        audio_fields = {}
     
     emit('quiz_proposal', {
         'message': message,
         'emotion': emotion,
-        'audio': audio_data
+        **audio_fields
     })
     
     print(f"🎯 クイズ提案送信（アンケート言及版）: Session={session_id}, Language={language}")
@@ -2284,10 +2591,10 @@ def handle_quiz_answer(data):
     # 音声生成（結果+解説）
     audio_text = f"{result_message} {explanation}"
     try:
-        audio_data = generate_audio_by_language(audio_text, language, emotion_params=emotion)
+        audio_fields = generate_audio_fields(audio_text, language, emotion_params=emotion)
     except Exception as e:
         print(f"❌ 回答結果音声生成エラー: {e}")
-        audio_data = None
+        audio_fields = {}
     
     # 🎯 修正: 次の処理タイプを判定（クライアント側で遅延処理するため）
     has_next_question = current_question < len(QUIZ_DATA[language])
@@ -2300,7 +2607,7 @@ def handle_quiz_answer(data):
         'explanation': explanation,
         'resultMessage': result_message,
         'emotion': emotion,
-        'audio': audio_data,
+        **audio_fields,
         'hasNextQuestion': has_next_question,
         'nextQuestionIndex': current_question if has_next_question else None,
         'isFinalResult': not has_next_question,
@@ -2325,15 +2632,15 @@ def handle_quiz_declined():
     
     # 音声生成
     try:
-        audio_data = generate_audio_by_language(message, language, emotion_params='neutral')
+        audio_fields = generate_audio_fields(message, language, emotion_params='neutral')
     except Exception as e:
         print(f"❌ 辞退メッセージ音声生成エラー: {e}")
-        audio_data = None
+        audio_fields = {}
     
     emit('response', {
         'message': message,
         'emotion': 'neutral',
-        'audio': audio_data,
+        **audio_fields,
         'language': language
     })
     
@@ -2355,15 +2662,15 @@ def handle_quiz_quit():
     
     # 音声生成
     try:
-        audio_data = generate_audio_by_language(message, language, emotion_params='neutral')
+        audio_fields = generate_audio_fields(message, language, emotion_params='neutral')
     except Exception as e:
         print(f"❌ 中断メッセージ音声生成エラー: {e}")
-        audio_data = None
+        audio_fields = {}
     
     emit('response', {
         'message': message,
         'emotion': 'neutral',
-        'audio': audio_data,
+        **audio_fields,
         'language': language
     })
     
@@ -2490,17 +2797,17 @@ def handle_submit_survey(data):
     
     # 音声生成
     try:
-        audio_data = generate_audio_by_language(message, language, emotion_params='happy')
+        audio_fields = generate_audio_fields(message, language, emotion_params='happy')
     except Exception as e:
         print(f"❌ お礼音声生成エラー: {e}")
-        audio_data = None
+        audio_fields = {}
     
     # レスポンス送信（v3.0: 常に報酬表示）
     emit('survey_submitted', {
         'success': success,
         'message': message,
         'emotion': 'happy',
-        'audio': audio_data,
+        **audio_fields,
         'show_reward': True,  # 🔧 修正: 常にTrue
         'reward_image_url': '/api/reward-image'  # 🔧 修正: 常に送信
     })
@@ -2518,10 +2825,10 @@ def send_quiz_question(session_id, language, question_index):
     
     # 音声生成
     try:
-        audio_data = generate_audio_by_language(question_text, language, emotion_params='neutraltalking')
+        audio_fields = generate_audio_fields(question_text, language, emotion_params='neutraltalking')
     except Exception as e:
         print(f"❌ 問題音声生成エラー: {e}")
-        audio_data = None
+        audio_fields = {}
     
     # 🎯 修正: イベント名を統一（クライアント側で同じハンドラが処理）
     event_name = 'next_quiz_question' if question_index > 0 else 'quiz_question'
@@ -2533,7 +2840,7 @@ def send_quiz_question(session_id, language, question_index):
         'options': question_data['options'],
         'totalQuestions': len(QUIZ_DATA[language]),
         'correct': question_data['correct'],
-        'audio': audio_data
+        **audio_fields
     })
 
 def send_quiz_final_result(session_id, language, score):
@@ -2563,10 +2870,10 @@ def send_quiz_final_result(session_id, language, score):
     
     # 音声生成
     try:
-        audio_data = generate_audio_by_language(message, language, emotion_params=emotion)
+        audio_fields = generate_audio_fields(message, language, emotion_params=emotion)
     except Exception as e:
         print(f"❌ 最終結果音声生成エラー: {e}")
-        audio_data = None
+        audio_fields = {}
     
     # クイズセッションをクリア
     if session_id in quiz_sessions:
@@ -2576,7 +2883,7 @@ def send_quiz_final_result(session_id, language, score):
     emit('quiz_final_result', {
         'message': message,
         'emotion': emotion,
-        'audio': audio_data,
+        **audio_fields,
         'allCorrect': all_correct,
         'showSurvey': True,  # 🔧 修正: 常にTrue
         'score': score
@@ -0,0 +1,100 @@
+# emotion_equivalence.py - 感情分析エンジンと従来の実装の出力一致・速度の比較
+# 静的Q&Aの応答文・サジェスチョン・来場者の質問と、キーワードを混ぜたランダムな文で
+# modules/emotion_engine.py と benchmarks/legacy_emotion.py（従来の実装）の結果が一致するかを確認し、
+# それぞれの1件あたりの処理時間を表示する。不一致があれば終了コード1を返す。
+#
+# 使い方:
+#   python benchmarks/emotion_equivalence.py [--random 5000] [--seed 0]
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import legacy_emotion
+from modules import static_qa_data
+from modules.emotion_engine import CONTEXT_PHRASES, EMOTION_KEYWORDS, LIVE2D_RULES, engine
+
+NOISE = ['', ' ', '。', '、', '！', '？', '!', '?', '♪', '〜', '…', 'www', 'T_T', ';;', '💢', '笑',
+         'ＡＢＣ', '１２３', 'A', 'Hello', 'THE', '京友禅', '着物', 'です', 'ね', 'わん']
+
+
+def build_corpus(random_count, seed):
+    corpus = []
+    for language in ('ja', 'en'):
+        for phase_answers in static_qa_data.qa_responses[language].values():
+            corpus.extend(text.strip() for text in phase_answers.values())
+            corpus.extend(phase_answers.keys())
+
+    vocabulary = list(NOISE)
+    for config in EMOTION_KEYWORDS.values():
+        vocabulary.extend(config['keywords'])
+    for phrases in CONTEXT_PHRASES.values():
+        vocabulary.extend(phrases)
+    for rules in LIVE2D_RULES.values():
+        for key in ('danger', 'question_markers', 'technical_terms', 'topic_terms', 'greetings'):
+            vocabulary.extend(rules[key])
+        for _, words in rules['emotions']:
+            vocabulary.extend(words)
+
+    rng = random.Random(seed)
+    for _ in range(random_count):
+        parts = [rng.choice(vocabulary) for _ in range(rng.randint(0, 8))]
+        text = ''.join(part.upper() if rng.random() < 0.1 else part for part in parts)
+        corpus.append(text)
+    return corpus
+
+
+def time_per_call(func, texts, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(texts)
+        best = min(best, time.perf_counter() - start)
+    return best / len(texts) * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare the compiled emotion engine with the legacy analyzers')
+    parser.add_argument('--random', type=int, default=5000, help='number of random keyword mixes')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    corpus = build_corpus(args.random, args.seed)
+    legacy_analyzer = legacy_emotion.EmotionAnalyzer()
+
+    cases = [
+        ('EmotionAnalyzer.analyze_emotion',
+         lambda texts: [legacy_analyzer.analyze_emotion(t) for t in texts],
+         engine.analyze_batch),
+        ('analyze_emotion',
+         lambda texts: [legacy_emotion.analyze_emotion(t) for t in texts],
+         lambda texts: engine.classify_batch(texts, 'application')),
+        ('RAGSystem._analyze_user_emotion',
+         lambda texts: [legacy_emotion.rag_analyze_user_emotion(t) for t in texts],
+         lambda texts: engine.classify_batch(texts, 'rag')),
+    ]
+
+    print(f'🧪 感情分析の比較: {len(corpus)}件')
+    mismatches = 0
+    for name, legacy, compiled in cases:
+        expected = legacy(corpus)
+        actual = compiled(corpus)
+        diffs = [(text, e, a) for text, e, a in zip(corpus, expected, actual) if e != a]
+        mismatches += len(diffs)
+        legacy_us = time_per_call(legacy, corpus)
+        compiled_us = time_per_call(compiled, corpus)
+        status = '✅ 一致' if not diffs else f'❌ 不一致 {len(diffs)}件'
+        print(f'  {name:<34}{legacy_us:>9.2f} µs → {compiled_us:>8.2f} µs  (x{legacy_us / compiled_us:.1f})  {status}')
+        for text, e, a in diffs[:5]:
+            print(f'      {text[:40]!r}: {e} != {a}')
+
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,175 @@
+# http_keepalive.py - 共有接続プール（keep-alive）と リクエストごとの新規接続 の比較
+# modules/http_pool.py のプールと、requests.post/get を直接呼ぶ従来の方法（毎回TCP+TLSのハンドシェイク）で
+# 同じリクエストを送り、1リクエストあたりの時間と開いた接続数を表示する。
+#
+# 使い方:
+#   python benchmarks/http_keepalive.py                          # ローカルのHTTPSサーバー（自己署名証明書）で比較
+#   python benchmarks/http_keepalive.py --threads 4 --requests 200
+#   python benchmarks/http_keepalive.py --url https://api.elevenlabs.io/v1/voices
+#       # 実際のエンドポイントで比較（認証エラーの応答でも接続・ハンドシェイクの時間は計測できる）
+#
+# ローカルでは往復遅延がほぼないため、差はTLSの暗号処理の分だけになる。
+# 実際のAPIではハンドシェイクの往復（TCP 1回 + TLS 1〜2回）が毎回加わる。
+import argparse
+import json
+import os
+import ssl
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import requests
+
+from modules.http_pool import HttpPool
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """keep-alive対応の最小のサーバー（固定サイズの応答を返す）"""
+    protocol_version = 'HTTP/1.1'
+    body = b''
+
+    def _reply(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    do_GET = _reply
+    do_POST = _reply
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_certificate(directory):
+    """自己署名証明書を作成（openssl コマンドを使用）。作成できなければNone"""
+    cert_path = os.path.join(directory, 'cert.pem')
+    key_path = os.path.join(directory, 'key.pem')
+    try:
+        subprocess.run([
+            'openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+            '-subj', '/CN=localhost', '-addext', 'subjectAltName=IP:127.0.0.1,DNS:localhost',
+            '-keyout', key_path, '-out', cert_path
+        ], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return cert_path, key_path
+
+
+def start_local_server(body_bytes, tls, directory):
+    """ローカルのテスト用サーバーを起動し (URL, verify) を返す"""
+    _Handler.body = b'\x00' * body_bytes
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    server.daemon_threads = True
+    scheme, verify = 'http', True
+    if tls:
+        certificate = make_certificate(directory)
+        if certificate:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(*certificate)
+            server.socket = context.wrap_socket(server.socket, server_side=True)
+            scheme, verify = 'https', certificate[0]
+        else:
+            print('⚠️ opensslで証明書を作成できなかったため、HTTPで比較します（TLSの差は含まれません）')
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'{scheme}://127.0.0.1:{server.server_address[1]}/tts', verify, server
+
+
+def run(send, count, threads):
+    """count件のリクエストを送り、1件ごとの所要時間（ミリ秒）のリストを返す"""
+    def one(_):
+        started = time.perf_counter()
+        response = send()
+        response.content  # 本文を読み切って接続をプールに戻す
+        return (time.perf_counter() - started) * 1000
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(one, range(count)))
+
+
+def summarize(samples, elapsed, connections):
+    ordered = sorted(samples)
+    return {
+        'requests': len(samples),
+        'connections': connections,
+        'mean_ms': round(statistics.mean(samples), 3),
+        'p50_ms': round(ordered[len(ordered) // 2], 3),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        'throughput_rps': round(len(samples) / elapsed, 1) if elapsed else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare the shared keep-alive HTTP pool with a new connection per request')
+    parser.add_argument('--url', help='endpoint to call (default: a local HTTPS server started by this script)')
+    parser.add_argument('--method', default='POST', choices=['GET', 'POST'])
+    parser.add_argument('--requests', type=int, default=100, help='requests per mode')
+    parser.add_argument('--threads', type=int, default=1, help='concurrent callers (like gunicorn threads)')
+    parser.add_argument('--body-bytes', type=int, default=48 * 1024, help='response size of the local server')
+    parser.add_argument('--payload-bytes', type=int, default=512, help='request body size (SSML / JSON)')
+    parser.add_argument('--no-tls', action='store_true', help='use plain HTTP for the local server')
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        server = None
+        if args.url:
+            url, verify = args.url, True
+        else:
+            url, verify, server = start_local_server(args.body_bytes, not args.no_tls, directory)
+
+        payload = b'x' * args.payload_bytes if args.method == 'POST' else None
+        pool = HttpPool(pool_maxsize=max(args.threads, 1))
+        timeout = (pool.connect_timeout, pool.read_timeout)
+
+        modes = {
+            # 従来の方法: requests.post/get を直接呼ぶ（呼び出しごとにSessionと接続を作って閉じる）
+            'new_connection': lambda: requests.request(args.method, url, data=payload, verify=verify, timeout=timeout),
+            'shared_pool': lambda: pool.request(args.method, url, data=payload, verify=verify),
+        }
+
+        print(f'🌐 {url} ({args.method}, {args.requests}件, {args.threads}スレッド)')
+        results = {}
+        for name, send in modes.items():
+            send().content  # ウォームアップ（DNS解決など。プールはここで最初の接続を開く）
+            started = time.perf_counter()
+            samples = run(send, args.requests, args.threads)
+            elapsed = time.perf_counter() - started
+            if name == 'shared_pool':
+                connections = sum(host['connections'] for host in pool.stats().values())
+            else:
+                connections = args.requests + 1
+            results[name] = summarize(samples, elapsed, connections)
+            r = results[name]
+            print(f"  {name:<16} mean {r['mean_ms']:>8.2f} ms  p50 {r['p50_ms']:>8.2f} ms  "
+                  f"p95 {r['p95_ms']:>8.2f} ms  {r['throughput_rps']:>8} req/s  接続 {r['connections']}")
+
+        saved = results['new_connection']['mean_ms'] - results['shared_pool']['mean_ms']
+        print(f"\n⏱️ 1リクエストあたり {saved:.2f} ms 短縮 "
+              f"(x{results['new_connection']['mean_ms'] / max(results['shared_pool']['mean_ms'], 1e-9):.1f})")
+
+        pool.reset()
+        if server:
+            server.shutdown()
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'url': url, 'args': vars(args), 'results': results}, f, ensure_ascii=False, indent=2)
+        print(f'💾 結果を保存: {args.output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,389 @@
+# legacy_emotion.py - 事前コンパイル前の感情分析（比較用に従来の実装をそのまま残したもの）
+# benchmarks/emotion_equivalence.py が modules/emotion_engine.py と出力・速度を比較する。
+# ログ出力（print）のみ除いている。
+import re
+from typing import Dict, Tuple
+
+
+class EmotionAnalyzer:
+    def __init__(self):
+        # 感情キーワード辞書(優先度順・拡張版)
+        self.emotion_keywords = {
+            'happy': {
+                'keywords': [
+                    'うれしい', '嬉しい', 'ウレシイ', 'ureshii',
+                    '楽しい', 'たのしい', 'tanoshii',
+                    'ハッピー', 'happy', 'はっぴー',
+                    '喜び', 'よろこび', 'yorokobi',
+                    '幸せ', 'しあわせ', 'shiawase',
+                    '最高', 'さいこう', 'saikou',
+                    'やった', 'yatta',
+                    'わーい', 'わあい', 'waai',
+                    '笑', 'わら', 'wara',
+                    '良い', 'いい', 'よい', 'yoi',
+                    '素晴らしい', 'すばらしい', 'subarashii',
+                    'ありがとう', 'ありがと', 'おかげ',
+                    '感謝', 'かんしゃ', '感動', 'かんどう',
+                    '面白い', 'おもしろい', 'たのしみ',
+                    'ワクワク', 'わくわく', 'ドキドキ',
+                    # 新規追加
+                    'うまい', '美味しい', 'おいしい', '美味',
+                    '完璧', 'かんぺき', 'perfect',
+                    'グッド', 'good', 'nice', 'ナイス',
+                    '愛してる', '大好き', 'だいすき',
+                    'すごく良い', 'とても良い', '非常に良い'
+                ],
+                'patterns': [r'♪+', r'〜+$', r'www', r'笑$'],
+                'weight': 1.3
+            },
+            'sad': {
+                'keywords': [
+                    '悲しい', 'かなしい', 'カナシイ', 'kanashii',
+                    '寂しい', 'さびしい', 'さみしい', 'sabishii',
+                    '泣', 'なく', 'naku',
+                    '涙', 'なみだ', 'namida',
+                    '辛い', 'つらい', 'tsurai',
+                    '苦しい', 'くるしい', 'kurushii',
+                    '切ない', 'せつない', 'setsunai',
+                    'しんどい', 'shindoi',
+                    '失望', 'しつぼう', 'shitsubou',
+                    '落ち込', 'おちこ', 'ochiko',
+                    'がっかり', 'gakkari',
+                    '憂鬱', 'ゆううつ', 'yuuutsu',
+                    'ブルー', 'blue', 'ぶるー',
+                    # 新規追加
+                    '残念', 'ざんねん', 'zannen',
+                    '悔しい', 'くやしい', 'kuyashii',
+                    '孤独', 'こどく', 'kodoku',
+                    'ひとりぼっち', 'hitoribocchi',
+                    '絶望', 'ぜつぼう', 'zetsubou',
+                    'つまらない', 'tsumaranai',
+                    '不幸', 'ふこう', 'fukou'
+                ],
+                'patterns': [r'。。。', r'…+$', r'T[T_]T', r';;', r'泣$'],
+                'weight': 1.2
+            },
+            'angry': {
+                'keywords': [
+                    '怒', 'おこ', 'oko',
+                    'イライラ', 'いらいら', 'iraira',
+                    'ムカつく', 'むかつく', 'mukatsuku',
+                    'ムカムカ', 'むかむか', 'mukamuka',
+                    '腹立', 'はらだ', 'harada',
+                    'キレ', 'きれ', 'kire',
+                    '憤', 'いきどお', 'ikidoo',
+                    'ふざけ', 'fuzake',
+                    '最悪', 'さいあく', 'saiaku',
+                    'うざい', 'うざ', 'uzai',
+                    'やばい', 'yabai',
+                    # 新規追加
+                    '頭にくる', 'あたまにくる', 'atamanikuru',
+                    '許せない', 'ゆるせない', 'yurusenai',
+                    '納得いかない', 'なっとくいかない',
+                    '不愉快', 'ふゆかい', 'fuyukai',
+                    '不満', 'ふまん', 'fuman',
+                    'クソ', 'くそ', 'kuso',
+                    'だめ', 'ダメ', 'dame'
+                ],
+                'patterns': [r'！！+', r'💢', r'怒$', r'ムカ'],
+                'weight': 1.3
+            },
+            'surprised': {
+                'keywords': [
+                    '驚', 'おどろ', 'odoro',
+                    'びっくり', 'ビックリ', 'bikkuri',
+                    'すごい', 'スゴイ', 'sugoi',
+                    'えっ', 'エッ', 'e',
+                    'まじ', 'マジ', 'maji',
+                    '信じられない', 'しんじられない', 'shinjirarenai',
+                    '本当', 'ほんとう', 'hontou',
+                    'やば', 'ヤバ', 'yaba',
+                    'うそ', 'ウソ', '嘘', 'uso',
+                    'なんと', 'ナント', 'nanto',
+                    'まさか', 'マサカ', 'masaka',
+                    # 新規追加
+                    '意外', 'いがい', 'igai',
+                    '予想外', 'よそうがい', 'yosougai',
+                    '衝撃', 'しょうげき', 'shougeki',
+                    'ショック', 'shock', 'しょっく',
+                    '想定外', 'そうていがい', 'souteigai',
+                    '仰天', 'ぎょうてん', 'gyouten'
+                ],
+                'patterns': [r'[!?！？]+', r'。。+', r'ええ[!?！？]'],
+                'weight': 1.1
+            }
+        }
+        
+        # 文脈による感情判定用のフレーズ
+        self.context_phrases = {
+            'happy': [
+                'よかった', '楽しみ', '期待', '頑張', 'がんば', '応援',
+                '成功', 'せいこう', '達成', 'たっせい', '勝利', 'しょうり',
+                '祝福', 'しゅくふく', 'おめでとう', 'congratulations'
+            ],
+            'sad': [
+                '残念', 'ざんねん', '悔しい', 'くやしい', '寂しい',
+                '心配', 'しんぱい', '不安', 'ふあん', '困った', 'こまった',
+                '落胆', 'らくたん', '失望', 'しつぼう',
+                # 🎭 伝統工芸関連の悲しい文脈
+                '深刻な課題', 'しんこくなかだい', '後継者がいない', 'こうけいしゃがいない',
+                '技術が消える', 'ぎじゅつがきえる', '職人が減る', 'しょくにんがへる',
+                '伝統がなくなる', 'でんとうがなくなる', '廃れてしまう', 'すたれてしまう'
+            ],
+            'angry': [
+                '許せない', 'ゆるせない', '納得いかない', 'なっとくいかない',
+                '理解できない', 'りかいできない', '腹が立つ', 'はらがたつ',
+                '不公平', 'ふこうへい', '不当', 'ふとう',
+                '文句', 'もんく', '抗議', 'こうぎ', '反対', 'はんたい'
+            ],
+            'surprised': [
+                '知らなかった', 'しらなかった', '初めて', 'はじめて',
+                '予想外', 'よそうがい', '想定外', 'そうていがい',
+                '驚き', 'おどろき', '発見', 'はっけん'
+            ]
+        }
+        
+    def analyze_emotion(self, text: str) -> Tuple[str, float]:
+        """
+        テキストから感情を分析(改善版)
+        Returns: (emotion, confidence)
+        """
+        if not text:
+            return 'neutral', 0.5
+            
+        # テキストの前処理
+        text_lower = text.lower()
+        text_normalized = self._normalize_text(text)
+        
+        # 各感情のスコアを計算
+        scores: Dict[str, float] = {
+            'happy': 0.0,
+            'sad': 0.0,
+            'angry': 0.0,
+            'surprised': 0.0,
+            'neutral': 0.0
+        }
+        
+        # キーワードマッチング
+        for emotion, config in self.emotion_keywords.items():
+            # キーワードチェック
+            for keyword in config['keywords']:
+                if keyword in text_normalized:
+                    scores[emotion] += 2.0 * config['weight']
+                    
+            # パターンチェック
+            for pattern in config['patterns']:
+                if re.search(pattern, text):
+                    scores[emotion] += 1.0 * config['weight']
+        
+        # 文脈フレーズのチェック
+        for emotion, phrases in self.context_phrases.items():
+            for phrase in phrases:
+                if phrase in text_normalized:
+                    scores[emotion] += 0.5
+        
+        # 文の長さによる調整(短い文は感情が強い傾向)
+        if len(text) < 10 and max(scores.values()) > 0:
+            max_emotion = max(scores, key=scores.get)
+            scores[max_emotion] *= 1.2
+        
+        # 感情強度の判定
+        max_score = max(scores.values())
+        
+        if max_score < 1.0:
+            return 'neutral', 0.5
+            
+        # 最高スコアの感情を選択
+        detected_emotion = max(scores, key=scores.get)
+        confidence = min(scores[detected_emotion] / 10.0, 1.0)
+        
+        # 複数の感情が競合する場合の処理
+        sorted_emotions = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+        if len(sorted_emotions) > 1:
+            # 2番目に高いスコアとの差が小さい場合は信頼度を下げる
+            if sorted_emotions[0][1] - sorted_emotions[1][1] < 1.0:
+                confidence *= 0.8
+        
+        return detected_emotion, confidence
+        
+    def _normalize_text(self, text: str) -> str:
+        """テキストの正規化"""
+        # 記号やスペースを除去
+        text = re.sub(r'[^\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FAF\w\s]', '', text)
+        # 全角英数字を半角に変換
+        text = text.translate(str.maketrans('０１２３４５６７８９ＡＢＣＤＥＦ', '0123456789ABCDEF'))
+        return text.lower()
+
+
+def analyze_emotion(text):
+    """
+    テキストから感情を分析(9種類対応)
+    Returns: 感情文字列 ('neutral', 'happy', 'sad', 'angry', 'surprise', 
+             'dangerquestion', 'responseready', 'start')
+    """
+    if not text:
+        return 'neutral'
+    
+    text_lower = text.lower().strip()
+    
+    # 1. DangerQuestion判定(不適切な質問) - 最優先
+    danger_keywords = [
+        # 日本語
+        'セクシー', 'エロ', '裸', '脱', '下着', '胸', 'おっぱい',
+        'パンツ', 'ブラ', 'きわどい', 'えっち', 'いやらしい',
+        # 英語
+        'sexy', 'nude', 'naked', 'breast', 'underwear', 'erotic',
+        'strip', 'panties', 'bra', 'inappropriate'
+    ]
+    
+    if any(keyword in text_lower for keyword in danger_keywords):
+        return 'dangerquestion'
+    
+    # 2. ResponseReady判定(真剣な質問)
+    serious_indicators = 0
+    
+    # 質問マーカーチェック
+    question_markers = ['?', '?', 'どう', 'なぜ', 'なに', '教えて', 
+                       'how', 'why', 'what', 'explain']
+    if any(marker in text_lower for marker in question_markers):
+        serious_indicators += 1
+    
+    # 長文チェック(50文字以上)
+    if len(text) > 50:
+        serious_indicators += 1
+    
+    # 専門用語チェック
+    technical_terms = ['方法', '手順', '技術', '仕組み', 'やり方', 
+                      '原理', 'システム', '詳しく', '具体的']
+    if any(term in text_lower for term in technical_terms):
+        serious_indicators += 1
+    
+    if serious_indicators >= 2:
+        return 'responseready'
+    
+    # 3. 基本感情の判定
+    # Happy
+    happy_words = ['嬉しい', 'うれしい', '楽しい', 'たのしい', 'わくわく',
+                   'やった', '最高', 'happy', 'glad', 'excited', 'joy', 'great']
+    if any(word in text_lower for word in happy_words):
+        return 'happy'
+    
+    # Sad
+    sad_words = ['悲しい', 'かなしい', '寂しい', 'さみしい', '辛い', 'つらい',
+                 '泣', '涙', 'sad', 'lonely', 'cry', 'tear', 'depressed']
+    if any(word in text_lower for word in sad_words):
+        return 'sad'
+    
+    # Angry
+    angry_words = ['怒', 'おこ', 'むかつく', 'イライラ', '腹立', 'ムカ',
+                   'angry', 'mad', 'furious', 'annoyed', 'pissed']
+    if any(word in text_lower for word in angry_words):
+        return 'angry'
+    
+    # Surprise
+    surprise_words = ['驚', 'びっくり', 'すごい', 'まさか', 'えっ', 'わっ',
+                      'surprise', 'amazing', 'wow', 'incredible', 'unbelievable']
+    if any(word in text_lower for word in surprise_words):
+        return 'surprise'
+    
+    # デフォルト
+    return 'neutral'
+
+
+def rag_analyze_user_emotion(text):
+    """ユーザーの感情を分析(Live2D 9種類対応)"""
+    if not text:
+        return 'neutral'
+
+    text_lower = text.lower().strip()
+
+    # 1. DangerQuestion判定(不適切な質問) - 最優先
+    danger_keywords = [
+        # 日本語
+        'セクシー', 'エロ', '裸', '脱', '下着', '胸', 'おっぱい',
+        'パンツ', 'ブラ', 'きわどい', 'えっち', 'いやらしい',
+        '卑猥', 'わいせつ', '変態', 'へんたい',
+        # 英語
+        'sexy', 'nude', 'naked', 'breast', 'underwear', 'erotic',
+        'strip', 'panties', 'bra', 'inappropriate', 'lewd'
+    ]
+
+    if any(keyword in text_lower for keyword in danger_keywords):
+        return 'dangerquestion'
+
+    # 2. ResponseReady判定(真剣な質問)
+    serious_indicators = 0
+
+    # 質問マーカーチェック
+    question_markers = ['?', '?', 'どう', 'なぜ', 'なに', '教えて', 
+                       'how', 'why', 'what', 'explain', 'tell me']
+    if any(marker in text_lower for marker in question_markers):
+        serious_indicators += 1
+
+    # 長文チェック(50文字以上)
+    if len(text) > 50:
+        serious_indicators += 1
+
+    # 専門用語チェック
+    technical_terms = ['方法', '手順', '技術', '仕組み', 'やり方', 
+                      '原理', 'システム', '詳しく', '具体的',
+                      'process', 'technique', 'method', 'system']
+    if any(term in text_lower for term in technical_terms):
+        serious_indicators += 1
+
+    # 京セラ関連の真剣な質問
+    kyocera_terms = ['京セラ', 'セラミック', '研究', 'イノベーション', '技術', '製品', '協業']
+    if any(term in text_lower for term in kyocera_terms) and serious_indicators >= 1:
+        serious_indicators += 1
+
+    if serious_indicators >= 2:
+        return 'neutraltalking'
+
+    # 3. Start判定(初対面・挨拶)
+    greeting_words = ['はじめまして', '初めまして', 'こんにちは', 'hello', 'hi', 
+                     'nice to meet', 'はじめて', '初対面']
+    if any(word in text_lower for word in greeting_words):
+        return 'start'
+
+    # 4. 基本感情の判定
+    emotion_scores = {
+        'happy': 0,
+        'sad': 0,
+        'angry': 0,
+        'surprise': 0,
+        'neutral': 0
+    }
+
+    # Happy
+    happy_words = ['嬉しい', 'うれしい', '楽しい', 'たのしい', 'わくわく',
+                  'やった', '最高', 'happy', 'glad', 'excited', 'joy', 'great',
+                  'ありがとう', '感謝', 'すごい', '素晴らしい']
+    emotion_scores['happy'] = sum(1 for word in happy_words if word in text_lower)
+
+    # Sad
+    sad_words = ['悲しい', 'かなしい', '寂しい', 'さみしい', '辛い', 'つらい',
+                '泣', '涙', 'sad', 'lonely', 'cry', 'tear', 'depressed',
+                '残念', 'がっかり', '落ち込']
+    emotion_scores['sad'] = sum(1 for word in sad_words if word in text_lower)
+
+    # Angry
+    angry_words = ['怒', 'おこ', 'むかつく', 'イライラ', '腹立', 'ムカ',
+                  'angry', 'mad', 'furious', 'annoyed', 'pissed',
+                  '許せない', 'ふざけ', '最悪']
+    emotion_scores['angry'] = sum(1 for word in angry_words if word in text_lower)
+
+    # Surprise
+    surprise_words = ['驚', 'びっくり', 'まさか', 'えっ', 'あっ',
+                     'surprise', 'amazing', 'wow', 'incredible', 'unbelievable',
+                     '信じられない', '本当に', 'マジで']
+    emotion_scores['surprise'] = sum(1 for word in surprise_words if word in text_lower)
+
+    # 最高スコアの感情を選択
+    max_score = max(emotion_scores.values())
+    if max_score > 0:
+        for emotion, score in emotion_scores.items():
+            if score == max_score:
+                return emotion
+
+    # デフォルト
+    return 'neutral'
@@ -0,0 +1,492 @@
+# loadtest.py - Socket.IOの負荷試験（来場者の会話シナリオを同時に再生）
+# 各クライアントは 接続 → greeting → サジェスチョン選択（phase1〜phase3）→ 自由質問
+# → quiz_start → quiz_answer ×3 → submit_survey の流れを実行し、
+# スループット・イベントごとのレイテンシ（p50/p95/p99）・エラー率・サーバーのメモリ増加を集計する。
+#
+# 使い方（スタブバックエンドに対して実行）:
+#   python benchmarks/stub_backends.py --port 9100 &
+#   STUB_BACKENDS_URL=http://127.0.0.1:9100 gunicorn application:app --workers 1 --threads 4 --bind 127.0.0.1:8000 &
+#   python benchmarks/loadtest.py --url http://127.0.0.1:8000 --clients 200 --ramp-up 30
+#
+# gunicornのスレッド数を決めるときは --spawn-threads でサーバーを起動しながら順に試す:
+#   python benchmarks/loadtest.py --stub-url http://127.0.0.1:9100 --spawn-threads 4,8,16 --clients 200
+import argparse
+import json
+import os
+import queue
+import random
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+import requests
+import socketio
+
+FREE_QUESTIONS = {
+    'ja': [
+        '京友禅の特徴は何ですか？',
+        '糊置きってどんな作業？',
+        '一枚の着物を作るのにどれくらいかかるの？',
+        'ふたばはどうして職人になったの？',
+        '好きな色は何？',
+        '手描き友禅と型友禅の違いを教えて',
+    ],
+    'en': [
+        'What makes Kyo-Yuzen special?',
+        'How long does it take to make one kimono?',
+        'What is your favorite color?',
+        'How did you become a craftsperson?',
+        'What is the difference between hand-painted and stencil yuzen?',
+    ],
+}
+
+SURVEY_ANSWERS = {'q1': 'student', 'q2': '4', 'q3': 'craft,colors'}
+
+
+class Stats:
+    """イベントごとのレイテンシとエラーをスレッド安全に集計"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.sessions_completed = 0
+        self.sessions_failed = 0
+
+    def record(self, event, seconds):
+        with self._lock:
+            self.latencies[event].append(seconds)
+
+    def error(self, event, reason):
+        with self._lock:
+            self.errors[f'{event}:{reason}'] += 1
+
+    def session_done(self, ok):
+        with self._lock:
+            if ok:
+                self.sessions_completed += 1
+            else:
+                self.sessions_failed += 1
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class ScenarioError(Exception):
+    pass
+
+
+class VisitorSession:
+    """1人の来場者（Socket.IOクライアント1本）"""
+
+    def __init__(self, url, language, stats, args):
+        self.url = url
+        self.language = language
+        self.stats = stats
+        self.args = args
+        self.visitor_id = f'loadtest-{uuid.uuid4()}'
+        self.events = queue.Queue()
+        self.client = socketio.Client(reconnection=False)
+        self.client.on('*', self._on_event)
+        self.http = requests.Session()  # 音声URLの取得用（ブラウザと同じくHTTPで取得）
+        self.suggestions = []
+        self.suggestion_ids = []
+        self._first_chunk_seen = True
+        self._first_audio_chunk_seen = True
+
+    def _on_event(self, event, data=None):
+        self.events.put((event, data, time.perf_counter()))
+
+    def _drain(self):
+        while True:
+            try:
+                self.events.get_nowait()
+            except queue.Empty:
+                return
+
+    def _wait_for(self, names, timeout, started, label):
+        """指定のイベントのどれかを待つ（途中の error イベントは失敗として扱う）"""
+        deadline = started + timeout
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                self.stats.error(label, 'timeout')
+                raise ScenarioError(f'{label}: timeout')
+            try:
+                event, data, received = self.events.get(timeout=remaining)
+            except queue.Empty:
+                continue
+            if event == 'error':
+                self.stats.error(label, 'server_error')
+                raise ScenarioError(f'{label}: {data}')
+            if event in names:
+                return event, data, received
+            # ストリーミング中の最初のチャンクまでの時間も記録
+            if event == 'response_chunk' and label == 'message' and not self._first_chunk_seen:
+                self._first_chunk_seen = True
+                self.stats.record('message_first_chunk', received - started)
+            # 🆕 ストリーミング音声の最初の断片までの時間
+            if event == 'audio_chunk' and label == 'audio_ready' and not self._first_audio_chunk_seen:
+                self._first_audio_chunk_seen = True
+                self.stats.record('audio_first_chunk', received - started)
+
+    def request(self, event, payload, expect, label=None, timeout=None):
+        label = label or event
+        self._drain()
+        started = time.perf_counter()
+        self.client.emit(event, payload)
+        _, data, received = self._wait_for(set(expect), timeout or self.args.timeout, started, label)
+        self.stats.record(label, received - started)
+        self.fetch_audio(data)
+        return data
+
+    def _update_suggestions(self, data):
+        if data and data.get('suggestions'):
+            self.suggestions = data['suggestions']
+            self.suggestion_ids = data.get('suggestionIds') or []
+
+    def send_message(self, text, suggestion_id=None):
+        """1ターン分の会話（ストリーミング・後送り音声あり）"""
+        self._drain()
+        self._first_chunk_seen = False
+        self._first_audio_chunk_seen = False
+        started = time.perf_counter()
+        self.client.emit('message', {
+            'message': text,
+            'language': self.language,
+            'visitorId': self.visitor_id,
+            'messageId': str(uuid.uuid4()),
+            'conversationHistory': [],
+            'suggestionId': suggestion_id,
+            'stream': True,
+            'deferAudio': True,
+        })
+        _, data, received = self._wait_for({'response'}, self.args.timeout, started, 'message')
+        self.stats.record('message', received - started)
+        self._update_suggestions(data)
+
+        self.fetch_audio(data)
+
+        if data.get('audioPending'):
+            _, audio, audio_received = self._wait_for({'audio_ready'}, self.args.timeout, started, 'audio_ready')
+            self.stats.record('audio_ready', audio_received - started)
+            self.fetch_audio(audio)
+
+    def fetch_audio(self, data):
+        """イベントに音声のURLがあればブラウザと同じように取得する"""
+        if not self.args.fetch_audio or not data or not data.get('audioUrl'):
+            return
+        started = time.perf_counter()
+        try:
+            response = self.http.get(self.url + data['audioUrl'], timeout=self.args.timeout)
+        except requests.RequestException as e:
+            self.stats.error('audio_fetch', type(e).__name__)
+            return
+        if response.status_code != 200:
+            self.stats.error('audio_fetch', f'http_{response.status_code}')
+            return
+        self.stats.record('audio_fetch', time.perf_counter() - started)
+
+    def think(self):
+        if self.args.think_time > 0:
+            time.sleep(random.uniform(0.5, 1.5) * self.args.think_time)
+
+    def run(self):
+        started = time.perf_counter()
+        try:
+            query = f'visitor_id={self.visitor_id}&audio_transport={self.args.audio_transport}&audio_formats={self.args.audio_formats}'
+            if self.args.audio_stream:
+                query += '&audio_stream=1'
+            self.client.connect(f'{self.url}?{query}',
+                                transports=self.args.transports.split(','),
+                                wait_timeout=self.args.timeout)
+        except Exception as e:
+            self.stats.error('connect', type(e).__name__)
+            self.stats.session_done(False)
+            return
+
+        try:
+            _, greeting, received = self._wait_for({'greeting'}, self.args.timeout, started, 'greeting')
+            self.stats.record('connect_to_greeting', received - started)
+            self._update_suggestions(greeting)
+            self.fetch_audio(greeting)
+
+            if self.language != 'ja':
+                self.request('set_language', {'language': self.language}, ['greeting'])
+
+            # phase1〜phase3: 表示されたサジェスチョンを順に選ぶ
+            for _ in range(self.args.suggestion_clicks):
+                if not self.suggestions:
+                    break
+                index = random.randrange(len(self.suggestions))
+                suggestion_id = self.suggestion_ids[index] if index < len(self.suggestion_ids) else None
+                self.think()
+                self.send_message(self.suggestions[index], suggestion_id)
+
+            for text in random.sample(FREE_QUESTIONS[self.language], self.args.free_questions):
+                self.think()
+                self.send_message(text)
+
+            # クイズ（3問）
+            question = self.request('quiz_start', {'language': self.language}, ['quiz_question'])
+            correct = 0
+            for number in range(1, 4):
+                selected = question['correct'] if random.random() < 0.7 else (question['correct'] + 1) % len(question['options'])
+                is_correct = selected == question['correct']
+                correct += int(is_correct)
+                result = self.request('quiz_answer', {
+                    'questionIndex': question['questionIndex'],
+                    'selectedIndex': selected,
+                    'isCorrect': is_correct,
+                    'currentQuestion': number,
+                    'totalCorrect': correct,
+                    'language': self.language,
+                }, ['quiz_answer_result'])
+                if result.get('hasNextQuestion'):
+                    question = self.request('request_next_quiz_question', {
+                        'language': self.language,
+                        'questionIndex': result['nextQuestionIndex'],
+                    }, ['next_quiz_question'])
+            self.request('request_quiz_final_result', {'language': self.language, 'totalCorrect': correct},
+                         ['quiz_final_result'])
+
+            self.think()
+            self.request('submit_survey', dict(SURVEY_ANSWERS, quiz_score=correct), ['survey_submitted'])
+            self.stats.record('session', time.perf_counter() - started)
+            self.stats.session_done(True)
+        except ScenarioError:
+            self.stats.session_done(False)
+        except Exception as e:
+            self.stats.error('scenario', type(e).__name__)
+            self.stats.session_done(False)
+        finally:
+            try:
+                self.client.disconnect()
+            except Exception:
+                pass
+            self.http.close()
+
+
+# ====== サーバーのメモリ計測 ======
+def read_server_memory(url, pid=None):
+    """サーバーの常駐メモリ（バイト）。pidがあれば/proc、なければ/metricsから取得"""
+    if pid:
+        try:
+            with open(f'/proc/{pid}/status', 'r') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            return None
+    try:
+        text = requests.get(f'{url}/metrics', timeout=5).text
+    except requests.RequestException:
+        return None
+    match = re.search(r'^process_resident_memory_bytes (\d+)', text, re.MULTILINE)
+    return int(match.group(1)) if match else None
+
+
+class MemorySampler(threading.Thread):
+    def __init__(self, url, pid, interval):
+        super().__init__(daemon=True)
+        self.url = url
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            value = read_server_memory(self.url, self.pid)
+            if value is not None:
+                self.samples.append((time.time(), value))
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join(timeout=self.interval + 5)
+
+
+# ====== 実行 ======
+def run_load(url, args, server_pid=None):
+    stats = Stats()
+    baseline_memory = read_server_memory(url, server_pid)
+    sampler = MemorySampler(url, server_pid, args.memory_interval)
+    sampler.start()
+
+    threads = []
+    started = time.perf_counter()
+    delay = args.ramp_up / args.clients if args.clients else 0
+    for i in range(args.clients):
+        language = 'en' if random.random() < args.english_ratio else 'ja'
+        session = VisitorSession(url, language, stats, args)
+        thread = threading.Thread(target=session.run, name=f'visitor-{i}', daemon=True)
+        thread.start()
+        threads.append(thread)
+        if delay:
+            time.sleep(delay)
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    sampler.stop()
+    final_memory = read_server_memory(url, server_pid)
+    return summarize(stats, elapsed, baseline_memory, final_memory, sampler.samples)
+
+
+def summarize(stats, elapsed, baseline_memory, final_memory, memory_samples):
+    events = {}
+    total_requests = 0
+    for event, values in sorted(stats.latencies.items()):
+        if event == 'session':
+            continue
+        total_requests += len(values)
+        events[event] = {
+            'count': len(values),
+            'p50_ms': round(percentile(values, 0.50) * 1000, 1),
+            'p95_ms': round(percentile(values, 0.95) * 1000, 1),
+            'p99_ms': round(percentile(values, 0.99) * 1000, 1),
+            'max_ms': round(max(values) * 1000, 1),
+        }
+    total_errors = sum(stats.errors.values())
+    peak_memory = max((value for _, value in memory_samples), default=None)
+    sessions = stats.sessions_completed + stats.sessions_failed
+    return {
+        'elapsed_s': round(elapsed, 2),
+        'sessions': sessions,
+        'sessions_completed': stats.sessions_completed,
+        'sessions_failed': stats.sessions_failed,
+        'session_p50_s': round(percentile(stats.latencies['session'], 0.5) or 0, 2),
+        'throughput_rps': round(total_requests / elapsed, 2) if elapsed else 0,
+        'sessions_per_min': round(stats.sessions_completed / elapsed * 60, 2) if elapsed else 0,
+        'error_rate': round(total_errors / max(total_requests + total_errors, 1), 4),
+        'errors': dict(stats.errors),
+        'events': events,
+        'memory': {
+            'baseline_mb': _mb(baseline_memory),
+            'final_mb': _mb(final_memory),
+            'peak_mb': _mb(peak_memory),
+            'growth_mb': _mb(final_memory - baseline_memory) if baseline_memory and final_memory else None,
+        },
+    }
+
+
+def _mb(value):
+    return round(value / 1024 / 1024, 1) if value is not None else None
+
+
+def print_report(result, label=None):
+    title = f'📊 負荷試験結果{f" ({label})" if label else ""}'
+    print(f'\n{title}')
+    print(f"  経過時間: {result['elapsed_s']}s, セッション: {result['sessions_completed']}/{result['sessions']} 完了")
+    print(f"  スループット: {result['throughput_rps']} req/s, {result['sessions_per_min']} sessions/min")
+    print(f"  エラー率: {result['error_rate'] * 100:.2f}% {result['errors'] or ''}")
+    print(f"  {'event':<28}{'count':>7}{'p50ms':>10}{'p95ms':>10}{'p99ms':>10}{'maxms':>10}")
+    for event, s in result['events'].items():
+        print(f"  {event:<28}{s['count']:>7}{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}{s['max_ms']:>10}")
+    memory = result['memory']
+    print(f"  メモリ: 開始 {memory['baseline_mb']}MB → 終了 {memory['final_mb']}MB "
+          f"(ピーク {memory['peak_mb']}MB, 増加 {memory['growth_mb']}MB)")
+
+
+def spawn_server(threads, port, stub_url):
+    """スタブバックエンドに接続したgunicornを起動し、/healthが応答するまで待つ"""
+    env = dict(os.environ, STUB_BACKENDS_URL=stub_url)
+    env.setdefault('ELEVENLABS_ENABLED', 'true')
+    env.setdefault('ELEVENLABS_API_KEY', 'stub')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen(
+        ['gunicorn', 'application:app', '--bind', f'127.0.0.1:{port}', '--workers', '1',
+         '--threads', str(threads), '--timeout', '120', '--preload'],
+        cwd=root, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 180
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with code {process.returncode}')
+        try:
+            if requests.get(f'{url}/health', timeout=2).ok:
+                return process, url
+        except requests.RequestException:
+            pass
+        time.sleep(1)
+    process.terminate()
+    raise RuntimeError('gunicorn did not become healthy in time')
+
+
+def stop_server(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Socket.IO load test replaying scripted visitor sessions')
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help='target server (ignored with --spawn-threads)')
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--ramp-up', type=float, default=10.0, help='seconds over which clients are started')
+    parser.add_argument('--suggestion-clicks', type=int, default=6, help='suggestion clicks per session (phase1-3)')
+    parser.add_argument('--free-questions', type=int, default=2)
+    parser.add_argument('--think-time', type=float, default=1.0, help='mean seconds between visitor actions')
+    parser.add_argument('--english-ratio', type=float, default=0.2)
+    parser.add_argument('--timeout', type=float, default=60.0, help='seconds to wait for each server event')
+    parser.add_argument('--transports', default='polling,websocket',
+                        help="comma separated Socket.IO transports (e.g. 'websocket' to skip long-polling)")
+    parser.add_argument('--audio-transport', choices=['url', 'binary', 'base64'], default='url',
+                        help='how the server should deliver audio to the simulated visitors')
+    parser.add_argument('--audio-formats', default='opus,mp3',
+                        help='audio formats the simulated visitors declare as playable (Azure output negotiation)')
+    parser.add_argument('--audio-stream', action='store_true',
+                        help='ask for streamed audio (audio_chunk) and record the time to the first chunk')
+    parser.add_argument('--no-fetch-audio', dest='fetch_audio', action='store_false',
+                        help='do not download audio URLs carried by events')
+    parser.add_argument('--server-pid', type=int, help='read server memory from /proc instead of /metrics')
+    parser.add_argument('--memory-interval', type=float, default=2.0)
+    parser.add_argument('--spawn-threads', help='comma separated gunicorn thread counts to start and test in turn')
+    parser.add_argument('--spawn-port', type=int, default=8765)
+    parser.add_argument('--stub-url', default=os.getenv('STUB_BACKENDS_URL', 'http://127.0.0.1:9100'))
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args(argv)
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    args.free_questions = min(args.free_questions, min(len(q) for q in FREE_QUESTIONS.values()))
+
+    results = {}
+    if args.spawn_threads:
+        for threads in [int(t) for t in args.spawn_threads.split(',') if t.strip()]:
+            print(f'🚀 gunicorn起動: threads={threads}')
+            process, url = spawn_server(threads, args.spawn_port, args.stub_url)
+            try:
+                results[f'threads={threads}'] = run_load(url, args, server_pid=process.pid)
+            finally:
+                stop_server(process)
+            print_report(results[f'threads={threads}'], f'threads={threads}')
+    else:
+        results['target'] = run_load(args.url.rstrip('/'), args, server_pid=args.server_pid)
+        print_report(results['target'], args.url)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'results': results}, f, ensure_ascii=False, indent=2)
+        print(f'💾 結果を保存: {args.output}')
+
+    failed = sum(r['sessions_failed'] for r in results.values())
+    return 1 if failed and failed == sum(r['sessions'] for r in results.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
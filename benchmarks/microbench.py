@@ -0,0 +1,237 @@
+# microbench.py - 毎ターン実行される純Pythonの処理のマイクロベンチマーク
+# 日本語・英語の実際の入力（サジェスチョン・自由質問・静的Q&Aの応答文）で各関数を計測し、
+# 結果をJSONのベースラインとして保存・比較する。
+#
+# 使い方:
+#   python benchmarks/microbench.py                                # 計測して表示
+#   python benchmarks/microbench.py --save benchmarks/baselines/microbench.json
+#   python benchmarks/microbench.py --compare benchmarks/baselines/microbench.json --threshold 0.10
+#   python benchmarks/microbench.py --filter emotion               # 名前に emotion を含むものだけ
+#
+# --compare は中央値がベースラインより threshold（既定10%）以上遅くなったケースを回帰として表示し、
+# 1件でもあれば終了コード1を返す。計測は application をimportして行う
+# （外部サービスには接続しないよう、未設定なら STUB_BACKENDS_URL に到達しないアドレスを設定する）。
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+os.environ.setdefault('STUB_BACKENDS_URL', 'http://127.0.0.1:9')
+
+USER_QUESTIONS = {
+    'ja': [
+        '京友禅の特徴は何ですか？',
+        '挿し友禅って何？',
+        '糊置きってどんな作業？詳しく教えてください',
+        '一枚の着物を作るのにどれくらいかかるの？',
+        'すごい！こんなに細かい模様を手で描くなんてびっくりした',
+        'ふたばはどうして職人になったの？',
+        '今日は楽しかった、ありがとう',
+        '色の調合の方法と手順を具体的に教えて。季節によってやり方は変わるの？',
+    ],
+    'en': [
+        'What makes Kyo-Yuzen special?',
+        'What is sashi-yuzen?',
+        'How long does it take to make one kimono?',
+        'Wow, that is amazing! I did not know it was all hand painted.',
+        'Why did you become a craftsperson?',
+        'Can you explain the dyeing process step by step in detail?',
+        'I am a little sad that I have to leave soon.',
+    ],
+}
+
+
+_devnull = open(os.devnull, 'w')
+
+
+def _silenced():
+    """計測対象のprintを捨てる（端末への出力時間を計測に含めない）"""
+    return contextlib.redirect_stdout(_devnull)
+
+
+def load_application():
+    with _silenced():
+        import application
+    return application
+
+
+def build_cases(application):
+    """(名前, 関数, 入力リスト) のリスト。1回の計測で入力リストを1巡する"""
+    from modules import static_qa_data
+
+    questions = USER_QUESTIONS['ja'] + USER_QUESTIONS['en']
+
+    # 静的Q&Aの応答文（[EMOTION:xxx]タグ付きのLLM応答と同じ形）
+    answers = []
+    for language in ('ja', 'en'):
+        for phase_answers in static_qa_data.qa_responses[language].values():
+            answers.extend(text.strip() for text in list(phase_answers.values())[:3])
+
+    # サジェスチョン（静的Q&Aに命中する）と自由質問（命中しない）
+    lookups = []
+    for language in ('ja', 'en'):
+        for phase in ('phase1_overview', 'phase2_technical', 'phase3_personal'):
+            for suggestion in static_qa_data.get_suggestions_for_phase(phase, [], 'default', language)[:3]:
+                lookups.append((suggestion, 'default', phase, language))
+        for question in USER_QUESTIONS[language][:3]:
+            lookups.append((question, 'default', 'phase1_overview', language))
+
+    cases = [
+        ('normalize_question', application.normalize_question, [(q,) for q in questions]),
+        ('apply_kyoyuzen_terms', application.apply_kyoyuzen_terms,
+         [(a,) for a in answers if not a.isascii()]),
+        ('EmotionAnalyzer.analyze_emotion', application.emotion_analyzer.analyze_emotion,
+         [(a,) for a in answers]),
+        ('analyze_emotion', application.analyze_emotion, [(q,) for q in questions]),
+        ('get_response_for_user', static_qa_data.get_response_for_user, lookups),
+        ('extract_emotion_tag', application.extract_emotion_tag, [(a,) for a in answers]),
+        ('EmotionEngine.analyze_batch', application.emotion_engine.analyze_batch, [(answers,)]),
+        ('EmotionEngine.classify_batch', application.emotion_engine.classify_batch, [(questions, 'rag')]),
+    ]
+
+    chatbot = application.chatbot
+    if chatbot is None:
+        print('⚠️ RAGSystemを初期化できなかったため、RAGSystemのケースをスキップします', file=sys.stderr)
+        return cases
+
+    # ChromaDBが空の場合もuploads/の内容で知識・キャラクター設定を用意する
+    with _silenced():
+        if not chatbot.knowledge_base:
+            with open(os.path.join(ROOT, 'uploads', 'knowledge.txt'), 'r', encoding='utf-8') as f:
+                chatbot._parse_knowledge(f.read())
+        if not chatbot.character_settings:
+            with open(os.path.join(ROOT, 'uploads', 'personality.txt'), 'r', encoding='utf-8') as f:
+                chatbot._parse_character_settings(f.read())
+
+    cases += [
+        ('RAGSystem._analyze_user_emotion', chatbot._analyze_user_emotion, [(q,) for q in questions]),
+        ('RAGSystem.get_knowledge_context', chatbot.get_knowledge_context, [(q,) for q in questions]),
+        ('RAGSystem.get_character_prompt', chatbot.get_character_prompt, [()]),
+    ]
+    return cases
+
+
+def measure(func, inputs, min_time, repeat):
+    """入力リストを1巡する時間を計測し、1呼び出しあたりのマイクロ秒を返す"""
+    def run(loops):
+        start = time.perf_counter()
+        for _ in range(loops):
+            for args in inputs:
+                func(*args)
+        return time.perf_counter() - start
+
+    with _silenced():
+        run(1)  # ウォームアップ
+        loops = 1
+        while True:
+            elapsed = run(loops)
+            if elapsed >= min_time:
+                break
+            loops = max(loops * 2, int(loops * min_time / max(elapsed, 1e-9)) + 1)
+        samples = [run(loops) / (loops * len(inputs)) * 1e6 for _ in range(repeat)]
+
+    return {
+        'median_us': round(statistics.median(samples), 3),
+        'min_us': round(min(samples), 3),
+        'stdev_us': round(statistics.stdev(samples), 3) if len(samples) > 1 else 0.0,
+        'calls': loops * len(inputs),
+        'inputs': len(inputs),
+    }
+
+
+def run_benchmarks(args):
+    application = load_application()
+    results = {}
+    for name, func, inputs in build_cases(application):
+        if args.filter and args.filter.lower() not in name.lower():
+            continue
+        results[name] = measure(func, inputs, args.min_time, args.repeat)
+        r = results[name]
+        print(f"  {name:<36}{r['median_us']:>12.2f} µs  (min {r['min_us']:.2f}, ±{r['stdev_us']:.2f}, {r['inputs']} inputs)")
+    return {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'machine': platform.machine(),
+            'platform': platform.platform(),
+            'min_time': args.min_time,
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+
+
+def compare(current, baseline, threshold):
+    """中央値の変化率を表示し、回帰したケース名のリストを返す"""
+    regressions = []
+    print(f"\n📊 ベースライン比較（{baseline['meta'].get('created', '?')}, Python {baseline['meta'].get('python', '?')}）")
+    if baseline['meta'].get('machine') != current['meta']['machine'] or \
+            baseline['meta'].get('python') != current['meta']['python']:
+        print('⚠️ ベースラインと実行環境が異なります。比較結果は参考値です')
+
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if not base:
+            print(f"  {name:<36}{'(new)':>12}")
+            continue
+        change = (result['median_us'] - base['median_us']) / base['median_us'] if base['median_us'] else 0.0
+        if change > threshold:
+            marker = '❌ regression'
+            regressions.append(name)
+        elif change < -threshold:
+            marker = '✅ faster'
+        else:
+            marker = ''
+        print(f"  {name:<36}{base['median_us']:>10.2f} → {result['median_us']:>10.2f} µs  {change:+7.1%}  {marker}")
+
+    missing = set(baseline['results']) - set(current['results'])
+    if missing:
+        print(f"  （今回計測していないケース: {', '.join(sorted(missing))}）")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Micro-benchmarks for the per-turn pure-Python hot paths')
+    parser.add_argument('--filter', help='only run cases whose name contains this text')
+    parser.add_argument('--min-time', type=float, default=0.2, help='minimum seconds per timing sample')
+    parser.add_argument('--repeat', type=int, default=7, help='number of timing samples per case')
+    parser.add_argument('--save', help='write the results as a JSON baseline')
+    parser.add_argument('--compare', help='compare against a JSON baseline')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='relative slowdown of the median that counts as a regression')
+    args = parser.parse_args(argv)
+
+    print('⏱️ マイクロベンチマーク（1呼び出しあたりの中央値）')
+    current = run_benchmarks(args)
+
+    if args.save:
+        directory = os.path.dirname(args.save)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+        print(f"💾 ベースラインを保存: {args.save}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)}件の回帰（閾値 {args.threshold:.0%}）: {', '.join(regressions)}")
+            return 1
+        print(f"\n✅ 回帰なし（閾値 {args.threshold:.0%}）")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
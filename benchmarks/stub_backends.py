@@ -0,0 +1,323 @@
+# stub_backends.py - オフライン用の外部サービスのスタブサーバー
+# OpenAI（chat completions・embeddings・audio/speech・Whisper）、ElevenLabs、Azure REST TTS、
+# Google Sheets（values.append / values.get）の、このアプリが呼ぶエンドポイントだけを実装する。
+#
+# 使い方:
+#   python benchmarks/stub_backends.py --port 9100 [--config latency.json] [--error-rate 0.01]
+#   STUB_BACKENDS_URL=http://127.0.0.1:9100 ELEVENLABS_ENABLED=true ELEVENLABS_API_KEY=stub \
+#       python application.py
+#
+# レイテンシはエンドポイントごとに対数正規分布（中央値とp95をミリ秒で指定）で決まり、
+# error_rate の割合で 500 / 429 エラーを返す。設定例（--config に渡すJSON）:
+#   {"chat": {"median_ms": 900, "p95_ms": 2500, "error_rate": 0.01}, "elevenlabs": {"median_ms": 1200}}
+import argparse
+import hashlib
+import io
+import json
+import math
+import random
+import sys
+import time
+import wave
+
+from flask import Flask, Response, jsonify, request
+
+# エンドポイントごとの既定値（本番で観測される程度の値）
+DEFAULT_PROFILES = {
+    'chat': {'median_ms': 900, 'p95_ms': 2500, 'error_rate': 0.0},
+    'chat_token': {'median_ms': 25, 'p95_ms': 60, 'error_rate': 0.0},
+    'embeddings': {'median_ms': 120, 'p95_ms': 300, 'error_rate': 0.0},
+    'speech': {'median_ms': 700, 'p95_ms': 1600, 'error_rate': 0.0},
+    'whisper': {'median_ms': 800, 'p95_ms': 2000, 'error_rate': 0.0},
+    'elevenlabs': {'median_ms': 1000, 'p95_ms': 2500, 'error_rate': 0.0},
+    'azure': {'median_ms': 600, 'p95_ms': 1500, 'error_rate': 0.0},
+    'sheets': {'median_ms': 400, 'p95_ms': 1200, 'error_rate': 0.0},
+}
+
+EMBEDDING_DIMENSIONS = 1536
+
+CANNED_ANSWERS = {
+    'ja': "京友禅は、一枚の着物に何人もの職人が関わって仕上げる染色技法わん。私は色を挿す担当で、毎日筆を握っているわん。色の組み合わせを考えるのが一番楽しいわん。[EMOTION:happy]",
+    'en': "Kyo-Yuzen is a dyeing technique where many craftspeople work on a single kimono wan. I'm in charge of applying colors, and choosing color combinations is my favorite part wan. [EMOTION:happy]",
+}
+CANNED_TRANSCRIPTION = "京友禅の特徴は何ですか"
+
+app = Flask(__name__)
+profiles = {name: dict(profile) for name, profile in DEFAULT_PROFILES.items()}
+stats = {name: {'requests': 0, 'errors': 0} for name in DEFAULT_PROFILES}
+
+
+# ====== レイテンシ・エラー注入 ======
+def sample_latency(name):
+    """対数正規分布からレイテンシ（秒）を生成"""
+    profile = profiles[name]
+    median = max(profile.get('median_ms', 0), 0.001) / 1000
+    p95 = max(profile.get('p95_ms', profile.get('median_ms', 0)), 0.001) / 1000
+    sigma = max(math.log(p95 / median), 0.0) / 1.645
+    return random.lognormvariate(math.log(median), sigma) * profiles['_scale']
+
+
+def inject(name):
+    """レイテンシを待ち、設定された割合でエラー応答を返す（正常時はNone）"""
+    stats[name]['requests'] += 1
+    time.sleep(sample_latency(name))
+    if random.random() < profiles[name].get('error_rate', 0.0):
+        stats[name]['errors'] += 1
+        status = random.choice([500, 429])
+        return jsonify({'error': {'message': f'stub injected error ({name})', 'type': 'stub_error', 'code': status}}), status
+    return None
+
+
+# ====== 音声データの生成 ======
+def estimate_duration(text):
+    """読み上げ時間の目安（秒）"""
+    return max(1.0, len(text) * 0.12)
+
+
+def make_wav(duration, sample_rate=24000):
+    """無音のWAV（riff-24khz-16bit-mono-pcm相当）"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(b'\x00\x00' * int(duration * sample_rate))
+    return buffer.getvalue()
+
+
+def make_mp3(duration):
+    """無音のMP3（MPEG-1 Layer III 128kbps 44.1kHzのフレームを並べたもの）"""
+    frame = b'\xff\xfb\x90\x64' + b'\x00' * 413
+    frames_per_second = 44100 / 1152
+    return frame * max(1, int(duration * frames_per_second))
+
+
+def fake_embedding(value):
+    """入力から決まる疑似埋め込み（同じ入力には同じベクトル、正規化済み）"""
+    seed = int(hashlib.md5(json.dumps(value, ensure_ascii=False).encode('utf-8')).hexdigest()[:8], 16)
+    rng = random.Random(seed)
+    vector = [rng.gauss(0, 1) for _ in range(EMBEDDING_DIMENSIONS)]
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def detect_language(messages):
+    text = ' '.join(str(m.get('content', '')) for m in messages if m.get('role') == 'user')
+    return 'en' if text.isascii() else 'ja'
+
+
+# ====== OpenAI ======
+@app.route('/v1/chat/completions', methods=['POST'])
+def chat_completions():
+    payload = request.get_json(force=True)
+    answer = CANNED_ANSWERS[detect_language(payload.get('messages', []))]
+    model = payload.get('model', 'gpt-4')
+    completion_id = f"chatcmpl-stub{random.randint(0, 1 << 30)}"
+
+    if not payload.get('stream'):
+        error = inject('chat')
+        if error:
+            return error
+        return jsonify({
+            'id': completion_id,
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': answer},
+                'finish_reason': 'stop'
+            }],
+            'usage': {'prompt_tokens': 500, 'completion_tokens': 120, 'total_tokens': 620}
+        })
+
+    # ストリーミング: 最初のトークンまでにchatのレイテンシ、以降はトークンごとにchat_tokenのレイテンシ
+    error = inject('chat')
+    if error:
+        return error
+
+    def chunk(delta, finish_reason=None):
+        data = {
+            'id': completion_id,
+            'object': 'chat.completion.chunk',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]
+        }
+        return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    def generate():
+        yield chunk({'role': 'assistant', 'content': ''})
+        step = 2 if not answer.isascii() else 4
+        for i in range(0, len(answer), step):
+            time.sleep(sample_latency('chat_token'))
+            yield chunk({'content': answer[i:i + step]})
+        yield chunk({}, 'stop')
+        yield "data: [DONE]\n\n"
+
+    return Response(generate(), mimetype='text/event-stream')
+
+
+@app.route('/v1/embeddings', methods=['POST'])
+def embeddings():
+    error = inject('embeddings')
+    if error:
+        return error
+    payload = request.get_json(force=True)
+    inputs = payload.get('input', [])
+    if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+        inputs = [inputs]
+    return jsonify({
+        'object': 'list',
+        'model': payload.get('model', 'text-embedding-ada-002'),
+        'data': [{'object': 'embedding', 'index': i, 'embedding': fake_embedding(value)}
+                 for i, value in enumerate(inputs)],
+        'usage': {'prompt_tokens': 10 * len(inputs), 'total_tokens': 10 * len(inputs)}
+    })
+
+
+@app.route('/v1/audio/speech', methods=['POST'])
+def audio_speech():
+    error = inject('speech')
+    if error:
+        return error
+    payload = request.get_json(force=True)
+    return Response(make_mp3(estimate_duration(payload.get('input', ''))), mimetype='audio/mpeg')
+
+
+@app.route('/v1/audio/transcriptions', methods=['POST'])
+def audio_transcriptions():
+    error = inject('whisper')
+    if error:
+        return error
+    if request.form.get('response_format') == 'text':
+        return Response(CANNED_TRANSCRIPTION, mimetype='text/plain')
+    return jsonify({'text': CANNED_TRANSCRIPTION})
+
+
+# ====== ElevenLabs ======
+@app.route('/elevenlabs/v1/voices', methods=['GET'])
+def elevenlabs_voices():
+    return jsonify({'voices': [{'voice_id': '21m00Tcm4TlvDq8ikWAM', 'name': 'stub'}]})
+
+
+@app.route('/elevenlabs/v1/text-to-speech/<voice_id>', methods=['POST'])
+def elevenlabs_tts(voice_id):
+    error = inject('elevenlabs')
+    if error:
+        return error
+    payload = request.get_json(force=True)
+    return Response(make_mp3(estimate_duration(payload.get('text', ''))), mimetype='audio/mpeg')
+
+
+@app.route('/elevenlabs/v1/text-to-speech/<voice_id>/stream', methods=['POST'])
+def elevenlabs_tts_stream(voice_id):
+    """ストリーミング: 最初の断片までにレイテンシの3割、残りの断片を残りの時間で順に送る"""
+    latency = sample_latency('elevenlabs')
+    stats['elevenlabs']['requests'] += 1
+    time.sleep(latency * 0.3)
+    if random.random() < profiles['elevenlabs'].get('error_rate', 0.0):
+        stats['elevenlabs']['errors'] += 1
+        return jsonify({'error': {'message': 'stub injected error (elevenlabs)', 'type': 'stub_error', 'code': 500}}), 500
+    payload = request.get_json(force=True)
+    audio = make_mp3(estimate_duration(payload.get('text', '')))
+    pieces = 8
+    size = -(-len(audio) // pieces)
+
+    def generate():
+        for i in range(0, len(audio), size):
+            if i:
+                time.sleep(latency * 0.7 / pieces)
+            yield audio[i:i + size]
+
+    return Response(generate(), mimetype='audio/mpeg')
+
+
+# ====== Azure Speech（REST） ======
+@app.route('/azure/cognitiveservices/v1', methods=['POST'])
+def azure_tts():
+    error = inject('azure')
+    if error:
+        return error
+    ssml = request.get_data(as_text=True)
+    # SSMLのタグを除いたおおよその本文の長さで音声の長さを決める
+    text_length = len(ssml) - ssml.count('<') * 20
+    duration = max(1.0, text_length * 0.12)
+    # 要求された出力形式に合わせる（圧縮形式はおおよそのサイズだけ合わせたダミー）
+    output_format = request.headers.get('X-Microsoft-OutputFormat', 'riff-24khz-16bit-mono-pcm')
+    if 'mp3' in output_format:
+        return Response(make_mp3(duration), mimetype='audio/mpeg')
+    if 'opus' in output_format:
+        magic, mimetype = (b'OggS', 'audio/ogg') if output_format.startswith('ogg') else (b'\x1a\x45\xdf\xa3', 'audio/webm')
+        return Response(magic + b'\x00' * int(duration * 3000), mimetype=mimetype)
+    return Response(make_wav(duration), mimetype='audio/wav')
+
+
+# ====== Google Sheets ======
+sheet_rows = []
+
+
+@app.route('/sheets/v4/spreadsheets/<spreadsheet_id>/values/<path:range_and_action>', methods=['POST', 'GET'])
+def sheets_values(spreadsheet_id, range_and_action):
+    error = inject('sheets')
+    if error:
+        return error
+    if request.method == 'POST' and range_and_action.endswith(':append'):
+        values = request.get_json(force=True).get('values', [])
+        sheet_rows.extend(values)
+        return jsonify({
+            'spreadsheetId': spreadsheet_id,
+            'updates': {
+                'spreadsheetId': spreadsheet_id,
+                'updatedRange': range_and_action[:-len(':append')],
+                'updatedRows': len(values),
+                'updatedCells': sum(len(row) for row in values)
+            }
+        })
+    return jsonify({'range': range_and_action, 'values': [['header']] + sheet_rows})
+
+
+# ====== スタブ自体の状態 ======
+@app.route('/_stub/stats', methods=['GET'])
+def stub_stats():
+    return jsonify({'profiles': profiles, 'stats': stats, 'sheet_rows': len(sheet_rows)})
+
+
+def configure(config=None, error_rate=None, latency_scale=1.0):
+    """レイテンシ・エラー率の設定を反映"""
+    for name, overrides in (config or {}).items():
+        if name not in profiles:
+            raise ValueError(f"unknown stub endpoint: {name} (choices: {', '.join(DEFAULT_PROFILES)})")
+        profiles[name].update(overrides)
+    if error_rate is not None:
+        for name in DEFAULT_PROFILES:
+            profiles[name]['error_rate'] = error_rate
+    profiles['_scale'] = latency_scale
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Offline stub backends for benchmarking')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9100)
+    parser.add_argument('--config', help='JSON file with per-endpoint median_ms / p95_ms / error_rate')
+    parser.add_argument('--error-rate', type=float, help='override error rate for every endpoint')
+    parser.add_argument('--latency-scale', type=float, default=1.0,
+                        help='multiply every sampled latency (0 disables latency)')
+    parser.add_argument('--seed', type=int, help='random seed for reproducible runs')
+    args = parser.parse_args(argv)
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    config = None
+    if args.config:
+        with open(args.config, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    configure(config, args.error_rate, args.latency_scale)
+
+    print(f"🧪 スタブバックエンド起動: http://{args.host}:{args.port}", file=sys.stderr)
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -49,6 +49,14 @@ mkdir -p data/chroma_db
 mkdir -p uploads
 mkdir -p static/media/thumbnails
 
+# ====================================================
+# 6.5 静的Q&Aバンドルの作成（APIキーがある場合のみ）
+# ====================================================
+if [ -n "$OPENAI_API_KEY" ]; then
+    echo "📦 静的Q&Aバンドルを作成中..."
+    python build_static_bundles.py || echo "⚠️ 静的Q&Aバンドルの作成に失敗しました（起動時は音声を都度生成）"
+fi
+
 # ====================================================
 # 7. 権限設定
 # ====================================================
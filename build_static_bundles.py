@@ -0,0 +1,60 @@
+# build_static_bundles.py - 静的Q&Aバンドル（テキスト・感情・音声）を事前作成
+# 使い方: python build_static_bundles.py
+# 出力先: STATIC_BUNDLE_DIR（デフォルト: data/static_bundles）
+# ※ applicationはimportしない（ベクトルDB・チャットボットなどアプリの初期化は不要）
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from modules import backends
+from modules.reading_dictionary import ReadingDictionary
+from modules.static_bundles import build_bundles
+from modules.tts_engines import (TtsEngineRegistry, OpenAITtsEngine,
+                                 elevenlabs_engine_from_env, azure_engine_from_env)
+
+load_dotenv()
+
+
+def create_tts_engines():
+    """音声エンジンのレジストリを作成（アプリケーションと同じ環境変数・京友禅用語辞書を使う）"""
+    kyoyuzen_terms = ReadingDictionary(Path(__file__).parent / 'kyoyuzen_terms.json')
+    if not kyoyuzen_terms.load():
+        print(f"⚠️ 京友禅用語辞書が見つかりません: {kyoyuzen_terms.path}")
+    tts_engines = TtsEngineRegistry(readings=kyoyuzen_terms.apply)
+
+    api_key = os.getenv('OPENAI_API_KEY')
+    if backends.using_stubs():
+        api_key = api_key or 'stub'
+    engines = [
+        elevenlabs_engine_from_env(),
+        azure_engine_from_env(output_format='mp3'),  # ビルド時はREST API
+        OpenAITtsEngine(backends.openai_client(api_key=api_key)) if api_key else None,
+    ]
+    for engine in engines:
+        if not engine:
+            continue
+        if engine.test_connection():
+            tts_engines.register(engine)
+        else:
+            print(f"⚠️ {engine.label}接続テスト失敗（この音声エンジンのバンドル音声は作成しません）")
+    return tts_engines
+
+
+def main():
+    tts_engines = create_tts_engines()
+    synthesizers = {}
+
+    # 登録済みの音声エンジン（正規化・計測はアプリケーションと同じレジストリを通す）
+    for engine in tts_engines.names():
+        # どのブラウザでも再生できるmp3で作成（出力形式を選べるのはAzureのみ、他はmp3固定）
+        synthesizers[engine] = lambda text, language, emotion, engine=engine: (
+            tts_engines.synthesize(engine, text, language, emotion, output_format='mp3'), 'mp3'
+        )
+
+    print(f"🎤 使用する音声エンジン: {', '.join(synthesizers) or 'なし（テキストのみ）'}")
+    build_bundles(synthesizers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,271 @@
+# audio_store.py - ディスク上の音声キャッシュ（内容アドレス方式）
+# (正規化したテキスト, 言語, 感情スタイル, エンジン, 音声ID) のハッシュをキーに、
+# 合成済みの音声をbase64ではなく元のバイト列のままファイルに保存する。
+# 再起動・再デプロイ後も残り、同じディレクトリを使う複数のgunicornワーカーで共有できる。
+# 書き込みは一時ファイル + os.replace で原子的に行い、合計サイズの上限を超えたら
+# 最終アクセス（mtime）の古いものから削除する。読み出しはmmapで行う。
+import hashlib
+import mmap
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_audio_text(text):
+    """キャッシュキー用にテキストを正規化（前後の空白を除き、連続する空白を1つにまとめる）"""
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+def audio_format(data):
+    """音声データの形式（先頭のバイト列から判定）"""
+    head = bytes(data[:12])
+    if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+        return 'wav'
+    if head[:4] == b'OggS':
+        return 'ogg'
+    if head[:4] == b'\x1a\x45\xdf\xa3':
+        return 'webm'
+    return 'mp3'
+
+
+AUDIO_MIMETYPES = {'mp3': 'audio/mpeg', 'wav': 'audio/wav', 'ogg': 'audio/ogg', 'webm': 'audio/webm'}
+
+# Opus（WebM/Ogg）はヘッダーから長さが分からないため、公称ビットレート（Azureの24kbps）で推定する
+OPUS_NOMINAL_BITRATE = 24000
+
+# MP3（Layer III）のビットレート表（kbps）: MPEG-1 / MPEG-2・2.5
+_MP3_BITRATES = {
+    3: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    0: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+# 再生時間の推定に読む先頭のバイト数
+AUDIO_HEAD_BYTES = 4096
+
+
+def audio_duration(head, size):
+    """音声の再生時間（秒）の推定値（判定できなければNone）
+
+    WAVはヘッダーのバイトレートから、MP3は最初のフレームのビットレートから計算する（固定ビットレート前提）。
+    Opus（WebM/Ogg）は公称ビットレートからのおおよその値。
+
+    Args:
+        head: 音声データの先頭（AUDIO_HEAD_BYTES程度）
+        size: 音声データ全体のバイト数
+    """
+    head = bytes(head[:AUDIO_HEAD_BYTES])
+    kind = audio_format(head)
+    if kind == 'wav':
+        byte_rate = int.from_bytes(head[28:32], 'little')
+        return round(max(size - 44, 0) / byte_rate, 2) if byte_rate else None
+    if kind in ('webm', 'ogg'):
+        return round(size * 8 / OPUS_NOMINAL_BITRATE, 2)
+
+    offset = 0
+    if head[:3] == b'ID3' and len(head) >= 10:
+        offset = 10 + ((head[6] & 0x7f) << 21 | (head[7] & 0x7f) << 14 | (head[8] & 0x7f) << 7 | (head[9] & 0x7f))
+    frame = head[offset:offset + 4]
+    if len(frame) < 4 or frame[0] != 0xFF or frame[1] & 0xE0 != 0xE0 or (frame[1] >> 1) & 3 != 1:
+        return None
+    bitrates = _MP3_BITRATES.get((frame[1] >> 3) & 3)
+    bitrate = bitrates[frame[2] >> 4] if bitrates and frame[2] >> 4 < len(bitrates) else 0
+    return round((size - offset) * 8 / (bitrate * 1000), 2) if bitrate else None
+
+
+class AudioStore:
+    """内容アドレス方式のディスク音声キャッシュ"""
+
+    # mtime（LRUの順序）を更新する最短間隔。ヒットのたびにutimeを呼ばないようにする
+    TOUCH_INTERVAL = 60
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024):
+        """
+        Args:
+            directory: 保存先ディレクトリ（複数ワーカーで共有可能）
+            max_bytes: 合計サイズの上限（超えたら上限の90%まで古いものから削除）
+        """
+        self.directory = str(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._bytes = None  # 初回の書き込み時にディレクトリを走査して求める
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(text, language, style, engine, voice_id):
+        """キャッシュキー（SHA-256の16進文字列）"""
+        material = '\x1f'.join([normalize_audio_text(text), language or '', style or '',
+                                engine or '', voice_id or ''])
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        """キーに対応するファイルのパス（存在するとは限らない）"""
+        return os.path.join(self.directory, key[:2], key)
+
+    def contains(self, key):
+        return os.path.exists(self.path(key))
+
+    @contextmanager
+    def open(self, key):
+        """音声データをmmapで開く（なければNone）。with文の中でだけ有効"""
+        path = self.path(key)
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            f = None
+        if f is None:
+            self._count(hit=False)
+            yield None
+            return
+
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                self._count(hit=False)
+                yield None
+                return
+            self._count(hit=True)
+            self._touch(path)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                yield data
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def describe(self, key):
+        """(形式, バイト数, 再生時間) を先頭だけ読んで取得（なければNone）。ヒット・ミスには数えない"""
+        try:
+            with open(self.path(key), 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                head = f.read(AUDIO_HEAD_BYTES)
+        except FileNotFoundError:
+            return None
+        if not size:
+            return None
+        return audio_format(head), size, audio_duration(head, size)
+
+    def get(self, key):
+        """音声データをbytesで取得（なければNone）"""
+        with self.open(key) as data:
+            return bytes(data) if data is not None else None
+
+    def put(self, key, data):
+        """音声データを原子的に保存（同じキーは同じ内容なので上書きしても問題ない）"""
+        path = self.path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            with self._lock:
+                # 同じキーを他のスレッドが先に保存していた場合は上書きになるため、サイズの差だけを数える
+                try:
+                    previous_size = os.stat(path).st_size
+                except FileNotFoundError:
+                    previous_size = 0
+                os.replace(tmp_path, path)
+                self.writes += 1
+                if self._bytes is None:
+                    self._bytes = self._scan_total()
+                else:
+                    self._bytes += len(data) - previous_size
+                over_limit = self.max_bytes is not None and self._bytes > self.max_bytes
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        if over_limit:
+            self.evict()
+
+    def _touch(self, path):
+        """最終アクセスとしてmtimeを更新（LRUの順序に使う）"""
+        try:
+            if time.time() - os.stat(path).st_mtime > self.TOUCH_INTERVAL:
+                os.utime(path)
+        except OSError:
+            pass
+
+    def _entries(self):
+        """(mtime, size, path) の一覧（書き込み途中の一時ファイルは除く）"""
+        entries = []
+        try:
+            subdirs = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return entries
+        for subdir in subdirs:
+            if not subdir.is_dir():
+                continue
+            for entry in os.scandir(subdir.path):
+                if entry.name.startswith('.tmp-'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _scan_total(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """合計サイズが上限の90%になるまで、最終アクセスの古いものから削除
+
+        他のワーカーも同じディレクトリに書き込むため、削除前に毎回ディレクトリを走査し直す。
+        読み出し中（mmap中）のファイルを削除しても、開いている側のデータは有効なまま。
+        """
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            target = int(self.max_bytes * 0.9)
+            removed = 0
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+            self._bytes = total
+            self.evictions += removed
+        if removed:
+            print(f"🧹 音声ストア: {removed}件を削除 (合計 {total / 1024 / 1024:.1f} MB)")
+        return removed
+
+    def stats(self):
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = self._scan_total()
+            total = self._bytes
+            hits, misses, writes, evictions = self.hits, self.misses, self.writes, self.evictions
+        lookups = hits + misses
+        return {
+            'directory': self.directory,
+            'bytes': total,
+            'max_bytes': self.max_bytes,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'writes': writes,
+            'evictions': evictions
+        }
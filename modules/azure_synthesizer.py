@@ -0,0 +1,199 @@
+# azure_synthesizer.py - Azure Speech SDKによる音声合成（接続を開いたままのSpeechSynthesizerを使い回す）
+# REST APIでは発話ごとにHTTPリクエストを送るが、SDKのSpeechSynthesizerはサービスとの接続を保持できる。
+# 事前に接続を開いたインスタンスを出力形式ごとにプールしておき、最初の発話から接続の確立を待たない。
+# stream() は合成中の音声を読み出した分から返すため、ストリーミング再生では最初の音までの時間も短くなる
+# （synthesize() は音声全体を受け取ってから返すため、短縮できるのは接続の確立の時間だけ）。
+# SDKのネイティブスレッドはforkで子プロセスに引き継がれないため、インスタンスはプロセスごとに作る。
+import os
+import queue
+import threading
+
+import azure.cognitiveservices.speech as speechsdk
+
+# 短い名前 -> SDKの出力形式（RESTの X-Microsoft-OutputFormat と同じ形式）
+SDK_OUTPUT_FORMATS = {
+    'opus': speechsdk.SpeechSynthesisOutputFormat.Webm24Khz16Bit24KbpsMonoOpus,
+    'ogg': speechsdk.SpeechSynthesisOutputFormat.Ogg24Khz16BitMonoOpus,
+    'mp3': speechsdk.SpeechSynthesisOutputFormat.Audio24Khz48KBitRateMonoMp3,
+    'wav': speechsdk.SpeechSynthesisOutputFormat.Riff24Khz16BitMonoPcm
+}
+
+
+class SynthesisError(Exception):
+    """SDKでの合成の失敗（キャンセル・認証エラー・接続エラー）"""
+
+
+def _cancellation_message(details):
+    if details is None:
+        return 'canceled'
+    return f"{details.reason}: {details.error_details}"
+
+
+class _Synthesizer:
+    """SpeechSynthesizer と、事前に開いたサービスへの接続の組"""
+
+    def __init__(self, speech_config):
+        # audio_config=None: スピーカーに出力せず、結果をストリームで受け取る
+        self.synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=None)
+        self.connection = speechsdk.Connection.from_speech_synthesizer(self.synthesizer)
+        self.connection.open(True)
+
+    def close(self):
+        try:
+            self.connection.close()
+        except Exception:
+            pass
+
+
+class AzureSynthesizerPool:
+    """接続済みのSpeechSynthesizerのプール（出力形式ごと）
+
+    1つのSpeechSynthesizerは同時に1つの発話しか合成できないため、スレッドごとに1つ借りて返す。
+    空いているものがなければその場で作る（プールに戻せる数は pool_size まで）。
+    """
+
+    def __init__(self, speech_key, speech_region, pool_size=4):
+        """
+        Args:
+            speech_key: Azure Speechのキー
+            speech_region: リージョン（例: japaneast）
+            pool_size: 出力形式ごとに保持するインスタンス数（gunicornのスレッド数に合わせる）
+        """
+        self.speech_key = speech_key
+        self.speech_region = speech_region
+        self.pool_size = pool_size
+        self._lock = threading.Lock()
+        self._pools = {}
+        self._warmed = set()
+        self._pid = os.getpid()
+        # fork前のプロセスで作ったインスタンス（子プロセスで破棄するとネイティブ側で止まることがあるので保持だけする）
+        self._abandoned = []
+
+        self.created = 0
+        self.reused = 0
+        self.failures = 0
+
+    def _config(self, output_format):
+        config = speechsdk.SpeechConfig(subscription=self.speech_key, region=self.speech_region)
+        config.set_speech_synthesis_output_format(SDK_OUTPUT_FORMATS[output_format])
+        return config
+
+    def _pool(self, output_format):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._abandoned.append(self._pools)
+                self._pools = {}
+                self._warmed = set()
+                self._pid = os.getpid()
+            pool = self._pools.get(output_format)
+            if pool is None:
+                # 最後に使ったもの（接続が切れていない可能性が高い）から貸し出す
+                pool = self._pools[output_format] = queue.LifoQueue(maxsize=self.pool_size)
+            return pool
+
+    def _create(self, output_format):
+        synthesizer = _Synthesizer(self._config(output_format))
+        with self._lock:
+            self.created += 1
+        return synthesizer
+
+    def _acquire(self, output_format):
+        try:
+            synthesizer = self._pool(output_format).get_nowait()
+        except queue.Empty:
+            return self._create(output_format)
+        with self._lock:
+            self.reused += 1
+        return synthesizer
+
+    def _release(self, output_format, synthesizer, healthy):
+        if healthy:
+            try:
+                self._pool(output_format).put_nowait(synthesizer)
+                return
+            except queue.Full:
+                pass
+        synthesizer.close()
+
+    def warm_up(self, output_format='mp3'):
+        """出力形式のインスタンスを pool_size 個まで作って接続を開く（バックグラウンド。プロセスごとに1回）"""
+        pool = self._pool(output_format)
+        with self._lock:
+            if output_format in self._warmed:
+                return
+            self._warmed.add(output_format)
+
+        def run():
+            opened = 0
+            for _ in range(self.pool_size - pool.qsize()):
+                try:
+                    pool.put_nowait(self._create(output_format))
+                    opened += 1
+                except queue.Full:
+                    break
+                except Exception as e:
+                    print(f"⚠️ Azure Speech SDKの接続準備エラー: {e}")
+                    break
+            if opened:
+                print(f"🔌 Azure Speech SDK: {opened}個の接続を準備 (形式: {output_format})")
+
+        threading.Thread(target=run, daemon=True, name='azure-sdk-warmup').start()
+
+    def stream(self, ssml, output_format='mp3', chunk_size=16 * 1024):
+        """SSMLを合成し、AudioDataStreamから読み出した音声を届いた分から返すジェネレーター"""
+        synthesizer = self._acquire(output_format)
+        healthy = False
+        try:
+            result = synthesizer.synthesizer.start_speaking_ssml_async(ssml).get()
+            if result.reason == speechsdk.ResultReason.Canceled:
+                raise SynthesisError(_cancellation_message(result.cancellation_details))
+
+            audio_stream = speechsdk.AudioDataStream(result)
+            buffer = bytes(chunk_size)
+            while True:
+                filled = audio_stream.read_data(buffer)
+                if not filled:
+                    break
+                yield buffer[:filled]
+
+            if audio_stream.status == speechsdk.StreamStatus.Canceled:
+                raise SynthesisError(_cancellation_message(audio_stream.cancellation_details))
+            healthy = True
+        except Exception:
+            with self._lock:
+                self.failures += 1
+            raise
+        finally:
+            # 失敗したもの・途中で読むのをやめたものはプールに戻さない
+            self._release(output_format, synthesizer, healthy)
+
+    def synthesize(self, ssml, output_format='mp3'):
+        """SSMLを合成して音声全体のバイト列を返す（事前に開いた接続を使う。音声は全体が揃ってから返す）"""
+        return b''.join(self.stream(ssml, output_format))
+
+    def stats(self):
+        with self._lock:
+            pools = dict(self._pools) if self._pid == os.getpid() else {}
+            return {
+                'pool_size': self.pool_size,
+                'idle': {output_format: pool.qsize() for output_format, pool in pools.items()},
+                'created': self.created,
+                'reused': self.reused,
+                'failures': self.failures
+            }
+
+    def collect_metrics(self):
+        """Prometheus形式の行（metrics.registry.add_collector 用）"""
+        stats = self.stats()
+        lines = [
+            '# HELP futaba_azure_sdk_synthesizers_created_total Azure Speech SDK synthesizers created',
+            '# TYPE futaba_azure_sdk_synthesizers_created_total counter',
+            f'futaba_azure_sdk_synthesizers_created_total {stats["created"]}',
+            '# HELP futaba_azure_sdk_synthesizers_reused_total Syntheses served by a pooled synthesizer',
+            '# TYPE futaba_azure_sdk_synthesizers_reused_total counter',
+            f'futaba_azure_sdk_synthesizers_reused_total {stats["reused"]}',
+            '# HELP futaba_azure_sdk_synthesizers_idle Idle pooled synthesizers',
+            '# TYPE futaba_azure_sdk_synthesizers_idle gauge'
+        ]
+        lines += [f'futaba_azure_sdk_synthesizers_idle{{format="{f}"}} {n}' for f, n in stats['idle'].items()]
+        return lines
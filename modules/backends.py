@@ -0,0 +1,65 @@
+# backends.py - 外部サービス（OpenAI・ElevenLabs・Azure・Google Sheets）の接続先
+# STUB_BACKENDS_URL を設定すると、全ての接続先をオフライン用のスタブサーバー
+# （benchmarks/stub_backends.py）に切り替える。ネットワークなしでのベンチマーク・負荷試験用
+import os
+
+STUB_BACKENDS_URL = os.getenv('STUB_BACKENDS_URL', '').rstrip('/')
+
+ELEVENLABS_BASE_URL = 'https://api.elevenlabs.io/v1'
+
+
+def using_stubs():
+    """スタブサーバーを使用しているか"""
+    return bool(STUB_BACKENDS_URL)
+
+
+def openai_client(**kwargs):
+    """OpenAIクライアントを作成（スタブ使用時はスタブのエンドポイントを指す）"""
+    from openai import OpenAI
+    if using_stubs():
+        kwargs['base_url'] = f"{STUB_BACKENDS_URL}/v1"
+        kwargs.setdefault('api_key', os.getenv('OPENAI_API_KEY') or 'stub')
+    return OpenAI(**kwargs)
+
+
+def openai_embeddings_kwargs():
+    """OpenAIEmbeddingsの追加引数
+
+    スタブ使用時はtiktokenによるトークン分割（エンコーディングをダウンロードする）を無効にする。
+    """
+    if not using_stubs():
+        return {}
+    return {
+        'openai_api_base': f"{STUB_BACKENDS_URL}/v1",
+        'openai_api_key': os.getenv('OPENAI_API_KEY') or 'stub',
+        'check_embedding_ctx_length': False
+    }
+
+
+def elevenlabs_base_url():
+    """ElevenLabs APIのベースURL"""
+    if using_stubs():
+        return f"{STUB_BACKENDS_URL}/elevenlabs/v1"
+    return ELEVENLABS_BASE_URL
+
+
+def azure_tts_url(region):
+    """Azure Speech REST API（音声合成）のURL"""
+    if using_stubs():
+        return f"{STUB_BACKENDS_URL}/azure/cognitiveservices/v1"
+    return f"https://{region}.tts.speech.microsoft.com/cognitiveservices/v1"
+
+
+def sheets_build_kwargs():
+    """googleapiclient.discovery.build('sheets', 'v4', ...) の追加引数（スタブ使用時のみ）
+
+    スタブは認証しないため匿名の認証情報を使い、OAuthのトークン取得も行わない。
+    """
+    if not using_stubs():
+        return None
+    from google.auth.credentials import AnonymousCredentials
+    return {
+        'credentials': AnonymousCredentials(),
+        'client_options': {'api_endpoint': f"{STUB_BACKENDS_URL}/sheets/"},
+        'static_discovery': True
+    }
@@ -0,0 +1,165 @@
+# bounded_cache.py - 件数・バイト数に上限のあるLRU/TTLキャッシュ
+# 展示会の長時間稼働でプロセスのメモリが増え続けないよう、
+# 最近使われていないものから削除し、期限切れはバックグラウンドで掃除する
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+def estimate_size(value):
+    """キャッシュ値のおおよそのバイト数"""
+    if isinstance(value, (str, bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class BoundedCache:
+    """LRU順・TTL・合計バイト数の上限を持つスレッドセーフなキャッシュ"""
+
+    def __init__(self, name, max_entries=None, max_bytes=None, ttl_seconds=None,
+                 sweep_interval=60, size_fn=estimate_size):
+        """
+        Args:
+            name: ログ・統計用の名前
+            max_entries: 最大件数（Noneなら無制限）
+            max_bytes: 合計バイト数の上限（Noneなら無制限）
+            ttl_seconds: 有効期限（秒、Noneなら無期限）
+            sweep_interval: 期限切れを掃除する間隔（秒）
+            size_fn: 値のバイト数を返す関数
+        """
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.sweep_interval = sweep_interval
+        self.size_fn = size_fn
+
+        self._lock = threading.Lock()
+        self._data = OrderedDict()  # key -> (value, size, expires_at)
+        self._bytes = 0
+        self._sweeper = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        """値を取得（期限切れは削除してミス扱い）"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            value, size, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """値を保存し、上限を超えた分を古いものから削除"""
+        size = self.size_fn(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            print(f"⚠️ {self.name}キャッシュ: 上限を超えるサイズのため保存しません ({size} バイト)")
+            return
+
+        expires_at = time.time() + self.ttl_seconds if self.ttl_seconds else None
+
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, size, expires_at)
+            self._bytes += size
+
+            while self._data and (
+                (self.max_entries is not None and len(self._data) > self.max_entries)
+                or (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                oldest_key = next(iter(self._data))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+        self._ensure_sweeper()
+
+    def __contains__(self, key):
+        """統計に影響させずに有効なエントリがあるか確認"""
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and (entry[2] is None or entry[2] > time.time())
+
+    def __len__(self):
+        return len(self._data)
+
+    def _remove(self, key):
+        """エントリを削除（ロック内で呼び出すこと）"""
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def sweep(self):
+        """期限切れエントリを削除
+
+        Returns:
+            int: 削除した件数
+        """
+        now = time.time()
+        with self._lock:
+            expired = [key for key, (_, _, expires_at) in self._data.items()
+                       if expires_at is not None and expires_at <= now]
+            for key in expired:
+                self._remove(key)
+            self.expirations += len(expired)
+        return len(expired)
+
+    def _ensure_sweeper(self):
+        """掃除スレッドを起動（fork後のワーカーでも最初の書き込み時に起動する）"""
+        if not self.ttl_seconds or not self.sweep_interval:
+            return
+        if self._sweeper is not None and self._sweeper.is_alive():
+            return
+        with self._lock:
+            if self._sweeper is not None and self._sweeper.is_alive():
+                return
+            self._sweeper = threading.Thread(
+                target=self._sweep_loop,
+                name=f'{self.name}-cache-sweeper',
+                daemon=True
+            )
+            self._sweeper.start()
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                removed = self.sweep()
+                if removed:
+                    print(f"🧹 {self.name}キャッシュ: 期限切れ {removed} 件を削除")
+            except Exception as e:
+                print(f"❌ {self.name}キャッシュ掃除エラー: {e}")
+
+    def stats(self):
+        """統計情報"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._data),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0
+            }
@@ -0,0 +1,256 @@
+# circuit_breaker.py - 外部依存（ElevenLabs・Azure・OpenAI・Google Sheets）ごとのサーキットブレーカー
+# 直近の呼び出しの失敗率が閾値を超えたら回路を開き（open）、クールダウンの間は呼び出さずに
+# CircuitOpenError を即座に送出する（呼び出し側の既存のフォールバックがすぐに働く）。
+# クールダウン後は1件だけ試し（half_open）、成功すれば閉じ（closed）、失敗すれば再び開く。
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from modules import metrics
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# 🆕 False: ブレーカーを使わない（失敗の記録のみ行い、回路は開かない）
+ENABLE_CIRCUIT_BREAKERS = os.getenv('ENABLE_CIRCUIT_BREAKERS', 'true').lower() == 'true'
+
+
+class CircuitOpenError(Exception):
+    """回路が開いているため呼び出さなかった"""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} のサーキットブレーカーが開いています（あと{retry_after:.0f}秒）")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """失敗率によるサーキットブレーカー（スレッドセーフ）"""
+
+    def __init__(self, name, failure_rate=0.5, min_calls=5, window=20, window_seconds=60.0, cooldown=30.0):
+        """
+        Args:
+            name: 依存先の名前（メトリクス・/healthの表示用）
+            failure_rate: 直近の失敗率がこれ以上になったら開く
+            min_calls: 失敗率を判定するのに必要な直近の呼び出し数
+            window, window_seconds: 失敗率の計算に使う直近の呼び出しの件数・秒数
+            cooldown: 開いてから試し呼び出し（half_open）までの秒数
+        """
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._results = deque(maxlen=window)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_started = None
+
+        self.rejections = 0
+        self.opened = 0
+
+    def _recent(self, now):
+        cutoff = now - self.window_seconds
+        while self._results and self._results[0][0] < cutoff:
+            self._results.popleft()
+        return self._results
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                return HALF_OPEN
+            return self._state
+
+    def is_open(self):
+        """クールダウン中か（試し呼び出しができる状態ならFalse）"""
+        return self.state == OPEN
+
+    def allow(self):
+        """呼び出してよいか（half_openでは同時に1件だけ試す）"""
+        now = time.monotonic()
+        with self._lock:
+            if self._state == OPEN:
+                if now - self._opened_at < self.cooldown:
+                    self.rejections += 1
+                    return False
+                self._state = HALF_OPEN
+                self._probe_started = None
+            if self._state == HALF_OPEN:
+                # 試し呼び出しの結果が記録されないまま（呼び出し側で中断された場合など）クールダウンを過ぎたら次を試す
+                if self._probe_started is not None and now - self._probe_started < self.cooldown:
+                    self.rejections += 1
+                    return False
+                self._probe_started = now
+            return True
+
+    def check(self):
+        """呼び出せなければ CircuitOpenError を送出"""
+        if not self.allow():
+            retry_after = max(self.cooldown - (time.monotonic() - self._opened_at), 0.0)
+            raise CircuitOpenError(self.name, retry_after)
+
+    def record_success(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._state == HALF_OPEN:
+                print(f"✅ サーキットブレーカー {self.name}: 試し呼び出しに成功、回路を閉じます")
+                self._state = CLOSED
+                self._results.clear()
+            if self._state == CLOSED:
+                self._results.append((now, True))
+
+    def record_failure(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._open(now, '試し呼び出しに失敗')
+            elif self._state == CLOSED:
+                results = self._recent(now)
+                results.append((now, False))
+                failures = sum(1 for _, ok in results if not ok)
+                if len(results) >= self.min_calls and failures / len(results) >= self.failure_rate:
+                    self._open(now, f"失敗率 {failures}/{len(results)}")
+
+    def _open(self, now, reason):
+        """回路を開く（ロック内で呼び出すこと）"""
+        if not ENABLE_CIRCUIT_BREAKERS:
+            return
+        self._state = OPEN
+        self._opened_at = now
+        self._probe_started = None
+        self.opened += 1
+        print(f"🚫 サーキットブレーカー {self.name}: {reason}、{self.cooldown:.0f}秒間呼び出しを止めます")
+
+    def stats(self):
+        state = self.state
+        now = time.monotonic()
+        with self._lock:
+            results = list(self._recent(now))
+            retry_after = max(self.cooldown - (now - self._opened_at), 0.0) if state == OPEN else 0.0
+        failures = sum(1 for _, ok in results if not ok)
+        return {
+            'state': state,
+            'calls': len(results),
+            'failure_rate': round(failures / len(results), 4) if results else 0.0,
+            'retry_after_seconds': round(retry_after, 1),
+            'opened': self.opened,
+            'rejections': self.rejections
+        }
+
+
+# ====== 依存先ごとのブレーカー ======
+_defaults = {
+    'failure_rate': float(os.getenv('CIRCUIT_FAILURE_RATE', '0.5')),
+    'min_calls': int(os.getenv('CIRCUIT_MIN_CALLS', '5')),
+    'window_seconds': float(os.getenv('CIRCUIT_WINDOW_SECONDS', '60')),
+    'cooldown': float(os.getenv('CIRCUIT_COOLDOWN', '30'))
+}
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(name):
+    """依存先のブレーカー（初回に既定の設定で作成）"""
+    cb = _breakers.get(name)
+    if cb is None:
+        with _breakers_lock:
+            cb = _breakers.setdefault(name, CircuitBreaker(name, **_defaults))
+    return cb
+
+
+def is_open(name):
+    return breaker(name).is_open()
+
+
+@contextmanager
+def guard(dependency, circuit=None):
+    """外部依存の呼び出しをブレーカーで保護し、metrics.track_dependency で計測する
+
+    with guard('elevenlabs'):
+        response = ...  # ブロック内の例外は失敗として記録される（回路が開いていればブロックを実行しない）
+
+    Args:
+        dependency: メトリクスの依存先の名前
+        circuit: ブレーカーの名前（省略時は dependency。同じ外部サービスの別の呼び出し方で共有する場合に指定）
+    """
+    cb = breaker(circuit or dependency)
+    cb.check()
+    with metrics.track_dependency(dependency):
+        try:
+            yield
+        except Exception:
+            cb.record_failure()
+            raise
+    cb.record_success()
+
+
+def guard_stream(dependency, open_stream, circuit=None):
+    """ストリーミング応答をブレーカーで保護するジェネレーター（guard のストリーミング版）
+
+    for chunk in guard_stream('elevenlabs_stream', lambda: fetch_chunks(...), circuit='elevenlabs'):
+        send(chunk)  # ここでの例外・途中での読み止めは上流の失敗として数えない
+
+    open_stream() の呼び出しと、返されたイテラブルからの読み出しで起きた例外だけを失敗として記録する。
+    所要時間は上流からの断片を待っていた時間の合計（呼び出し側の処理時間は含めない）。
+    """
+    cb = breaker(circuit or dependency)
+    cb.check()
+    metrics.dependency_inflight.inc(dependency)
+    waited = 0.0
+    chunks = None
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                if chunks is None:
+                    chunks = iter(open_stream())
+                chunk = next(chunks)
+            except StopIteration:
+                break
+            except Exception:
+                metrics.dependency_errors.inc(dependency)
+                cb.record_failure()
+                raise
+            finally:
+                waited += time.perf_counter() - started
+            try:
+                yield chunk
+            except GeneratorExit:
+                # 呼び出し側が読むのをやめた（上流はここまで正常）
+                cb.record_success()
+                raise
+        cb.record_success()
+    finally:
+        if chunks is not None and hasattr(chunks, 'close'):
+            chunks.close()
+        metrics.dependency_duration.observe(dependency, value=waited)
+        metrics.dependency_inflight.dec(dependency)
+
+
+def stats():
+    """全てのブレーカーの状態（/health用）"""
+    return {name: cb.stats() for name, cb in sorted(_breakers.items())}
+
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+def collect_metrics():
+    """Prometheus形式の行（metrics.registry.add_collector 用）"""
+    all_stats = stats()
+    lines = [
+        '# HELP futaba_circuit_state Circuit breaker state (0 closed, 1 half-open, 2 open)',
+        '# TYPE futaba_circuit_state gauge'
+    ]
+    lines += [f'futaba_circuit_state{{dependency="{name}"}} {_STATE_VALUES[s["state"]]}' for name, s in all_stats.items()]
+    lines += [
+        '# HELP futaba_circuit_rejections_total Calls rejected while the circuit was open',
+        '# TYPE futaba_circuit_rejections_total counter'
+    ]
+    lines += [f'futaba_circuit_rejections_total{{dependency="{name}"}} {s["rejections"]}' for name, s in all_stats.items()]
+    return lines
@@ -0,0 +1,393 @@
+# emotion_engine.py - 事前コンパイル済みの感情分析エンジン
+# EmotionAnalyzer（重み付きスコア）・analyze_emotion（Live2D用）・RAGSystem._analyze_user_emotion の
+# キーワード・文脈フレーズを起動時に1つの正規表現（トライ木）にまとめ、
+# テキストを1回走査するだけで全感情のスコアを計算する。判定結果は従来の実装と同一。
+import re
+from collections import Counter
+
+from modules.text_matcher import KeywordMatcher
+
+# ====== EmotionAnalyzer用: 感情キーワード辞書(優先度順・拡張版) ======
+EMOTION_KEYWORDS = {
+    'happy': {
+        'keywords': [
+            'うれしい', '嬉しい', 'ウレシイ', 'ureshii',
+            '楽しい', 'たのしい', 'tanoshii',
+            'ハッピー', 'happy', 'はっぴー',
+            '喜び', 'よろこび', 'yorokobi',
+            '幸せ', 'しあわせ', 'shiawase',
+            '最高', 'さいこう', 'saikou',
+            'やった', 'yatta',
+            'わーい', 'わあい', 'waai',
+            '笑', 'わら', 'wara',
+            '良い', 'いい', 'よい', 'yoi',
+            '素晴らしい', 'すばらしい', 'subarashii',
+            'ありがとう', 'ありがと', 'おかげ',
+            '感謝', 'かんしゃ', '感動', 'かんどう',
+            '面白い', 'おもしろい', 'たのしみ',
+            'ワクワク', 'わくわく', 'ドキドキ',
+            # 新規追加
+            'うまい', '美味しい', 'おいしい', '美味',
+            '完璧', 'かんぺき', 'perfect',
+            'グッド', 'good', 'nice', 'ナイス',
+            '愛してる', '大好き', 'だいすき',
+            'すごく良い', 'とても良い', '非常に良い'
+        ],
+        'patterns': [r'♪+', r'〜+$', r'www', r'笑$'],
+        'weight': 1.3
+    },
+    'sad': {
+        'keywords': [
+            '悲しい', 'かなしい', 'カナシイ', 'kanashii',
+            '寂しい', 'さびしい', 'さみしい', 'sabishii',
+            '泣', 'なく', 'naku',
+            '涙', 'なみだ', 'namida',
+            '辛い', 'つらい', 'tsurai',
+            '苦しい', 'くるしい', 'kurushii',
+            '切ない', 'せつない', 'setsunai',
+            'しんどい', 'shindoi',
+            '失望', 'しつぼう', 'shitsubou',
+            '落ち込', 'おちこ', 'ochiko',
+            'がっかり', 'gakkari',
+            '憂鬱', 'ゆううつ', 'yuuutsu',
+            'ブルー', 'blue', 'ぶるー',
+            # 新規追加
+            '残念', 'ざんねん', 'zannen',
+            '悔しい', 'くやしい', 'kuyashii',
+            '孤独', 'こどく', 'kodoku',
+            'ひとりぼっち', 'hitoribocchi',
+            '絶望', 'ぜつぼう', 'zetsubou',
+            'つまらない', 'tsumaranai',
+            '不幸', 'ふこう', 'fukou'
+        ],
+        'patterns': [r'。。。', r'…+$', r'T[T_]T', r';;', r'泣$'],
+        'weight': 1.2
+    },
+    'angry': {
+        'keywords': [
+            '怒', 'おこ', 'oko',
+            'イライラ', 'いらいら', 'iraira',
+            'ムカつく', 'むかつく', 'mukatsuku',
+            'ムカムカ', 'むかむか', 'mukamuka',
+            '腹立', 'はらだ', 'harada',
+            'キレ', 'きれ', 'kire',
+            '憤', 'いきどお', 'ikidoo',
+            'ふざけ', 'fuzake',
+            '最悪', 'さいあく', 'saiaku',
+            'うざい', 'うざ', 'uzai',
+            'やばい', 'yabai',
+            # 新規追加
+            '頭にくる', 'あたまにくる', 'atamanikuru',
+            '許せない', 'ゆるせない', 'yurusenai',
+            '納得いかない', 'なっとくいかない',
+            '不愉快', 'ふゆかい', 'fuyukai',
+            '不満', 'ふまん', 'fuman',
+            'クソ', 'くそ', 'kuso',
+            'だめ', 'ダメ', 'dame'
+        ],
+        'patterns': [r'！！+', r'💢', r'怒$', r'ムカ'],
+        'weight': 1.3
+    },
+    'surprised': {
+        'keywords': [
+            '驚', 'おどろ', 'odoro',
+            'びっくり', 'ビックリ', 'bikkuri',
+            'すごい', 'スゴイ', 'sugoi',
+            'えっ', 'エッ', 'e',
+            'まじ', 'マジ', 'maji',
+            '信じられない', 'しんじられない', 'shinjirarenai',
+            '本当', 'ほんとう', 'hontou',
+            'やば', 'ヤバ', 'yaba',
+            'うそ', 'ウソ', '嘘', 'uso',
+            'なんと', 'ナント', 'nanto',
+            'まさか', 'マサカ', 'masaka',
+            # 新規追加
+            '意外', 'いがい', 'igai',
+            '予想外', 'よそうがい', 'yosougai',
+            '衝撃', 'しょうげき', 'shougeki',
+            'ショック', 'shock', 'しょっく',
+            '想定外', 'そうていがい', 'souteigai',
+            '仰天', 'ぎょうてん', 'gyouten'
+        ],
+        'patterns': [r'[!?！？]+', r'。。+', r'ええ[!?！？]'],
+        'weight': 1.1
+    }
+}
+
+# 文脈による感情判定用のフレーズ（EmotionAnalyzer）
+CONTEXT_PHRASES = {
+    'happy': [
+        'よかった', '楽しみ', '期待', '頑張', 'がんば', '応援',
+        '成功', 'せいこう', '達成', 'たっせい', '勝利', 'しょうり',
+        '祝福', 'しゅくふく', 'おめでとう', 'congratulations'
+    ],
+    'sad': [
+        '残念', 'ざんねん', '悔しい', 'くやしい', '寂しい',
+        '心配', 'しんぱい', '不安', 'ふあん', '困った', 'こまった',
+        '落胆', 'らくたん', '失望', 'しつぼう',
+        # 🎭 伝統工芸関連の悲しい文脈
+        '深刻な課題', 'しんこくなかだい', '後継者がいない', 'こうけいしゃがいない',
+        '技術が消える', 'ぎじゅつがきえる', '職人が減る', 'しょくにんがへる',
+        '伝統がなくなる', 'でんとうがなくなる', '廃れてしまう', 'すたれてしまう'
+    ],
+    'angry': [
+        '許せない', 'ゆるせない', '納得いかない', 'なっとくいかない',
+        '理解できない', 'りかいできない', '腹が立つ', 'はらがたつ',
+        '不公平', 'ふこうへい', '不当', 'ふとう',
+        '文句', 'もんく', '抗議', 'こうぎ', '反対', 'はんたい'
+    ],
+    'surprised': [
+        '知らなかった', 'しらなかった', '初めて', 'はじめて',
+        '予想外', 'よそうがい', '想定外', 'そうていがい',
+        '驚き', 'おどろき', '発見', 'はっけん'
+    ]
+}
+
+# ====== Live2D用の判定ルール ======
+# 'application': application.analyze_emotion（最初に一致した基本感情を返す）
+# 'rag': RAGSystem._analyze_user_emotion（一致数が最も多い基本感情を返す）
+LIVE2D_RULES = {
+    'application': {
+        'danger': [
+            # 日本語
+            'セクシー', 'エロ', '裸', '脱', '下着', '胸', 'おっぱい',
+            'パンツ', 'ブラ', 'きわどい', 'えっち', 'いやらしい',
+            # 英語
+            'sexy', 'nude', 'naked', 'breast', 'underwear', 'erotic',
+            'strip', 'panties', 'bra', 'inappropriate'
+        ],
+        'question_markers': ['?', '?', 'どう', 'なぜ', 'なに', '教えて',
+                             'how', 'why', 'what', 'explain'],
+        'technical_terms': ['方法', '手順', '技術', '仕組み', 'やり方',
+                            '原理', 'システム', '詳しく', '具体的'],
+        'topic_terms': [],
+        'serious_emotion': 'responseready',
+        'greetings': [],
+        'emotions': [
+            ('happy', ['嬉しい', 'うれしい', '楽しい', 'たのしい', 'わくわく',
+                       'やった', '最高', 'happy', 'glad', 'excited', 'joy', 'great']),
+            ('sad', ['悲しい', 'かなしい', '寂しい', 'さみしい', '辛い', 'つらい',
+                     '泣', '涙', 'sad', 'lonely', 'cry', 'tear', 'depressed']),
+            ('angry', ['怒', 'おこ', 'むかつく', 'イライラ', '腹立', 'ムカ',
+                       'angry', 'mad', 'furious', 'annoyed', 'pissed']),
+            ('surprise', ['驚', 'びっくり', 'すごい', 'まさか', 'えっ', 'わっ',
+                          'surprise', 'amazing', 'wow', 'incredible', 'unbelievable']),
+        ],
+        'selection': 'first',
+    },
+    'rag': {
+        'danger': [
+            # 日本語
+            'セクシー', 'エロ', '裸', '脱', '下着', '胸', 'おっぱい',
+            'パンツ', 'ブラ', 'きわどい', 'えっち', 'いやらしい',
+            '卑猥', 'わいせつ', '変態', 'へんたい',
+            # 英語
+            'sexy', 'nude', 'naked', 'breast', 'underwear', 'erotic',
+            'strip', 'panties', 'bra', 'inappropriate', 'lewd'
+        ],
+        'question_markers': ['?', '?', 'どう', 'なぜ', 'なに', '教えて',
+                             'how', 'why', 'what', 'explain', 'tell me'],
+        'technical_terms': ['方法', '手順', '技術', '仕組み', 'やり方',
+                            '原理', 'システム', '詳しく', '具体的',
+                            'process', 'technique', 'method', 'system'],
+        # 京セラ関連の真剣な質問（他の指標が1つ以上あるときだけ加点）
+        'topic_terms': ['京セラ', 'セラミック', '研究', 'イノベーション', '技術', '製品', '協業'],
+        'serious_emotion': 'neutraltalking',
+        'greetings': ['はじめまして', '初めまして', 'こんにちは', 'hello', 'hi',
+                      'nice to meet', 'はじめて', '初対面'],
+        'emotions': [
+            ('happy', ['嬉しい', 'うれしい', '楽しい', 'たのしい', 'わくわく',
+                       'やった', '最高', 'happy', 'glad', 'excited', 'joy', 'great',
+                       'ありがとう', '感謝', 'すごい', '素晴らしい']),
+            ('sad', ['悲しい', 'かなしい', '寂しい', 'さみしい', '辛い', 'つらい',
+                     '泣', '涙', 'sad', 'lonely', 'cry', 'tear', 'depressed',
+                     '残念', 'がっかり', '落ち込']),
+            ('angry', ['怒', 'おこ', 'むかつく', 'イライラ', '腹立', 'ムカ',
+                       'angry', 'mad', 'furious', 'annoyed', 'pissed',
+                       '許せない', 'ふざけ', '最悪']),
+            ('surprise', ['驚', 'びっくり', 'まさか', 'えっ', 'あっ',
+                          'surprise', 'amazing', 'wow', 'incredible', 'unbelievable',
+                          '信じられない', '本当に', 'マジで']),
+        ],
+        'selection': 'max',
+    },
+}
+
+_SYMBOLS = re.compile(r'[^\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FAF\w\s]')
+_FULLWIDTH = str.maketrans('０１２３４５６７８９ＡＢＣＤＥＦ', '0123456789ABCDEF')
+
+
+class _NormalizeTable(dict):
+    """normalize_text用の変換表（文字ごとの判定は初出時だけ正規表現で行い、以降は表引き）"""
+
+    def __missing__(self, code):
+        value = None if _SYMBOLS.match(chr(code)) else _FULLWIDTH.get(code, code)
+        self[code] = value
+        return value
+
+
+_normalize_table = _NormalizeTable()
+
+
+def normalize_text(text):
+    """テキストの正規化（記号を除去し、全角英数字を半角にして小文字化）"""
+    return text.translate(_normalize_table).lower()
+
+
+class _Live2DRules:
+    """Live2D用ルールをコンパイルした形（語の集合と、基本感情ごとの語の出現回数）"""
+
+    def __init__(self, rules):
+        self.danger = frozenset(rules['danger'])
+        self.question_markers = frozenset(rules['question_markers'])
+        self.technical_terms = frozenset(rules['technical_terms'])
+        self.topic_terms = frozenset(rules['topic_terms'])
+        self.serious_emotion = rules['serious_emotion']
+        self.greetings = frozenset(rules['greetings'])
+        # リスト内の重複も従来どおり数えるため、語ごとの出現回数を持つ
+        self.emotions = [(emotion, Counter(words)) for emotion, words in rules['emotions']]
+        self.selection = rules['selection']
+
+    def words(self):
+        words = set(self.danger | self.question_markers | self.technical_terms | self.topic_terms | self.greetings)
+        for _, counts in self.emotions:
+            words.update(counts)
+        return words
+
+
+class EmotionEngine:
+    """全ての感情キーワードを起動時にコンパイルした感情分析エンジン"""
+
+    def __init__(self, emotion_keywords=None, context_phrases=None, live2d_rules=None):
+        emotion_keywords = emotion_keywords or EMOTION_KEYWORDS
+        context_phrases = context_phrases or CONTEXT_PHRASES
+        live2d_rules = live2d_rules or LIVE2D_RULES
+
+        # 重み付きスコア: (感情, キーワード1つあたりの加点, パターン1つあたりの加点, パターン)
+        self._weighted = [
+            (emotion, 2.0 * config['weight'], 1.0 * config['weight'],
+             [re.compile(pattern) for pattern in config['patterns']])
+            for emotion, config in emotion_keywords.items()
+        ]
+        self._context_emotions = list(context_phrases)
+        # 語ごとの加点先: [(集計枠, リスト内の出現回数)]。枠はキーワード（感情順）→ 文脈フレーズ（感情順）
+        self._contributions = {}
+        word_lists = [config['keywords'] for config in emotion_keywords.values()] + list(context_phrases.values())
+        for index, words in enumerate(word_lists):
+            for word, count in Counter(words).items():
+                self._contributions.setdefault(word, []).append((index, count))
+        self._buckets = len(word_lists)
+        self._weighted_matcher = KeywordMatcher(self._contributions)
+
+        self._live2d = {name: _Live2DRules(rules) for name, rules in live2d_rules.items()}
+        live2d_words = set()
+        for rules in self._live2d.values():
+            live2d_words.update(rules.words())
+        self._live2d_matcher = KeywordMatcher(live2d_words)
+
+    # ====== 重み付きスコア（EmotionAnalyzer） ======
+    def scores(self, text):
+        """全感情のスコア（短文の補正を含む）。EmotionAnalyzer.analyze_emotionと同じ計算"""
+        scores = {'happy': 0.0, 'sad': 0.0, 'angry': 0.0, 'surprised': 0.0, 'neutral': 0.0}
+        counts = [0] * self._buckets
+        contributions = self._contributions
+        for word in self._weighted_matcher.find(normalize_text(text)):
+            for index, count in contributions[word]:
+                counts[index] += count
+
+        # 浮動小数の加算順も従来と揃える（キーワード → パターン → 文脈フレーズ）
+        for index, (emotion, keyword_score, pattern_score, patterns) in enumerate(self._weighted):
+            score = 0.0
+            for _ in range(counts[index]):
+                score += keyword_score
+            for pattern in patterns:
+                if pattern.search(text):
+                    score += pattern_score
+            scores[emotion] = score
+        offset = len(self._weighted)
+        for index, emotion in enumerate(self._context_emotions):
+            for _ in range(counts[offset + index]):
+                scores[emotion] += 0.5
+
+        # 文の長さによる調整(短い文は感情が強い傾向)
+        if len(text) < 10 and max(scores.values()) > 0:
+            max_emotion = max(scores, key=scores.get)
+            scores[max_emotion] *= 1.2
+        return scores
+
+    def analyze(self, text):
+        """(感情, 信頼度) を返す"""
+        if not text:
+            return 'neutral', 0.5
+
+        scores = self.scores(text)
+        max_score = max(scores.values())
+        if max_score < 1.0:
+            return 'neutral', 0.5
+
+        detected_emotion = max(scores, key=scores.get)
+        confidence = min(scores[detected_emotion] / 10.0, 1.0)
+
+        # 2番目に高いスコアとの差が小さい場合は信頼度を下げる
+        sorted_emotions = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+        if sorted_emotions[0][1] - sorted_emotions[1][1] < 1.0:
+            confidence *= 0.8
+        return detected_emotion, confidence
+
+    def analyze_batch(self, texts):
+        """複数テキストの (感情, 信頼度) のリスト"""
+        analyze = self.analyze
+        return [analyze(text) for text in texts]
+
+    # ====== Live2D用の判定 ======
+    def classify(self, text, rules='application'):
+        """Live2D用の感情ラベルを返す（rules: 'application' または 'rag'）"""
+        if not text:
+            return 'neutral'
+
+        r = self._live2d[rules]
+        found = self._live2d_matcher.find(text.lower())
+
+        # 1. DangerQuestion判定(不適切な質問) - 最優先
+        if not r.danger.isdisjoint(found):
+            return 'dangerquestion'
+
+        # 2. 真剣な質問の判定
+        serious_indicators = 0
+        if not r.question_markers.isdisjoint(found):
+            serious_indicators += 1
+        if len(text) > 50:
+            serious_indicators += 1
+        if not r.technical_terms.isdisjoint(found):
+            serious_indicators += 1
+        if serious_indicators >= 1 and not r.topic_terms.isdisjoint(found):
+            serious_indicators += 1
+        if serious_indicators >= 2:
+            return r.serious_emotion
+
+        # 3. Start判定(初対面・挨拶)
+        if not r.greetings.isdisjoint(found):
+            return 'start'
+
+        # 4. 基本感情の判定
+        if r.selection == 'first':
+            for emotion, counts in r.emotions:
+                if not found.isdisjoint(counts):
+                    return emotion
+            return 'neutral'
+
+        best_emotion, best_score = 'neutral', 0
+        for emotion, counts in r.emotions:
+            score = sum(counts[word] for word in found if word in counts)
+            if score > best_score:
+                best_emotion, best_score = emotion, score
+        return best_emotion
+
+    def classify_batch(self, texts, rules='application'):
+        """複数テキストのLive2D用感情ラベルのリスト"""
+        classify = self.classify
+        return [classify(text, rules) for text in texts]
+
+
+# アプリケーション共通のエンジン（起動時に1回だけコンパイル）
+engine = EmotionEngine()
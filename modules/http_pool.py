@@ -0,0 +1,139 @@
+# http_pool.py - 外部API（ElevenLabs・Azure Speechなど）で共有するHTTP接続プール
+# requests.Session を1つだけ作り、ホストごとの接続をkeep-aliveで使い回す。
+# 発話のたびにTCP+TLSのハンドシェイクをやり直さないようにするためのもの。
+# requests.Session（urllib3の接続プール）はスレッド間で共有できる。
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def _parse_host_pool_sizes(value):
+    """'api.elevenlabs.io=8,japaneast.tts.speech.microsoft.com=4' → {ホスト: 接続数}"""
+    sizes = {}
+    for item in (value or '').split(','):
+        host, _, size = item.partition('=')
+        if host.strip() and size.strip().isdigit():
+            sizes[host.strip()] = int(size)
+    return sizes
+
+
+class HttpPool:
+    """keep-alive の接続プール付きHTTPクライアント
+
+    タイムアウトは (接続, 読み込み) に分けて指定する。接続はすぐ失敗させ、
+    音声合成のように応答に時間がかかる読み込みだけ長めに待つ。
+    """
+
+    def __init__(self, pool_maxsize=10, connect_timeout=3.05, read_timeout=30, host_pool_sizes=None):
+        """
+        Args:
+            pool_maxsize: 1ホストあたりの接続数の上限（gunicornのスレッド数以上にする）
+            connect_timeout: 接続タイムアウト（秒）
+            read_timeout: 読み込みタイムアウト（秒。リクエストごとに上書き可能）
+            host_pool_sizes: ホストごとの接続数の上限 {ホスト名: 接続数}
+        """
+        self.pool_maxsize = pool_maxsize
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.host_pool_sizes = dict(host_pool_sizes or {})
+        self._lock = threading.Lock()
+        self._session = None
+
+    @property
+    def session(self):
+        """共有のrequests.Session（初回使用時に作成）"""
+        session = self._session
+        if session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = self._create_session()
+                session = self._session
+        return session
+
+    def _create_session(self):
+        session = requests.Session()
+        # 失敗時の再送は呼び出し側（フォールバック）に任せる
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=self.pool_maxsize, max_retries=0)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        for host, size in self.host_pool_sizes.items():
+            host_adapter = HTTPAdapter(pool_connections=1, pool_maxsize=size, max_retries=0)
+            session.mount(f'https://{host}', host_adapter)
+            session.mount(f'http://{host}', host_adapter)
+        return session
+
+    def request(self, method, url, read_timeout=None, **kwargs):
+        """リクエストを送信（timeoutを省略した場合は (接続, 読み込み) のタイムアウトを使う）"""
+        kwargs.setdefault('timeout', (self.connect_timeout, read_timeout or self.read_timeout))
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def reset(self):
+        """全ての接続を閉じる（次のリクエストで新しいSessionを作る）"""
+        with self._lock:
+            session, self._session = self._session, None
+        if session is not None:
+            session.close()
+
+    def _after_fork(self):
+        """fork後の子プロセスでは親の接続（TLSの状態を共有してしまう）を使わない
+
+        ロックはfork時に他のスレッドが保持していた可能性があるので作り直し、
+        親のSessionは閉じずに手放すだけにする（親側の接続に影響させない）。
+        """
+        self._lock = threading.Lock()
+        self._session = None
+
+    def stats(self):
+        """ホストごとの接続数・リクエスト数（現在保持しているプールのみ）"""
+        hosts = {}
+        session = self._session
+        if session is None:
+            return hosts
+        for adapter in set(session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                host = f'{pool.host}:{pool.port}'
+                entry = hosts.setdefault(host, {'connections': 0, 'requests': 0})
+                entry['connections'] += pool.num_connections
+                entry['requests'] += pool.num_requests
+        return hosts
+
+    def collect_metrics(self):
+        """Prometheus形式の行（metrics.registry.add_collector 用）"""
+        hosts = self.stats()
+        lines = [
+            '# HELP futaba_http_pool_connections_total Connections opened by the shared HTTP pool',
+            '# TYPE futaba_http_pool_connections_total counter'
+        ]
+        lines += [f'futaba_http_pool_connections_total{{host="{host}"}} {s["connections"]}' for host, s in hosts.items()]
+        lines += [
+            '# HELP futaba_http_pool_requests_total Requests sent through the shared HTTP pool',
+            '# TYPE futaba_http_pool_requests_total counter'
+        ]
+        lines += [f'futaba_http_pool_requests_total{{host="{host}"}} {s["requests"]}' for host, s in hosts.items()]
+        return lines
+
+
+# アプリケーション全体で共有するプール
+pool = HttpPool(
+    pool_maxsize=int(os.getenv('HTTP_POOL_MAXSIZE', '10')),
+    connect_timeout=float(os.getenv('HTTP_CONNECT_TIMEOUT', '3.05')),
+    read_timeout=float(os.getenv('HTTP_READ_TIMEOUT', '30')),
+    host_pool_sizes=_parse_host_pool_sizes(os.getenv('HTTP_POOL_SIZES'))
+)
+
+# gunicornの --preload ではマスターで初期化（接続テスト）してからforkするため、
+# 子プロセスでは親が開いた接続を捨てて新しく接続する
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=pool._after_fork)
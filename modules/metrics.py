@@ -0,0 +1,261 @@
+# metrics.py - Prometheusテキスト形式のメトリクス（/metrics用）
+# 負荷が高くても集計コストが一定になるよう、観測のたびにバケットを加算するだけの
+# インクリメンタルなヒストグラム・カウンター・ゲージを持つ（session_data等の走査はしない）
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# 秒単位のバケット境界（TTS・GPT-4の数秒〜数十秒まで）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _format_labels(label_names, label_values, extra=None):
+    pairs = list(zip(label_names, label_values))
+    if extra:
+        pairs.extend(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    metric_type = None
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.metric_type}"]
+
+
+class Counter(_Metric):
+    metric_type = 'counter'
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + amount
+
+    def render(self):
+        with self._lock:
+            series = sorted(self._series.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}"
+            for labels, value in series
+        ]
+
+
+class Gauge(_Metric):
+    metric_type = 'gauge'
+
+    def set(self, *label_values, value):
+        with self._lock:
+            self._series[label_values] = value
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + amount
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+    def render(self):
+        with self._lock:
+            series = sorted(self._series.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}"
+            for labels, value in series
+        ]
+
+
+class Histogram(_Metric):
+    """バケット別の累積件数を観測ごとに加算するヒストグラム
+
+    p50/p95/p99はバケット境界の線形補間で推定し、{name}_quantile として出力する
+    （Prometheus側では histogram_quantile() でも同じ値を計算できる）。
+    """
+    metric_type = 'histogram'
+
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, *label_values, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # [バケット別件数（最後は+Inf）, 合計, 件数]
+                series = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._series[label_values] = series
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def _estimate_quantile(self, counts, total, q):
+        rank = q * total
+        cumulative = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, counts):
+            if count and cumulative + count >= rank:
+                return lower + (bound - lower) * (rank - cumulative) / count
+            cumulative += count
+            lower = bound
+        # +Infバケットに入った場合は最大の境界を返す
+        return self.buckets[-1]
+
+    def quantile(self, q, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if not series or not series[2]:
+                return None
+            counts, _, total = list(series[0]), series[1], series[2]
+        return self._estimate_quantile(counts, total, q)
+
+    def render(self):
+        with self._lock:
+            snapshot = sorted((labels, (list(s[0]), s[1], s[2])) for labels, s in self._series.items())
+
+        lines = self._header()
+        quantile_lines = [
+            f"# HELP {self.name}_quantile {self.help_text} (estimated p50/p95/p99)",
+            f"# TYPE {self.name}_quantile gauge"
+        ]
+        for labels, (counts, total_sum, total) in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = _format_labels(self.label_names, labels, [('le', _format_value(bound))])
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            base = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{base} {_format_value(total_sum)}")
+            lines.append(f"{self.name}_count{base} {total}")
+
+            for q in QUANTILES:
+                value = self._estimate_quantile(counts, total, q)
+                ql = _format_labels(self.label_names, labels, [('quantile', q)])
+                quantile_lines.append(f"{self.name}_quantile{ql} {_format_value(round(value, 6))}")
+
+        return lines + (quantile_lines if snapshot else [])
+
+
+class Registry:
+    """メトリクスとスクレイプ時に値を集める関数（collector）をまとめて出力する"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help_text, label_names=()):
+        return self._register(Counter(name, help_text, label_names))
+
+    def gauge(self, name, help_text, label_names=()):
+        return self._register(Gauge(name, help_text, label_names))
+
+    def histogram(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, label_names, buckets))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        """collector() はスクレイプ時に呼ばれ、出力する行のリストを返す"""
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                lines.extend(collector())
+            except Exception as e:
+                print(f"⚠️ メトリクス収集エラー: {e}")
+        return '\n'.join(lines) + '\n'
+
+
+# ====== アプリケーション共通のメトリクス ======
+registry = Registry()
+
+stage_duration = registry.histogram(
+    'futaba_stage_duration_seconds', 'Duration of chat pipeline stages', ('stage',))
+dependency_duration = registry.histogram(
+    'futaba_dependency_duration_seconds', 'Duration of calls to external dependencies', ('dependency',))
+dependency_errors = registry.counter(
+    'futaba_dependency_errors_total', 'Failed calls to external dependencies', ('dependency',))
+dependency_inflight = registry.gauge(
+    'futaba_dependency_inflight', 'Calls to external dependencies currently in flight', ('dependency',))
+inflight_requests = registry.gauge(
+    'futaba_inflight_requests', 'Socket.IO requests currently being handled', ('handler',))
+active_connections = registry.gauge(
+    'futaba_socketio_connections', 'Active Socket.IO connections')
+
+
+@contextmanager
+def track_dependency(dependency):
+    """外部依存の呼び出しを計測（所要時間・失敗数・実行中の数）"""
+    dependency_inflight.inc(dependency)
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        dependency_errors.inc(dependency)
+        raise
+    finally:
+        dependency_duration.observe(dependency, value=time.perf_counter() - start)
+        dependency_inflight.dec(dependency)
+
+
+@contextmanager
+def track_inflight(handler):
+    """Socket.IOハンドラーの実行中の数を計測"""
+    inflight_requests.inc(handler)
+    try:
+        yield
+    finally:
+        inflight_requests.dec(handler)
+
+
+def observe_stage(stage, seconds):
+    """処理段階の所要時間を記録（tracingのスパンリスナーとして使う）"""
+    stage_duration.observe(stage, value=seconds)
+
+
+def collect_process_metrics():
+    """プロセスの常駐メモリ（負荷試験でのメモリ増加の確認用）"""
+    rss_bytes = None
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    rss_bytes = int(line.split()[1]) * 1024
+                    break
+    except OSError:
+        pass
+    if rss_bytes is None:
+        import resource
+        import sys
+        # Linux以外ではピーク値しか取れない（macOSはバイト、その他はKB単位）
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        rss_bytes = max_rss if sys.platform == 'darwin' else max_rss * 1024
+    return [
+        '# HELP process_resident_memory_bytes Resident memory size in bytes',
+        '# TYPE process_resident_memory_bytes gauge',
+        f'process_resident_memory_bytes {rss_bytes}'
+    ]
+
+
+registry.add_collector(collect_process_metrics)
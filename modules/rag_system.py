@@ -17,7 +17,10 @@ from langchain.text_splitter import RecursiveCharacterTextSplitter
 import chromadb
 from chromadb.config import Settings
 
-from openai import OpenAI
+from modules import tracing
+from modules import backends
+from modules import circuit_breaker
+from modules.emotion_engine import engine as emotion_engine
 import random
 import re
 from datetime import datetime
@@ -94,6 +97,38 @@ def _import_static_qa_functions():
 import threading
 _db_creation_lock = threading.Lock()
 
+# 🆕 プロンプト構築前の独立した取得処理（感情分析・知識検索・類似検索）を並行実行する共有プール
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+RAG_RETRIEVAL_WORKERS = int(os.getenv('RAG_RETRIEVAL_WORKERS', '6'))
+_retrieval_executor = ThreadPoolExecutor(
+    max_workers=RAG_RETRIEVAL_WORKERS,
+    thread_name_prefix='rag-retrieval'
+)
+# タイムアウトで見切ったがまだ実行中の段階の数（プールのワーカーを占有している）
+_abandoned_stages = 0
+_abandoned_lock = threading.Lock()
+
+def _abandon(future):
+    """タイムアウトした段階を見切る（未着手なら取り消し、実行中なら終わるまで占有数に数える）"""
+    global _abandoned_stages
+    if future.cancel():
+        return
+    with _abandoned_lock:
+        _abandoned_stages += 1
+    future.add_done_callback(_release_abandoned)
+
+def _release_abandoned(future):
+    global _abandoned_stages
+    with _abandoned_lock:
+        _abandoned_stages -= 1
+
+# 段階ごとのタイムアウト（秒）。超えた段階は既定値で続行する
+RETRIEVAL_STAGE_TIMEOUTS = {
+    'emotion': float(os.getenv('RAG_EMOTION_TIMEOUT', '1.0')),
+    'knowledge': float(os.getenv('RAG_KNOWLEDGE_TIMEOUT', '1.0')),
+    'search': float(os.getenv('RAG_SEARCH_TIMEOUT', '5.0')),
+}
+
 class RAGSystem:
     def __init__(self, persist_directory=None):
         # 環境変数からデータベースパスを取得
@@ -101,8 +136,8 @@ class RAGSystem:
             persist_directory = os.getenv('CHROMA_DB_PATH', 'data/chroma_db')
         self.persist_directory = persist_directory
         
-        self.embeddings = OpenAIEmbeddings()
-        self.openai_client = OpenAI()
+        self.embeddings = OpenAIEmbeddings(**backends.openai_embeddings_kwargs())
+        self.openai_client = backends.openai_client()
         
         # 🔧 DBインスタンスを明示的に初期化
         self.db = None
@@ -705,103 +740,15 @@ class RAGSystem:
     # 【Live2D対応】感情分析メソッドの拡張(9種類対応)
     def _analyze_user_emotion(self, text):
         """ユーザーの感情を分析(Live2D 9種類対応)"""
-        if not text:
-            return 'neutral'
-        
-        text_lower = text.lower().strip()
-        
-        # 1. DangerQuestion判定(不適切な質問) - 最優先
-        danger_keywords = [
-            # 日本語
-            'セクシー', 'エロ', '裸', '脱', '下着', '胸', 'おっぱい',
-            'パンツ', 'ブラ', 'きわどい', 'えっち', 'いやらしい',
-            '卑猥', 'わいせつ', '変態', 'へんたい',
-            # 英語
-            'sexy', 'nude', 'naked', 'breast', 'underwear', 'erotic',
-            'strip', 'panties', 'bra', 'inappropriate', 'lewd'
-        ]
+        # 🆕 判定ルールは emotion_engine.LIVE2D_RULES['rag']（1回の走査で全キーワードを照合）
+        emotion = emotion_engine.classify(text, 'rag')
         
-        if any(keyword in text_lower for keyword in danger_keywords):
+        if emotion == 'dangerquestion':
             print(f"🚫 DangerQuestion detected in RAG: {text[:30]}...")
-            return 'dangerquestion'
-        
-        # 2. ResponseReady判定(真剣な質問)
-        serious_indicators = 0
-        
-        # 質問マーカーチェック
-        question_markers = ['?', '?', 'どう', 'なぜ', 'なに', '教えて', 
-                           'how', 'why', 'what', 'explain', 'tell me']
-        if any(marker in text_lower for marker in question_markers):
-            serious_indicators += 1
-        
-        # 長文チェック(50文字以上)
-        if len(text) > 50:
-            serious_indicators += 1
-        
-        # 専門用語チェック
-        technical_terms = ['方法', '手順', '技術', '仕組み', 'やり方', 
-                          '原理', 'システム', '詳しく', '具体的',
-                          'process', 'technique', 'method', 'system']
-        if any(term in text_lower for term in technical_terms):
-            serious_indicators += 1
-        
-        # 京セラ関連の真剣な質問
-        kyocera_terms = ['京セラ', 'セラミック', '研究', 'イノベーション', '技術', '製品', '協業']
-        if any(term in text_lower for term in kyocera_terms) and serious_indicators >= 1:
-            serious_indicators += 1
-        
-        if serious_indicators >= 2:
+        elif emotion == 'neutraltalking':
             print(f"📚 NeutralTalking detected in RAG: {text[:30]}...")
-            return 'neutraltalking'
         
-        # 3. Start判定(初対面・挨拶)
-        greeting_words = ['はじめまして', '初めまして', 'こんにちは', 'hello', 'hi', 
-                         'nice to meet', 'はじめて', '初対面']
-        if any(word in text_lower for word in greeting_words):
-            return 'start'
-        
-        # 4. 基本感情の判定
-        emotion_scores = {
-            'happy': 0,
-            'sad': 0,
-            'angry': 0,
-            'surprise': 0,
-            'neutral': 0
-        }
-        
-        # Happy
-        happy_words = ['嬉しい', 'うれしい', '楽しい', 'たのしい', 'わくわく',
-                      'やった', '最高', 'happy', 'glad', 'excited', 'joy', 'great',
-                      'ありがとう', '感謝', 'すごい', '素晴らしい']
-        emotion_scores['happy'] = sum(1 for word in happy_words if word in text_lower)
-        
-        # Sad
-        sad_words = ['悲しい', 'かなしい', '寂しい', 'さみしい', '辛い', 'つらい',
-                    '泣', '涙', 'sad', 'lonely', 'cry', 'tear', 'depressed',
-                    '残念', 'がっかり', '落ち込']
-        emotion_scores['sad'] = sum(1 for word in sad_words if word in text_lower)
-        
-        # Angry
-        angry_words = ['怒', 'おこ', 'むかつく', 'イライラ', '腹立', 'ムカ',
-                      'angry', 'mad', 'furious', 'annoyed', 'pissed',
-                      '許せない', 'ふざけ', '最悪']
-        emotion_scores['angry'] = sum(1 for word in angry_words if word in text_lower)
-        
-        # Surprise
-        surprise_words = ['驚', 'びっくり', 'まさか', 'えっ', 'あっ',
-                         'surprise', 'amazing', 'wow', 'incredible', 'unbelievable',
-                         '信じられない', '本当に', 'マジで']
-        emotion_scores['surprise'] = sum(1 for word in surprise_words if word in text_lower)
-        
-        # 最高スコアの感情を選択
-        max_score = max(emotion_scores.values())
-        if max_score > 0:
-            for emotion, score in emotion_scores.items():
-                if score == max_score:
-                    return emotion
-        
-        # デフォルト
-        return 'neutral'
+        return emotion
     
     def get_character_prompt(self):
         """キャラクター設定プロンプトを生成（🆕 京セラCERA版）"""
@@ -993,8 +940,91 @@ class RAGSystem:
         
         return unique_suggestions if unique_suggestions else lang_suggestions.get('default', ['もっと教えて'])[:3]
     
-    def get_response(self, question, language='ja', conversation_history=None):
-        """質問に対する応答を生成(感情履歴・関係性対応版)"""
+    def _run_retrieval_stages(self, question, query_embedding=None):
+        """互いに依存しない3つの取得処理を共有プールで並行実行する
+        
+        Args:
+            query_embedding: 質問の埋め込み（意味キャッシュで計算済みの場合は類似検索に再利用）
+        
+        Returns:
+            tuple: (ユーザー感情, 専門知識コンテキスト, 類似検索結果)
+                   タイムアウトした段階は既定値（'neutral' / "" / []）になる。
+                   タイムアウト以外の例外は呼び出し側に送出する。
+        """
+        stages = {
+            'emotion': (self._analyze_user_emotion, 'neutral'),
+            'knowledge': (self.get_knowledge_context, ""),
+            'search': (lambda q: self._similarity_search(q, query_embedding), []),
+        }
+        
+        def timed(func):
+            def run():
+                stage_start = time.perf_counter()
+                result = func(question)
+                return result, time.perf_counter() - stage_start
+            return run
+        
+        wall_start = time.perf_counter()
+        results = {}
+        durations = {}
+        
+        # 見切った段階がワーカーを占有していて空きが足りなければ、プールに積まずにこのスレッドで順に実行する
+        # （空かないワーカーを待って後続のリクエストの段階まで一斉にタイムアウトするのを避ける）
+        with _abandoned_lock:
+            saturated = _abandoned_stages > RAG_RETRIEVAL_WORKERS - len(stages)
+        if saturated:
+            print(f"⚠️ 取得処理プールが混雑（実行中の見切った段階: {_abandoned_stages}）- 逐次実行します")
+            for name, (func, _) in stages.items():
+                results[name], durations[name] = timed(func)()
+            return self._finish_retrieval(wall_start, results, durations)
+        
+        futures = {name: _retrieval_executor.submit(timed(func)) for name, (func, _) in stages.items()}
+        for name, future in futures.items():
+            # 各段階の締め切りは一斉開始時刻から数える
+            remaining = RETRIEVAL_STAGE_TIMEOUTS[name] - (time.perf_counter() - wall_start)
+            try:
+                results[name], durations[name] = future.result(timeout=max(0.0, remaining))
+            except FutureTimeoutError:
+                print(f"⚠️ 取得処理タイムアウト: {name} ({RETRIEVAL_STAGE_TIMEOUTS[name]:.1f}s) - 既定値で続行")
+                results[name] = stages[name][1]
+                durations[name] = None
+                _abandon(future)
+        
+        return self._finish_retrieval(wall_start, results, durations)
+    
+    def _finish_retrieval(self, wall_start, results, durations):
+        """取得処理のスパン・所要時間を記録して結果を返す"""
+        wall_end = time.perf_counter()
+        wall_time = wall_end - wall_start
+        for name, d in durations.items():
+            if d is not None:
+                tracing.record_span(f"retrieval.{name}", wall_start, wall_start + d)
+        tracing.record_span('retrieval', wall_start, wall_end)
+        # 逐次実行していた場合の所要時間（各段階の合計）と並行実行の実測値を比較
+        sequential_time = sum(d for d in durations.values() if d is not None)
+        stage_summary = " ".join(
+            f"{name}={d * 1000:.0f}ms" if d is not None else f"{name}=timeout"
+            for name, d in durations.items()
+        )
+        print(f"[TIMING] retrieval {stage_summary} | sequential={sequential_time * 1000:.0f}ms -> concurrent={wall_time * 1000:.0f}ms")
+        
+        return results['emotion'], results['knowledge'], results['search']
+    
+    def _similarity_search(self, question, query_embedding=None):
+        """類似検索（埋め込み済みならembedding APIを呼ばない）"""
+        if query_embedding is not None:
+            return self.db.similarity_search_by_vector(list(map(float, query_embedding)), k=3)
+        # 質問の埋め込み（OpenAI embeddings）を含む
+        with circuit_breaker.guard('openai_embeddings'):
+            return self.db.similarity_search(question, k=3)
+    
+    def _prepare_chat_request(self, question, language='ja', conversation_history=None, query_embedding=None):
+        """応答生成の前処理（静的Q&A検索・DB確認・プロンプト構築）
+        
+        Returns:
+            tuple: (messages, 即答テキスト)
+                   messagesがNoneの場合は即答テキストをそのまま応答として使う
+        """
         
         # 🎯 最初にstatic_qa_dataから回答を検索
         try:
@@ -1002,13 +1032,13 @@ class RAGSystem:
             static_response = self.get_static_response_multilang(question, language)
             if static_response:
                 print(f"✅ Static QA hit: {question[:50]}...")
-                return static_response
+                return None, static_response
                 
             # 段階別Q&Aから回答を検索
             staged_response = self.get_staged_response_multilang(question, language)
             if staged_response:
                 print(f"✅ Staged QA hit: {question[:50]}...")
-                return staged_response
+                return None, staged_response
                 
         except Exception as e:
             print(f"❌ Static QA search error: {e}")
@@ -1022,18 +1052,18 @@ class RAGSystem:
                     print("❌ データベースの再初期化に失敗しました")
                     # 🎯 案4実装: より詳細で親切なエラーメッセージ
                     if language == 'en':
-                        return "[Emotion:neutral] I apologize, but I'm currently initializing my knowledge database. This usually takes just a moment. Please try your question again in about 10 seconds, and I'll be ready to help you!"
+                        return None, "[Emotion:neutral] I apologize, but I'm currently initializing my knowledge database. This usually takes just a moment. Please try your question again in about 10 seconds, and I'll be ready to help you!"
                     else:
-                        return "[Emotion:neutral] 申し訳ございません。現在、知識データベースを初期化しています。通常は数秒で完了しますので、10秒ほど待ってからもう一度お試しください。すぐにお答えできるようになります！"
+                        return None, "[Emotion:neutral] 申し訳ございません。現在、知識データベースを初期化しています。通常は数秒で完了しますので、10秒ほど待ってからもう一度お試しください。すぐにお答えできるようになります！"
             except Exception as e:
                 print(f"❌ データベース再初期化エラー: {e}")
                 import traceback
                 traceback.print_exc()
                 # 🎯 案4実装: より詳細で親切なエラーメッセージ
                 if language == 'en':
-                    return "[Emotion:neutral] I'm having a bit of trouble accessing my knowledge database at the moment. Please try refreshing the page or wait a moment and try again. I apologize for the inconvenience!"
+                    return None, "[Emotion:neutral] I'm having a bit of trouble accessing my knowledge database at the moment. Please try refreshing the page or wait a moment and try again. I apologize for the inconvenience!"
                 else:
-                    return "[Emotion:neutral] 申し訳ございません。知識データベースへのアクセスに少し問題が発生しています。ページを更新するか、しばらく待ってからもう一度お試しください。ご不便をおかけして申し訳ありません！"
+                    return None, "[Emotion:neutral] 申し訳ございません。知識データベースへのアクセスに少し問題が発生しています。ページを更新するか、しばらく待ってからもう一度お試しください。ご不便をおかけして申し訳ありません！"
         
         try:
             # データが読み込まれていない場合は再読み込み
@@ -1052,7 +1082,8 @@ class RAGSystem:
                 time_of_day = 'night'
             
             # 🎯 ユーザーの質問から感情を分析(Live2D対応)
-            user_emotion = self._analyze_user_emotion(question)
+            # 🆕 専門知識・類似検索と並行して取得
+            user_emotion, knowledge_context, search_results = self._run_retrieval_stages(question, query_embedding)
             
             # 🎯 深層心理状態を更新
             self._update_mental_state(user_emotion, question, time_of_day)
@@ -1071,15 +1102,10 @@ class RAGSystem:
             # 感情の連続性プロンプト(Live2D対応版)
             emotion_continuity_prompt = self._get_emotion_continuity_prompt(previous_emotion)
             
-            # 関連する専門知識を取得
-            knowledge_context = self.get_knowledge_context(question)
-            
             # 応答パターンを取得(精神状態対応版)
             response_patterns = self.get_response_pattern(emotion=next_emotion)
             
-            # さらに質問に直接関連する情報を検索
-            search_results = self.db.similarity_search(question, k=3)
-            # 検索結果を短縮(各結果の最初の150文字まで)
+            # 質問に直接関連する情報（search_results）を短縮(各結果の最初の150文字まで)
             search_context_parts = []
             for doc in search_results:
                 content = doc.page_content
@@ -1199,67 +1225,154 @@ Examples:
             
             messages.append({"role": "user", "content": user_message})
             
+            return messages, None
+            
+        except Exception as e:
+            print(f"応答生成エラー: {e}")
+            import traceback
+            traceback.print_exc()
+            return None, self._generation_error_message(language)
+    
+    def _generation_error_message(self, language='ja'):
+        """応答生成失敗時のメッセージ"""
+        # 🎯 修正:言語に応じたエラーメッセージ
+        if language == 'en':
+            return "Sorry, I'm having trouble generating a response right now."
+        else:
+            return "申し訳ありません。応答の生成中にエラーが発生しました。"
+    
+    def get_response(self, question, language='ja', conversation_history=None, query_embedding=None):
+        """質問に対する応答を生成(感情履歴・関係性対応版)"""
+        messages, early_answer = self._prepare_chat_request(question, language, conversation_history, query_embedding)
+        if messages is None:
+            return early_answer
+        
+        try:
             # 🎯 【修正④】OpenAI APIでmax_tokensを調整(文章の自然な完結を優先)
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4",
-                messages=messages,
-                max_tokens=150,  # 🔧 100 → 150に変更(日本語約250~300文字相当、英語約60語)
-                temperature=0.7
-            )
+            with tracing.span('llm'), circuit_breaker.guard('openai_chat'):
+                response = self.openai_client.chat.completions.create(
+                    model="gpt-4",
+                    messages=messages,
+                    max_tokens=150,  # 🔧 100 → 150に変更(日本語約250~300文字相当、英語約60語)
+                    temperature=0.7
+                )
             
             answer = response.choices[0].message.content
             
-            # ✅ 【追加】後処理:不完全な文章のチェックと修正
-            if language == 'ja':
-                # 日本語の場合、句点で終わっているか確認
-                if answer and not answer.rstrip().endswith(('。', '!', '?', '♪', '〜')):
-                    print(f"[WARNING] Answer may be incomplete: '{answer[-20:]}'")
-                    
-                    # 最後の句点の位置を探す
-                    last_period_positions = [
-                        answer.rfind('。'),
-                        answer.rfind('!'),
-                        answer.rfind('?')
-                    ]
-                    last_period = max(last_period_positions)
-                    
-                    # 文章の後半(50%以降)に句点があれば、そこまでで切る
-                    if last_period > len(answer) * 0.5:
-                        answer = answer[:last_period + 1]
-                        print(f"[INFO] Trimmed to last complete sentence: '{answer[-30:]}'")
-                    else:
-                        # 句点が前半にしかない場合は、そのまま返す(警告のみ)
-                        print(f"[WARNING] No suitable truncation point found, returning as is")
-
-            elif language == 'en':
-                # 英語の場合、ピリオドで終わっているか確認
-                if answer and not answer.rstrip().endswith(('.', '!', '?')):
-                    print(f"[WARNING] English answer may be incomplete: '{answer[-20:]}'")
-                    
-                    # 最後のピリオドの位置を探す
-                    last_period_positions = [
-                        answer.rfind('.'),
-                        answer.rfind('!'),
-                        answer.rfind('?')
-                    ]
-                    last_period = max(last_period_positions)
-                    
-                    # 文章の後半に句点があれば、そこまでで切る
-                    if last_period > len(answer) * 0.5:
-                        answer = answer[:last_period + 1]
-                        print(f"[INFO] Trimmed to last complete sentence: '{answer[-30:]}'")
-            
-            return answer
+            return self.trim_incomplete_answer(answer, language)
             
         except Exception as e:
             print(f"応答生成エラー: {e}")
             import traceback
             traceback.print_exc()
-            # 🎯 修正:言語に応じたエラーメッセージ
-            if language == 'en':
-                return "Sorry, I'm having trouble generating a response right now."
-            else:
-                return "申し訳ありません。応答の生成中にエラーが発生しました。"
+            return self._generation_error_message(language)
+    
+    def get_response_stream(self, question, language='ja', conversation_history=None, query_embedding=None):
+        """get_response()のストリーミング版（トークンが届くたびに差分テキストをyield）
+        
+        yieldされるのはモデル出力そのままの差分（末尾の[EMOTION:xxx]タグを含む）。
+        呼び出し側で連結してから trim_incomplete_answer() → extract_emotion_tag() の順に処理する。
+        差分を送った後で失敗した場合は例外を送出する（途中までの応答をキャッシュしないため）。
+        """
+        messages, early_answer = self._prepare_chat_request(question, language, conversation_history, query_embedding)
+        if messages is None:
+            yield early_answer
+            return
+        
+        received = False
+        llm_start = time.perf_counter()
+        try:
+            # 🆕 ブレーカーが記録するのはAPIの呼び出しと差分の受信のみ（呼び出し側の送信処理の時間・例外は含めない）
+            for delta in circuit_breaker.guard_stream('openai_chat', lambda: self._stream_deltas(messages)):
+                if not received:
+                    tracing.annotate(llm_first_token_ms=round((time.perf_counter() - llm_start) * 1000, 1))
+                received = True
+                yield delta
+        except circuit_breaker.CircuitOpenError as e:
+            # 🆕 回路が開いていればAPIを呼ばずに定型のエラーメッセージを返す
+            print(f"🚫 ストリーミング応答生成をスキップ: {e}")
+            yield self._generation_error_message(language)
+            return
+        except Exception as e:
+            print(f"ストリーミング応答生成エラー: {e}")
+            import traceback
+            traceback.print_exc()
+            # 途中まで届いている場合は、届いた分を使うかどうかを呼び出し側に任せる
+            if received:
+                raise
+            yield self._generation_error_message(language)
+        
+        tracing.record_span('llm', llm_start, time.perf_counter())
+    
+    def _stream_deltas(self, messages):
+        """Chat Completionsのストリーミング応答から差分テキストを返すジェネレーター"""
+        stream = self.openai_client.chat.completions.create(
+            model="gpt-4",
+            messages=messages,
+            max_tokens=150,
+            temperature=0.7,
+            stream=True
+        )
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+    
+    def trim_incomplete_answer(self, answer, language='ja'):
+        """途中で切れた応答を最後の完結した文までに整える（末尾の感情タグは保持）"""
+        if not answer:
+            return answer
+        
+        # 末尾の[EMOTION:xxx]タグは切り詰めの対象外にする
+        emotion_tag = ''
+        tag_match = re.search(r'\s*\[EMOTION:\w+\]\s*$', answer)
+        if tag_match:
+            emotion_tag = tag_match.group(0).strip()
+            answer = answer[:tag_match.start()]
+        
+        # ✅ 【追加】後処理:不完全な文章のチェックと修正
+        if language == 'ja':
+            # 日本語の場合、句点で終わっているか確認
+            if answer and not answer.rstrip().endswith(('。', '!', '?', '♪', '〜')):
+                print(f"[WARNING] Answer may be incomplete: '{answer[-20:]}'")
+                
+                # 最後の句点の位置を探す
+                last_period_positions = [
+                    answer.rfind('。'),
+                    answer.rfind('!'),
+                    answer.rfind('?')
+                ]
+                last_period = max(last_period_positions)
+                
+                # 文章の後半(50%以降)に句点があれば、そこまでで切る
+                if last_period > len(answer) * 0.5:
+                    answer = answer[:last_period + 1]
+                    print(f"[INFO] Trimmed to last complete sentence: '{answer[-30:]}'")
+                else:
+                    # 句点が前半にしかない場合は、そのまま返す(警告のみ)
+                    print(f"[WARNING] No suitable truncation point found, returning as is")
+
+        elif language == 'en':
+            # 英語の場合、ピリオドで終わっているか確認
+            if answer and not answer.rstrip().endswith(('.', '!', '?')):
+                print(f"[WARNING] English answer may be incomplete: '{answer[-20:]}'")
+                
+                # 最後のピリオドの位置を探す
+                last_period_positions = [
+                    answer.rfind('.'),
+                    answer.rfind('!'),
+                    answer.rfind('?')
+                ]
+                last_period = max(last_period_positions)
+                
+                # 文章の後半に句点があれば、そこまでで切る
+                if last_period > len(answer) * 0.5:
+                    answer = answer[:last_period + 1]
+                    print(f"[INFO] Trimmed to last complete sentence: '{answer[-30:]}'")
+        
+        return answer + emotion_tag
     
     def get_knowledge_context(self, query):
         """質問に関連する専門知識を取得"""
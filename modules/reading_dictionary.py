@@ -0,0 +1,108 @@
+# reading_dictionary.py - 用語の読み仮名辞書（京友禅用語 → ひらがな）
+# 辞書全体を最長一致の正規表現（トライ木）に1回だけコンパイルし、
+# テキストを左から1回走査するだけで全ての読みを適用する。
+# 辞書ファイルが更新されたら、次の呼び出し時に自動で読み込み直す（再起動不要）。
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from modules.text_matcher import trie_pattern
+
+
+class _Compiled:
+    """コンパイル済みの辞書（置き換えは参照の差し替えだけで行う）"""
+
+    def __init__(self, terms, version, signature):
+        self.terms = terms
+        self.version = version
+        self.signature = signature
+        pattern = trie_pattern(terms)
+        self.regex = re.compile(pattern) if pattern else None
+
+
+class ReadingDictionary:
+    """読み仮名辞書
+
+    apply() はファイルの更新日時を最大 check_interval 秒に1回だけ確認し、
+    変わっていれば読み込み直してからコンパイルし直す。読み込みに失敗した場合は前の辞書を使い続ける。
+    """
+
+    def __init__(self, path, check_interval=2.0):
+        self.path = str(path)
+        self.check_interval = check_interval
+        self._compiled = _Compiled({}, None, None)
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+        self._failed_signature = None
+
+    @property
+    def terms(self):
+        return self._compiled.terms
+
+    @property
+    def version(self):
+        """辞書の内容のハッシュ（音声キャッシュのキーに含めて、古い読みの音声を使わないようにする）"""
+        return self._compiled.version
+
+    def __len__(self):
+        return len(self._compiled.terms)
+
+    def _signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def load(self):
+        """辞書ファイルを読み込んでコンパイル（ファイルがない場合は空の辞書）
+
+        Returns:
+            bool: 読み込みに成功したか
+        """
+        with self._lock:
+            self._next_check = time.monotonic() + self.check_interval
+            signature = self._signature()
+            if signature is None:
+                self._compiled = _Compiled({}, None, None)
+                return False
+            with open(self.path, 'rb') as f:
+                raw = f.read()
+            terms = json.loads(raw.decode('utf-8'))
+            if not isinstance(terms, dict):
+                raise ValueError(f"読み仮名辞書はオブジェクト形式である必要があります: {self.path}")
+            version = hashlib.md5(raw).hexdigest()[:8]
+            self._compiled = _Compiled(terms, version, signature)
+            return True
+
+    def reload_if_changed(self):
+        """ファイルが更新されていれば読み込み直す（確認は check_interval 秒に1回）"""
+        now = time.monotonic()
+        if now < self._next_check:
+            return False
+        self._next_check = now + self.check_interval
+        signature = self._signature()
+        if signature in (self._compiled.signature, self._failed_signature):
+            return False
+        try:
+            loaded = self.load()
+        except Exception as e:
+            # 同じ内容のファイルで何度も失敗しないよう、次に更新されるまで再試行しない
+            self._failed_signature = signature
+            print(f"❌ 読み仮名辞書の再読み込みエラー（前の辞書を使用）: {e}")
+            return False
+        if loaded:
+            print(f"🔄 読み仮名辞書を再読み込み: {len(self)}語 (version {self.version})")
+        return loaded
+
+    def apply(self, text):
+        """テキストに読み仮名を適用（各位置で最も長い用語を優先、1回の走査）"""
+        self.reload_if_changed()
+        compiled = self._compiled
+        if compiled.regex is None or not text:
+            return text
+        terms = compiled.terms
+        return compiled.regex.sub(lambda match: terms[match.group()], text)
@@ -0,0 +1,137 @@
+# semantic_cache.py - 質問の埋め込みベクトルによる意味的な応答キャッシュ
+# 「京友禅の特徴は?」と「京友禅ってどんな特徴があるの」のような言い換えを同じ質問として扱い、
+# GPT-4の呼び出しを省略する
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class SemanticCache:
+    """質問の埋め込みの近傍検索で過去の応答を再利用するキャッシュ
+
+    言語ごとにベクトルを保持し、コサイン類似度がthreshold以上の最近傍を命中とする。
+    """
+
+    def __init__(self, embed_fn, threshold=0.93, max_entries=500, ttl_seconds=86400):
+        """
+        Args:
+            embed_fn: 文字列を受け取り埋め込みベクトル（list[float]）を返す関数
+            threshold: 命中とみなすコサイン類似度の下限
+            max_entries: 言語ごとの最大保持件数（超えたら古いものから削除）
+            ttl_seconds: エントリの有効期限（秒）
+        """
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._lock = threading.Lock()
+        self._entries = {}   # language -> list of dict(question, answer, emotion, timestamp)
+        self._matrices = {}  # language -> 正規化済みベクトルの行列（entriesと同じ順）
+
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        # 閾値調整用: 直近の最近傍類似度と命中したか
+        self.recent_scores = deque(maxlen=50)
+
+    def embed(self, question):
+        """質問を正規化済みベクトルに変換（失敗時はNone）"""
+        try:
+            vector = np.asarray(self.embed_fn(question), dtype=np.float32)
+        except Exception as e:
+            print(f"⚠️ 意味キャッシュ: 埋め込みエラー: {e}")
+            with self._lock:
+                self.errors += 1
+            return None
+
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return None
+        return vector / norm
+
+    def lookup(self, question, language='ja', vector=None):
+        """最も近い過去の質問を検索
+
+        Returns:
+            tuple: (命中したエントリ or None, 最近傍の類似度, 質問のベクトル)
+                   ベクトルは add() や類似検索に再利用できる（埋め込み失敗時はNone）
+        """
+        if vector is None:
+            vector = self.embed(question)
+        if vector is None:
+            return None, 0.0, None
+
+        now = time.time()
+        with self._lock:
+            entries = self._entries.get(language, [])
+            matrix = self._matrices.get(language)
+            best_entry = None
+            best_score = 0.0
+
+            if entries:
+                scores = matrix @ vector
+                # 有効期限切れは候補から除外
+                for index in np.argsort(-scores):
+                    if now - entries[index]['timestamp'] < self.ttl_seconds:
+                        best_entry = entries[index]
+                        best_score = float(scores[index])
+                        break
+
+            hit = best_entry is not None and best_score >= self.threshold
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.recent_scores.append((round(best_score, 4), hit))
+
+        if hit:
+            print(f"🧠 意味キャッシュヒット: {best_score:.3f} 「{best_entry['question'][:30]}」")
+            return best_entry, best_score, vector
+
+        print(f"🧠 意味キャッシュミス: 最近傍={best_score:.3f} (閾値 {self.threshold})")
+        return None, best_score, vector
+
+    def add(self, question, language, answer, emotion, vector=None):
+        """応答を登録（vectorを渡すと埋め込みを再計算しない）"""
+        if vector is None:
+            vector = self.embed(question)
+        if vector is None:
+            return
+
+        entry = {
+            'question': question,
+            'answer': answer,
+            'emotion': emotion,
+            'timestamp': time.time()
+        }
+
+        with self._lock:
+            entries = self._entries.setdefault(language, [])
+            matrix = self._matrices.get(language)
+            entries.append(entry)
+            matrix = vector[np.newaxis, :] if matrix is None else np.vstack([matrix, vector])
+
+            # 上限を超えたら古いものから削除
+            overflow = len(entries) - self.max_entries
+            if overflow > 0:
+                del entries[:overflow]
+                matrix = matrix[overflow:]
+
+            self._matrices[language] = matrix
+
+    def stats(self):
+        """統計情報（閾値調整用）"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': sum(len(entries) for entries in self._entries.values()),
+                'threshold': self.threshold,
+                'hits': self.hits,
+                'misses': self.misses,
+                'errors': self.errors,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'recent_scores': list(self.recent_scores)
+            }
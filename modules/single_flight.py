@@ -0,0 +1,91 @@
+# single_flight.py - 同一キーの処理の重複実行を抑止する（リクエストの合流）
+# ツアー客が同じサジェスチョンを同時にタップした場合など、同じキャッシュキーの
+# 生成処理が並行して走らないよう、最初のリクエストだけが処理し残りはその結果を待つ
+import threading
+
+
+class Flight:
+    """実行中の1件の処理（先行リクエストが結果を設定し、後続リクエストが待つ）"""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+    def wait(self, timeout=None):
+        """結果を待つ
+
+        Returns:
+            bool: 時間内に処理が終わったか
+        """
+        return self._event.wait(timeout)
+
+
+class SingleFlight:
+    """キーごとに実行中の処理を1件にまとめる"""
+
+    def __init__(self, name='single_flight'):
+        self.name = name
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.coalesced = 0  # 先行リクエストの結果を共有した回数
+
+    def begin(self, key):
+        """処理の開始を宣言する
+
+        Returns:
+            tuple: (Flight, 先行リクエストか)
+                   先行リクエストの場合は必ず finish() を呼ぶこと。
+                   後続リクエストの場合は flight.wait() で結果を待つ。
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.waiters += 1
+                self.coalesced += 1
+                return flight, False
+            flight = Flight()
+            self._flights[key] = flight
+            return flight, True
+
+    def finish(self, key, flight, result=None, error=None):
+        """先行リクエストの処理完了を通知し、待機中のリクエストを起こす"""
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.result = result
+        flight.error = error
+        flight._event.set()
+
+    def do(self, key, func, timeout=None):
+        """同じキーの処理が実行中ならその結果を待ち、なければfuncを実行する
+
+        後続リクエストがtimeout内に結果を得られなかった場合・先行リクエストが失敗した場合は
+        自分でfuncを実行する（begin()/finish() で合流する場合と同じ）。
+
+        Returns:
+            tuple: (結果, 他のリクエストの結果を共有したか)
+        """
+        flight, leader = self.begin(key)
+        if not leader:
+            if flight.wait(timeout):
+                if flight.error is None:
+                    return flight.result, True
+                print(f"⚠️ {self.name}: 先行処理が失敗 ({flight.error}) - 個別に実行します")
+            else:
+                print(f"⚠️ {self.name}: 先行処理の待機タイムアウト - 個別に実行します")
+            return func(), False
+
+        try:
+            result = func()
+        except Exception as e:
+            self.finish(key, flight, error=e)
+            raise
+        self.finish(key, flight, result=result)
+        return result, False
+
+    def in_flight(self):
+        """実行中のキー数"""
+        with self._lock:
+            return len(self._flights)
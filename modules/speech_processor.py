@@ -5,7 +5,8 @@ import tempfile
 import wave
 import io
 import subprocess
-from openai import OpenAI
+from modules import backends
+from modules import circuit_breaker
 
 # FFmpegのパスを確認
 def find_ffmpeg():
@@ -21,13 +22,18 @@ FFMPEG_AVAILABLE = find_ffmpeg()
 
 class SpeechProcessor:
     def __init__(self):
-        self.client = OpenAI()
+        self.client = backends.openai_client()
         self.supported_formats = ['webm', 'mp3', 'mp4', 'mpeg', 'mpga', 'm4a', 'wav', 'ogg']
         self.ffmpeg_available = FFMPEG_AVAILABLE
         print(f"🎤 SpeechProcessor初期化完了 (FFmpeg利用可能: {self.ffmpeg_available})")
     
     def transcribe_audio(self, audio_base64, language='ja'):
-        """Base64エンコードされた音声データをテキストに変換"""
+        """音声データをテキストに変換
+
+        Args:
+            audio_base64: Base64文字列（データURL形式も可）、
+                または🆕 バイト列（Socket.IOのバイナリ添付で受け取った場合。デコード不要）
+        """
         # FFmpegが利用できない場合
         if not self.ffmpeg_available:
             print("⚠️ FFmpegが利用できないため、音声処理ができません。")
@@ -41,8 +47,14 @@ class SpeechProcessor:
                 print("❌ 音声データが空です")
                 return None
             
+            # 🆕 バイナリ添付で受け取った場合はそのまま使う
+            if isinstance(audio_base64, (bytes, bytearray, memoryview)):
+                audio_data = bytes(audio_base64)
+                print(f"✅ バイナリ音声データ受信: [audio_data {len(audio_data)} bytes]")
+                audio_base64 = None
+            
             # データURLスキームの処理
-            if audio_base64.startswith('data:'):
+            elif audio_base64.startswith('data:'):
                 # data:audio/webm;base64,xxxxx の形式から実際のデータを抽出
                 try:
                     header, data = audio_base64.split(',', 1)
@@ -53,12 +65,13 @@ class SpeechProcessor:
                     return None
             
             # Base64デコード
-            try:
-                audio_data = base64.b64decode(audio_base64)
-                print(f"✅ Base64デコード成功: [audio_data {len(audio_data)} bytes]")
-            except Exception as e:
-                print(f"❌ Base64デコードエラー: {e}")
-                return None
+            if audio_base64 is not None:
+                try:
+                    audio_data = base64.b64decode(audio_base64)
+                    print(f"✅ Base64デコード成功: [audio_data {len(audio_data)} bytes]")
+                except Exception as e:
+                    print(f"❌ Base64デコードエラー: {e}")
+                    return None
             
             # 一時ファイルを作成して音声データを保存
             with tempfile.NamedTemporaryFile(delete=False, suffix='.webm') as temp_webm:
@@ -87,13 +100,14 @@ class SpeechProcessor:
                 with open(temp_wav_path, 'rb') as audio_file:
                     print("🔄 Whisper APIに送信中...")
                     
-                    transcript = self.client.audio.transcriptions.create(
-                        model="whisper-1",
-                        file=audio_file,
-                        language=language,
-                        response_format="text",
-                        prompt="京友禅、のりおき、職人、染色、着物"  # ドメイン特有の単語をヒントとして提供
-                    )
+                    with circuit_breaker.guard('whisper'):
+                        transcript = self.client.audio.transcriptions.create(
+                            model="whisper-1",
+                            file=audio_file,
+                            language=language,
+                            response_format="text",
+                            prompt="京友禅、のりおき、職人、染色、着物"  # ドメイン特有の単語をヒントとして提供
+                        )
                     
                     # Whisper APIはテキストを直接返す
                     text = transcript.strip() if isinstance(transcript, str) else str(transcript).strip()
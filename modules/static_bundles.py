@@ -0,0 +1,161 @@
+# static_bundles.py - 静的Q&Aの事前コンパイル済みバンドル
+# 各Q&A（= サジェスチョン）について、テキスト・感情・音声エンジン別の音声・メディアを
+# ビルド時にまとめて作成しておき、サジェスチョンIDで外部APIを呼ばずに即座に返す
+import base64
+import json
+import os
+
+from modules import static_qa_data
+from modules.static_qa_data import make_suggestion_id, parse_response
+
+BUNDLE_DIR = os.getenv('STATIC_BUNDLE_DIR', 'data/static_bundles')
+MANIFEST_FILE = 'manifest.json'
+
+# 言語ごとに使われうる音声エンジン（application.pyのvoice_engineと同じ名前）
+ENGINES_BY_LANGUAGE = {
+    'ja': ['elevenlabs', 'azure_speech'],
+    'en': ['openai_tts'],
+}
+
+
+def compile_bundles():
+    """qa_responsesから音声なしのバンドルを作成
+
+    Returns:
+        dict: サジェスチョンID -> バンドル
+    """
+    get_qa_media = getattr(static_qa_data, 'get_qa_media', None)
+    bundles = {}
+
+    for language, phases in static_qa_data.qa_responses.items():
+        phase_suggestions = static_qa_data.suggestions.get(language, {})
+        for phase, qa_dict in phases.items():
+            for qa_key, raw_text in qa_dict.items():
+                parsed = parse_response(raw_text)
+                bundle_id = make_suggestion_id(language, qa_key)
+
+                # 画面に表示されるサジェスチョン文（「？」付き）
+                suggestion = next(
+                    (s for s in phase_suggestions.get(phase, [])
+                     if static_qa_data.get_qa_key_for_suggestion(s) == qa_key),
+                    qa_key
+                )
+
+                media = None
+                if get_qa_media:
+                    try:
+                        media = get_qa_media(suggestion)
+                    except Exception as e:
+                        print(f"⚠️ バンドルのメディア取得エラー: {e}")
+
+                bundles[bundle_id] = {
+                    'id': bundle_id,
+                    'language': language,
+                    'phase': phase,
+                    'question': qa_key,
+                    'suggestion': suggestion,
+                    # 静的Q&A（get_response_for_user）と同じテキスト・感情（整形は行わない）
+                    'text': parsed['text'],
+                    'emotion': parsed['emotion'],
+                    'media': media,
+                    'audio': {}  # エンジン名 -> 音声ファイル（BUNDLE_DIRからの相対パス）
+                }
+
+    return bundles
+
+
+def build_bundles(synthesizers, output_dir=BUNDLE_DIR):
+    """バンドルの音声を合成し、マニフェストと音声ファイルを書き出す（ビルド時に実行）
+
+    Args:
+        synthesizers: エンジン名 -> (text, language, emotion) を受け取り (音声バイト列, 拡張子) を返す関数
+        output_dir: 出力先ディレクトリ
+
+    Returns:
+        dict: 書き出したバンドル
+    """
+    bundles = compile_bundles()
+
+    for bundle in bundles.values():
+        for engine in ENGINES_BY_LANGUAGE.get(bundle['language'], []):
+            synthesize = synthesizers.get(engine)
+            if not synthesize:
+                continue
+            try:
+                audio_bytes, extension = synthesize(bundle['text'], bundle['language'], bundle['emotion'])
+            except Exception as e:
+                print(f"❌ バンドル音声合成エラー: {bundle['id']} ({engine}): {e}")
+                continue
+
+            relative_path = os.path.join(engine, f"{bundle['id']}.{extension}")
+            path = os.path.join(output_dir, relative_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(audio_bytes)
+            bundle['audio'][engine] = relative_path
+            print(f"✅ バンドル音声: {bundle['id']} ({engine}) {len(audio_bytes)} バイト")
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(bundles, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+    print(f"📦 静的Q&Aバンドル作成完了: {len(bundles)}件 → {manifest_path}")
+    return bundles
+
+
+class StaticBundleStore:
+    """起動時にバンドルを読み込み、IDとサジェスチョン文でO(1)検索する"""
+
+    def __init__(self):
+        self.bundles = {}
+        self._by_text = {}  # (language, 正規化した質問文) -> バンドル
+        self._audio = {}    # (バンドルID, エンジン名) -> Base64音声
+
+    def load(self, bundle_dir=BUNDLE_DIR):
+        """マニフェストと音声を読み込む（未ビルドの場合は音声なしのバンドルを使う）"""
+        manifest_path = os.path.join(bundle_dir, MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                bundles = json.load(f)
+        else:
+            print(f"⚠️ 静的Q&Aバンドル未作成: {manifest_path}（音声は都度生成）")
+            bundles = compile_bundles()
+
+        audio = {}
+        for bundle_id, bundle in bundles.items():
+            for engine, relative_path in bundle.get('audio', {}).items():
+                try:
+                    with open(os.path.join(bundle_dir, relative_path), 'rb') as f:
+                        audio[(bundle_id, engine)] = base64.b64encode(f.read()).decode('utf-8')
+                except OSError as e:
+                    print(f"⚠️ バンドル音声の読み込みエラー: {relative_path}: {e}")
+
+        by_text = {}
+        for bundle in bundles.values():
+            for text in (bundle['suggestion'], bundle['question']):
+                by_text[(bundle['language'], self._normalize(text))] = bundle
+
+        self.bundles, self._by_text, self._audio = bundles, by_text, audio
+        print(f"📦 静的Q&Aバンドル読み込み: {len(bundles)}件 (音声 {len(audio)}件)")
+
+    @staticmethod
+    def _normalize(text):
+        return static_qa_data.get_qa_key_for_suggestion(text.strip()).lower()
+
+    def get(self, bundle_id, language=None):
+        """IDでバンドルを取得（言語が一致しない場合はNone）"""
+        bundle = self.bundles.get(bundle_id)
+        if bundle and language and bundle['language'] != language:
+            return None
+        return bundle
+
+    def find(self, language, text):
+        """サジェスチョン文（完全一致）でバンドルを取得"""
+        return self._by_text.get((language, self._normalize(text)))
+
+    def audio(self, bundle, engine):
+        """バンドルの音声（Base64）を取得（未作成の場合はNone）"""
+        return self._audio.get((bundle['id'], engine))
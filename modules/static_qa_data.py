@@ -351,3 +351,51 @@ def parse_response(response_text):
         'text': clean_text,
         'emotion': emotion
     }
+
+def get_qa_key_for_suggestion(suggestion):
+    """
+    サジェスチョン文からqa_responsesのキーを取得（末尾の「？」「?」を除く）
+    
+    Args:
+        suggestion: サジェスチョン文
+    
+    Returns:
+        str: Q&Aのキー
+    """
+    return suggestion.rstrip('？?').strip()
+
+def make_suggestion_id(language, qa_key):
+    """
+    サジェスチョンの安定ID（言語とQ&Aキーから決まるため、並び順を変えても変わらない）
+    
+    Args:
+        language: 言語 ('ja' or 'en')
+        qa_key: qa_responsesのキー
+    
+    Returns:
+        str: サジェスチョンID（例: 'ja-3f2a9c1b0d'）
+    """
+    import hashlib
+    digest = hashlib.sha1(f"{language}:{qa_key}".encode('utf-8')).hexdigest()[:10]
+    return f"{language}-{digest}"
+
+def get_suggestion_ids(suggestion_list, language='ja'):
+    """
+    サジェスチョンのリストに対応するIDのリストを取得
+    
+    Args:
+        suggestion_list: サジェスチョン文のリスト
+        language: 言語 ('ja' or 'en')
+    
+    Returns:
+        list: サジェスチョンIDのリスト（静的Q&Aに対応しないものはNone）
+    """
+    lang_qa = qa_responses.get(language, {})
+    ids = []
+    for suggestion in suggestion_list:
+        qa_key = get_qa_key_for_suggestion(suggestion)
+        if any(qa_key in phase_qa for phase_qa in lang_qa.values()):
+            ids.append(make_suggestion_id(language, qa_key))
+        else:
+            ids.append(None)
+    return ids
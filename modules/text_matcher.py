@@ -0,0 +1,80 @@
+# text_matcher.py - 多数の語をまとめて1回で照合するための正規表現（トライ木から生成）
+# 語のリストを共通接頭辞でまとめた1つの正規表現にコンパイルし、
+# テキストを左から1回走査するだけで、各位置で最も長く一致する語を見つける
+import re
+
+
+def trie_pattern(words):
+    """語の集合から、最長一致を優先する正規表現パターン（文字列）を生成
+
+    共通の接頭辞をまとめたトライ木を正規表現に変換する。
+    語の終端でもある節点は (?:...)? とし、貪欲に長い語を先に試す。
+    先頭の分岐は1文字ずつのリテラルにしておく（reが先頭文字の集合で走査位置を読み飛ばせるように）。
+    """
+    trie = {}
+    for word in words:
+        if not word:
+            continue
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node, merge_chars=True):
+        terminal = '' in node
+        branches = []
+        single_chars = []
+        for char in sorted(k for k in node if k):
+            child = node[char]
+            if merge_chars and len(child) == 1 and '' in child:
+                single_chars.append(re.escape(char))
+            else:
+                branches.append(re.escape(char) + build(child))
+        if single_chars:
+            branches.append(single_chars[0] if len(single_chars) == 1 else '[' + ''.join(single_chars) + ']')
+
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if terminal:
+            return '(?:' + body + ')?'
+        return body
+
+    return build(trie, merge_chars=False)
+
+
+class KeywordMatcher:
+    """語の集合をコンパイルし、テキストに含まれる語を1回の走査で列挙する
+
+    語が始まる各位置で最長一致を拾い、その語に含まれる他の語（部分文字列）は
+    事前計算した表で補う。どの位置に現れた語も、その位置の最長一致の接頭辞になるため、
+    「含まれる語の集合」は `word in text` を全語について調べた結果と一致する。
+    """
+
+    def __init__(self, words):
+        self.words = frozenset(w for w in words if w)
+        pattern = trie_pattern(self.words)
+        self._regex = re.compile(pattern) if pattern else None
+        # 各語に含まれる語（自身を含む）
+        self._contained = {
+            word: frozenset(other for other in self.words if other in word)
+            for word in self.words
+        }
+
+    def find(self, text):
+        """テキストに含まれる語の集合"""
+        if self._regex is None or not text:
+            return frozenset()
+        # 一致した語の次の文字から探し直し、重なって始まる語も漏らさない
+        search = self._regex.search
+        longest = set()
+        match = search(text)
+        while match is not None:
+            longest.add(match.group())
+            match = search(text, match.start() + 1)
+        if not longest:
+            return frozenset()
+        contained = self._contained
+        if len(longest) == 1:
+            return contained[longest.pop()]
+        return frozenset().union(*(contained[word] for word in longest))
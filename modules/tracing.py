@@ -0,0 +1,179 @@
+# tracing.py - 会話ターンごとの処理段階の計測（軽量トレーシング）
+# Whisper・静的Q&A・埋め込み検索・GPT-4・英語casualの書き換え・TTSのどこで時間がかかったかを
+# スパンとして記録し、1ターン1行のJSONLとしてローテーションするログに書き出す
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+_local = threading.local()
+_span_listeners = []
+
+_trace_logger = None
+_trace_logger_lock = threading.Lock()
+
+
+def configure_trace_log(path, max_bytes=10 * 1024 * 1024, backup_count=5):
+    """ターンごとのトレースを書き出すローテーションログを設定"""
+    global _trace_logger
+    with _trace_logger_lock:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        logger = logging.getLogger('turn_trace')
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            handler.close()
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        _trace_logger = logger
+
+
+def add_span_listener(listener):
+    """スパン終了時に listener(name, duration_seconds) を呼ぶ（メトリクス集計用）"""
+    _span_listeners.append(listener)
+
+
+def _notify(name, duration):
+    for listener in _span_listeners:
+        try:
+            listener(name, duration)
+        except Exception as e:
+            print(f"⚠️ スパン通知エラー: {e}")
+
+
+class Trace:
+    """1回の会話ターンの計測
+
+    バックグラウンドで続く処理（後送り音声・文単位音声）がある場合は hold() で参照を増やし、
+    全ての参照が release() された時点でログに1行書き出す。
+    """
+
+    def __init__(self, trace_id=None, session_id=None, **attrs):
+        self.trace_id = trace_id or str(uuid.uuid4())
+        self.session_id = session_id
+        self.started = time.perf_counter()
+        self.timestamp = datetime.now().isoformat()
+        self.attrs = dict(attrs)
+        self.spans = []
+        self._lock = threading.Lock()
+        self._refs = 1
+        self._finished = False
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """処理段階を計測するコンテキストマネージャ"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, start, time.perf_counter(), **attrs)
+
+    def add_span(self, name, start, end, **attrs):
+        """計測済みの区間を追加（perf_counterの値で指定）"""
+        record = {
+            'name': name,
+            'start_ms': round((start - self.started) * 1000, 1),
+            'duration_ms': round((end - start) * 1000, 1)
+        }
+        record.update(attrs)
+        with self._lock:
+            self.spans.append(record)
+        _notify(name, end - start)
+
+    def annotate(self, **attrs):
+        """キャッシュ命中・音声エンジンなどの属性を記録"""
+        with self._lock:
+            self.attrs.update(attrs)
+
+    def timings(self):
+        """応答ペイロード（デバッグ用）に添付するスパン一覧"""
+        with self._lock:
+            return {
+                'traceId': self.trace_id,
+                'elapsedMs': round((time.perf_counter() - self.started) * 1000, 1),
+                'spans': list(self.spans)
+            }
+
+    @contextmanager
+    def activated(self):
+        """このスレッドの現在のトレースとして設定（span()/annotate()の関数版が使う）"""
+        previous = getattr(_local, 'trace', None)
+        _local.trace = self
+        try:
+            yield self
+        finally:
+            _local.trace = previous
+
+    def hold(self):
+        """バックグラウンド処理の分だけ書き出しを遅らせる"""
+        with self._lock:
+            self._refs += 1
+        return self
+
+    def release(self):
+        """参照を減らし、0になったらログに書き出す"""
+        with self._lock:
+            self._refs -= 1
+            if self._refs > 0 or self._finished:
+                return
+            self._finished = True
+            record = {
+                'ts': self.timestamp,
+                'trace_id': self.trace_id,
+                'session_id': self.session_id,
+                'total_ms': round((time.perf_counter() - self.started) * 1000, 1),
+                **self.attrs,
+                'spans': list(self.spans)
+            }
+        _notify('turn', record['total_ms'] / 1000)
+        if _trace_logger:
+            try:
+                _trace_logger.info(json.dumps(record, ensure_ascii=False, default=str))
+            except Exception as e:
+                print(f"⚠️ トレースログ書き込みエラー: {e}")
+
+
+def current():
+    """このスレッドの現在のトレース（なければNone）"""
+    return getattr(_local, 'trace', None)
+
+
+@contextmanager
+def span(name, **attrs):
+    """現在のトレースにスパンを追加（トレース外ではメトリクス通知のみ）"""
+    trace = current()
+    if trace is not None:
+        with trace.span(name, **attrs):
+            yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _notify(name, time.perf_counter() - start)
+
+
+def record_span(name, start, end, **attrs):
+    """計測済みの区間を現在のトレースに追加（perf_counterの値で指定）"""
+    trace = current()
+    if trace is not None:
+        trace.add_span(name, start, end, **attrs)
+    else:
+        _notify(name, end - start)
+
+
+def annotate(**attrs):
+    """現在のトレースに属性を記録（トレース外では何もしない）"""
+    trace = current()
+    if trace is not None:
+        trace.annotate(**attrs)
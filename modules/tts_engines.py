@@ -0,0 +1,592 @@
+# tts_engines.py - 音声合成エンジン（ElevenLabs・Azure Speech・OpenAI TTS）の共通インターフェースとレジストリ
+# エンジンは TtsEngine を継承して voice_id() と synthesize() を実装し、レジストリに登録する。
+# テキストの正規化（読み仮名・記号）、音声キャッシュのキー、計測はレジストリが全エンジン共通で行うため、
+# エンジンの追加・入れ替えでSocket.IOハンドラーや音声キャッシュの処理を変更する必要はない。
+import os
+import re
+import threading
+import time
+from xml.sax.saxutils import escape
+
+import azure.cognitiveservices.speech as speechsdk
+
+from modules import backends
+from modules import circuit_breaker
+from modules import tracing
+from modules.audio_store import AudioStore
+from modules.circuit_breaker import CircuitOpenError
+from modules.http_pool import pool as http_pool
+
+# True: 音声エンジンに送るテキストをログに出す（発音の確認用。来場者の発話内容が残るため既定は無効）
+LOG_TTS_TEXT = os.getenv('LOG_TTS_TEXT', 'false').lower() == 'true'
+
+
+def normalize_japanese_text(text, readings=None):
+    """日本語テキストを音声合成向けに正規化
+
+    1. 読み仮名辞書を適用（漢字→ひらがな。京友禅用語など）
+    2. 記号の正規化（最小限）
+
+    Args:
+        text: 元のテキスト
+        readings: 読み仮名を適用する関数（ReadingDictionary.apply など。Noneなら適用しない）
+    """
+    normalized_text = readings(text) if readings else text
+    normalized_text = normalized_text.replace('...', '。')
+    normalized_text = normalized_text.replace('…', '。')
+    # 連続する句読点を整理
+    return re.sub(r'[、。]{2,}', '。', normalized_text)
+
+
+class TtsEngine:
+    """音声合成エンジンの共通インターフェース
+
+    synthesize() / stream() には正規化済みのテキストが渡される。
+    エンジンの中では外部APIの呼び出しを circuit_breaker.guard で保護し、失敗時は例外を送出する。
+    """
+
+    name = None
+    label = None
+    # stream() に対応しているか（断片はつなげると synthesize() と同じmp3になること）
+    streaming = False
+
+    def test_connection(self):
+        """初期化時の接続テスト（Falseならレジストリに登録しない）"""
+        return True
+
+    def voice_id(self, language, output_format=None):
+        """声の識別子（音声キャッシュのキー用。声・モデル・出力形式が変われば変える）"""
+        raise NotImplementedError
+
+    def synthesize(self, text, language='ja', emotion='neutral', output_format=None):
+        """音声全体のバイト列"""
+        raise NotImplementedError
+
+    def stream(self, text, language='ja', emotion='neutral', chunk_size=4096):
+        """音声を届いた分からバイト列で返すジェネレーター"""
+        raise NotImplementedError(f"{self.name} はストリーミング合成に対応していません")
+
+    def warm_up(self, output_format=None):
+        """接続の事前準備（必要なエンジンのみ。バックグラウンドで実行すること）"""
+
+
+# ====== Azure Speech Service ======
+class AzureSpeechEngine(TtsEngine):
+    """Azure Speech Service音声合成（SDKのプールがあればSDK、なければ・失敗したらREST API）"""
+
+    name = 'azure_speech'
+    label = 'Azure Speech'
+
+    # 出力形式（短い名前 -> X-Microsoft-OutputFormat）
+    # 10秒の音声で wav 約480KB / mp3 約60KB / opus 約30KB
+    OUTPUT_FORMATS = {
+        'opus': 'webm-24khz-16bit-24kbps-mono-opus',
+        'ogg': 'ogg-24khz-16bit-mono-opus',
+        'mp3': 'audio-24khz-48kbitrate-mono-mp3',
+        'wav': 'riff-24khz-16bit-mono-pcm'
+    }
+
+    def __init__(self, speech_key=None, speech_region=None, voice_name=None, output_format='mp3',
+                 synthesizer_pool=None):
+        """
+        Args:
+            voice_name: 日本語音声（ja-JP-NanamiNeural: 優しい声 / AoiNeural: 明るい声 /
+                MayuNeural: 落ち着いた声 / ShioriNeural: 若い声）
+            output_format: OUTPUT_FORMATS のキー（synthesize() で省略した場合の形式）
+            synthesizer_pool: SDKのSpeechSynthesizerのプール（AzureSynthesizerPool。Noneなら常にREST API）
+        """
+        self.speech_key = speech_key
+        self.speech_region = speech_region
+        self.voice_name = voice_name or 'ja-JP-NanamiNeural'
+        self.output_format = output_format if output_format in self.OUTPUT_FORMATS else 'mp3'
+        self.synthesizer_pool = synthesizer_pool
+        # 🆕 SDKのプールがあれば合成中の音声を読み出した分から返せる（stream()）
+        self.streaming = synthesizer_pool is not None
+
+    def test_connection(self):
+        if not self.speech_key or not self.speech_region:
+            return False
+        try:
+            speechsdk.SpeechConfig(subscription=self.speech_key, region=self.speech_region)
+            return True
+        except Exception as e:
+            print(f"Azure Speech接続エラー: {e}")
+            return False
+
+    def voice_id(self, language, output_format=None):
+        # 形式ごとに別の音声になるため出力形式も含める
+        return f"{self.voice_name}:{self.resolve_format(output_format)}"
+
+    def resolve_format(self, output_format=None):
+        return output_format if output_format in self.OUTPUT_FORMATS else self.output_format
+
+    def build_ssml(self, text, voice_name=None, emotion='neutral', speed=1.0):
+        """SSML（音声合成マークアップ）を作成（REST API・SDKで共通）"""
+        voice = voice_name or self.voice_name
+
+        # 感情スタイルのマッピング
+        emotion_styles = {
+            'happy': 'cheerful',
+            'sad': 'sad',
+            'angry': 'angry',
+            'surprised': 'excited',
+            'neutral': 'general',
+            'start': 'cheerful',
+            'dangerquestion': 'serious',
+            'neutraltalking': 'general',
+            'responseready': 'general'
+        }
+        style = emotion_styles.get(emotion, 'general')
+
+        # スピード調整
+        speech_rate = f"{int((speed - 1) * 100):+d}%"
+
+        # 抑揚の強さ（1.0（デフォルト）～ 2.0（最大））
+        if emotion in ['happy', 'surprised', 'start']:
+            style_degree = "2"  # 明るい感情は抑揚を最大に
+        elif emotion in ['sad', 'angry']:
+            style_degree = "1.8"  # 悲しみや怒りも抑揚を強めに
+        else:
+            style_degree = "1.5"  # 通常は1.5倍
+
+        # テキストに & や < が含まれてもSSMLが壊れないようにエスケープ
+        return f"""
+        <speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis"
+               xmlns:mstts="https://www.w3.org/2001/mstts" xml:lang="ja-JP">
+            <voice name="{voice}">
+                <mstts:express-as style="{style}" styledegree="{style_degree}">
+                    <prosody rate="{speech_rate}" pitch="+5%">
+                        {escape(text)}
+                    </prosody>
+                </mstts:express-as>
+            </voice>
+        </speak>
+        """
+
+    def warm_up(self, output_format=None):
+        """SDKのSpeechSynthesizerの接続を事前に開く（SDKを使わない場合は何もしない）"""
+        if self.synthesizer_pool is not None:
+            self.synthesizer_pool.warm_up(self.resolve_format(output_format))
+
+    def _rest_headers(self, output_format):
+        return {
+            'Ocp-Apim-Subscription-Key': self.speech_key,
+            'Content-Type': 'application/ssml+xml',
+            'X-Microsoft-OutputFormat': self.OUTPUT_FORMATS[output_format],
+            'User-Agent': 'REI-Avatar-System'
+        }
+
+    def stream(self, text, language='ja', emotion='neutral', chunk_size=4096, speed=1.0):
+        """🆕 mp3の音声を読み出した分から返す（SDKのプールを使う。SDKが最初の断片の前に失敗したらREST API）"""
+        if not self.speech_key or not self.speech_region:
+            raise ValueError("Azure Speech APIの認証情報が設定されていません")
+
+        # synthesize() と同じSSML（感情スタイル・抑揚の強さ）
+        ssml = self.build_ssml(text, emotion=emotion, speed=speed)
+        started = time.perf_counter()
+        sent = 0
+
+        if self.synthesizer_pool is not None:
+            try:
+                for chunk in circuit_breaker.guard_stream(
+                        'azure_speech_sdk', lambda: self.synthesizer_pool.stream(ssml, 'mp3', chunk_size)):
+                    if not sent:
+                        tracing.record_span('tts_first_byte', started, time.perf_counter(), engine='azure_speech')
+                    sent += 1
+                    yield chunk
+                return
+            except Exception as e:
+                if sent:
+                    # 送信済みの断片があるため、途中からREST APIでやり直すことはできない
+                    raise
+                print(f"⚠️ Azureストリーミング音声生成エラー (SDK)、REST APIで再試行: {e}")
+
+        for chunk in circuit_breaker.guard_stream(
+                'azure_speech_stream', lambda: self._rest_chunks(ssml, chunk_size), circuit='azure_speech'):
+            if not sent:
+                tracing.record_span('tts_first_byte', started, time.perf_counter(), engine='azure_speech')
+            sent += 1
+            yield chunk
+
+    def _rest_chunks(self, ssml, chunk_size):
+        """REST APIの応答（mp3）を断片ごとに返すジェネレーター"""
+        response = http_pool.post(backends.azure_tts_url(self.speech_region), headers=self._rest_headers('mp3'),
+                                  data=ssml.encode('utf-8'), stream=True, read_timeout=30)
+        try:
+            if response.status_code != 200:
+                raise Exception(f"Azure Speech REST API Error: {response.status_code} - {response.text}")
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if chunk:
+                    yield chunk
+        finally:
+            # 途中で読むのをやめた場合も接続をプールに戻す（読み残しがあれば閉じる）
+            response.close()
+
+    def synthesize(self, text, language='ja', emotion='neutral', output_format=None, speed=1.0):
+        if not self.speech_key or not self.speech_region:
+            raise ValueError("Azure Speech APIの認証情報が設定されていません")
+
+        ssml = self.build_ssml(text, emotion=emotion, speed=speed)
+        output_format = self.resolve_format(output_format)
+
+        # 接続済みのSpeechSynthesizerで合成（音声は全体を受け取ってから返す。逐次返すのは stream()）
+        if self.synthesizer_pool is not None:
+            try:
+                with circuit_breaker.guard('azure_speech_sdk'):
+                    audio_data = self.synthesizer_pool.synthesize(ssml, output_format)
+                print(f"✅ Azure音声生成成功 (SDK): {len(audio_data)} bytes")
+                return audio_data
+            except Exception as e:
+                print(f"⚠️ Azure音声生成エラー (SDK)、REST APIで再試行: {e}")
+
+        # ⚠️ SDKはAWS環境で「Error 2176」が発生するため、SDKは ENABLE_AZURE_SDK_SYNTHESIS で有効にした場合のみ
+        try:
+            headers = self._rest_headers(output_format)
+
+            # サーキットブレーカー（エラー応答も失敗として数える）
+            with circuit_breaker.guard('azure_speech'):
+                # 共有の接続プール（keep-aliveで接続を使い回す）
+                response = http_pool.post(backends.azure_tts_url(self.speech_region), headers=headers,
+                                          data=ssml.encode('utf-8'), read_timeout=30)
+                if response.status_code != 200:
+                    raise Exception(f"Azure Speech REST API Error: {response.status_code} - {response.text}")
+
+            print(f"✅ Azure音声生成成功 (REST API): {len(response.content)} bytes")
+            return response.content
+
+        except CircuitOpenError as e:
+            print(f"🚫 Azure音声生成をスキップ: {e}")
+            raise
+        except Exception as e:
+            print(f"❌ Azure音声生成エラー (REST API): {e}")
+            import traceback
+            traceback.print_exc()
+            raise
+
+
+# ====== ElevenLabs ======
+class ElevenLabsEngine(TtsEngine):
+    """ElevenLabs音声合成（mp3。/stream エンドポイントでストリーミング合成にも対応）"""
+
+    name = 'elevenlabs'
+    label = 'ElevenLabs'
+    streaming = True
+
+    def __init__(self, api_key=None, voice_id=None, model_id=None, pronunciation_dictionary_id=None):
+        self.api_key = api_key
+        self.voice = voice_id or "21m00Tcm4TlvDq8ikWAM"  # デフォルト音声
+        self.model_id = model_id or "eleven_multilingual_v2"  # デフォルトモデル
+        self.pronunciation_dictionary_id = pronunciation_dictionary_id  # 発音辞書ID（オプション）
+        self.base_url = backends.elevenlabs_base_url()
+
+    def test_connection(self):
+        if not self.api_key:
+            return False
+        try:
+            response = http_pool.get(f"{self.base_url}/voices", headers={'xi-api-key': self.api_key},
+                                     read_timeout=10)
+            return response.status_code == 200
+        except Exception as e:
+            print(f"ElevenLabs接続テストエラー: {e}")
+            return False
+
+    def voice_id(self, language, output_format=None):
+        return f"{self.voice}:{self.model_id}"
+
+    def _request(self, text):
+        """text-to-speech APIのヘッダーと本文（通常・ストリーミング共通）"""
+        if not self.api_key:
+            raise ValueError("ElevenLabs APIキーが設定されていません")
+
+        headers = {
+            'xi-api-key': self.api_key,
+            'Content-Type': 'application/json'
+        }
+
+        # 🔧 ElevenLabs公式推奨設定（UIのデフォルト値に完全一致させる）
+        # 参考: https://elevenlabs.io/docs/product-guides/playground/text-to-speech
+        data = {
+            'text': text,
+            'model_id': self.model_id,
+            'voice_settings': {
+                'stability': 0.5,
+                'similarity_boost': 0.75,
+                'style': 0.0,
+                'use_speaker_boost': True
+            }
+        }
+
+        if LOG_TTS_TEXT:
+            print("🎤 ElevenLabsに送信するテキスト:")
+            print(f"   {text[:100]}{'...' if len(text) > 100 else ''}")
+
+        # Pronunciation Dictionary（発音辞書）を追加（設定されている場合）
+        if self.pronunciation_dictionary_id:
+            data['pronunciation_dictionary_locators'] = [{
+                'pronunciation_dictionary_id': self.pronunciation_dictionary_id,
+                'version_id': 'latest'
+            }]
+            print(f"📚 発音辞書を使用: {self.pronunciation_dictionary_id}")
+
+        return headers, data
+
+    def synthesize(self, text, language='ja', emotion='neutral', output_format=None):
+        """感情・出力形式は未使用（mp3固定。互換性のため受け取る）"""
+        headers, data = self._request(text)
+
+        try:
+            # サーキットブレーカー（エラー応答も失敗として数える）
+            with circuit_breaker.guard('elevenlabs'):
+                # 共有の接続プール（keep-aliveで接続を使い回す）
+                response = http_pool.post(
+                    f"{self.base_url}/text-to-speech/{self.voice}",
+                    headers=headers,
+                    json=data,
+                    read_timeout=60  # 読み込みタイムアウトを60秒に延長（接続は早めに失敗させる）
+                )
+                if response.status_code != 200:
+                    raise Exception(f"ElevenLabs API Error: {response.status_code} - {response.text}")
+
+            print(f"✅ ElevenLabs音声生成成功: {len(response.content)} bytes")
+            return response.content
+
+        except CircuitOpenError as e:
+            print(f"🚫 ElevenLabs音声生成をスキップ: {e}")
+            raise
+        except Exception as e:
+            print(f"❌ ElevenLabs音声生成エラー: {e}")
+            print(f"📊 エラータイプ: {type(e).__name__}")
+            import traceback
+            traceback.print_exc()
+            raise
+
+    def stream(self, text, language='ja', emotion='neutral', chunk_size=4096):
+        headers, data = self._request(text)
+        started = time.perf_counter()
+        first_chunk = True
+
+        # 通常の合成と同じブレーカーを使う（受け取った側での送信エラーはElevenLabsの失敗として数えない）
+        for chunk in circuit_breaker.guard_stream(
+                'elevenlabs_stream', lambda: self._stream_chunks(headers, data, chunk_size), circuit='elevenlabs'):
+            if first_chunk:
+                tracing.record_span('tts_first_byte', started, time.perf_counter(), engine='elevenlabs')
+                first_chunk = False
+            yield chunk
+
+    def _stream_chunks(self, headers, data, chunk_size):
+        """/stream エンドポイントの応答を断片ごとに返すジェネレーター"""
+        # 読み込みタイムアウトは断片ごと（全体ではない）
+        response = http_pool.post(
+            f"{self.base_url}/text-to-speech/{self.voice}/stream",
+            headers=headers,
+            json=data,
+            stream=True,
+            read_timeout=60
+        )
+        try:
+            if response.status_code != 200:
+                raise Exception(f"ElevenLabs API Error: {response.status_code} - {response.text}")
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if chunk:
+                    yield chunk
+        finally:
+            # 途中で読むのをやめた場合も接続をプールに戻す（読み残しがあれば閉じる）
+            response.close()
+
+
+# ====== OpenAI TTS ======
+class OpenAITtsEngine(TtsEngine):
+    """OpenAI TTS（mp3。言語ごとに声を選ぶ）"""
+
+    name = 'openai_tts'
+    label = 'OpenAI TTS'
+
+    def __init__(self, client, model='tts-1', voices=None, default_voice='alloy'):
+        """
+        Args:
+            client: OpenAIクライアント（backends.openai_client）
+            voices: 言語 -> 声（記載のない言語は default_voice）
+        """
+        self.client = client
+        self.model = model
+        self.voices = voices if voices is not None else {'en': 'nova'}
+        self.default_voice = default_voice
+
+    def test_connection(self):
+        return self.client is not None
+
+    def voice(self, language):
+        return self.voices.get(language, self.default_voice)
+
+    def voice_id(self, language, output_format=None):
+        return f"{self.model}:{self.voice(language)}"
+
+    def synthesize(self, text, language='ja', emotion='neutral', output_format=None):
+        if not self.client:
+            raise RuntimeError("OpenAI clientが初期化されていません")
+        with circuit_breaker.guard('openai_tts'):
+            response = self.client.audio.speech.create(model=self.model, voice=self.voice(language), input=text)
+        return response.content
+
+
+# ====== 環境変数からのエンジン作成（アプリケーションとbuild_static_bundles.pyで共通） ======
+def elevenlabs_engine_from_env():
+    """ELEVENLABS_* の設定からElevenLabsエンジンを作成（無効・未設定の場合はNone）"""
+    api_key = os.getenv('ELEVENLABS_API_KEY')
+    if os.getenv('ELEVENLABS_ENABLED', 'false').lower() != 'true' or not api_key:
+        return None
+    return ElevenLabsEngine(
+        api_key,
+        os.getenv('ELEVENLABS_VOICE_ID', '21m00Tcm4TlvDq8ikWAM'),
+        os.getenv('ELEVENLABS_MODEL_ID', 'eleven_multilingual_v2'),
+        os.getenv('ELEVENLABS_PRONUNCIATION_DICTIONARY_ID')  # オプション
+    )
+
+
+def azure_engine_from_env(output_format='mp3', synthesizer_pool_factory=None):
+    """AZURE_SPEECH_* の設定からAzure Speechエンジンを作成（未設定の場合はNone）
+
+    Args:
+        synthesizer_pool_factory: (speech_key, speech_region) -> AzureSynthesizerPool（Noneなら常にREST API）
+    """
+    speech_key = os.getenv('AZURE_SPEECH_KEY')
+    speech_region = os.getenv('AZURE_SPEECH_REGION', 'japaneast')
+    if not speech_key or not speech_region:
+        return None
+    synthesizer_pool = synthesizer_pool_factory(speech_key, speech_region) if synthesizer_pool_factory else None
+    return AzureSpeechEngine(speech_key, speech_region, os.getenv('AZURE_VOICE_NAME', 'ja-JP-NanamiNeural'),
+                             output_format=output_format, synthesizer_pool=synthesizer_pool)
+
+
+# ====== レジストリ ======
+class TtsEngineRegistry:
+    """使用できる音声エンジンの一覧と、全エンジン共通の正規化・キャッシュキー・計測
+
+    synthesize(name, ...) / stream(name, ...) はテキストを正規化してからエンジンを呼び出し、
+    エンジンごとの呼び出し数・失敗数・文字数・音声のバイト数・所要時間を記録する。
+    """
+
+    def __init__(self, readings=None):
+        """
+        Args:
+            readings: 日本語テキストに読み仮名を適用する関数（normalize_japanese_text に渡す）
+        """
+        self.readings = readings
+        self._engines = {}
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def register(self, engine):
+        """エンジンを登録（同じ名前のエンジンは置き換える）"""
+        with self._lock:
+            self._engines[engine.name] = engine
+        return engine
+
+    def get(self, name):
+        return self._engines.get(name)
+
+    def __contains__(self, name):
+        return name in self._engines
+
+    def names(self):
+        return list(self._engines)
+
+    def label(self, name):
+        engine = self._engines.get(name)
+        return engine.label if engine is not None else name
+
+    def _engine(self, name):
+        engine = self._engines.get(name)
+        if engine is None:
+            raise RuntimeError(f"音声エンジン {name} は使用できません")
+        return engine
+
+    def normalize(self, text, language):
+        """エンジンに渡すテキスト（日本語は読み仮名・記号を正規化）"""
+        if language == 'ja':
+            return normalize_japanese_text(text, self.readings)
+        return text
+
+    def voice_id(self, name, language, output_format=None):
+        engine = self._engines.get(name)
+        return engine.voice_id(language, output_format) if engine is not None else ''
+
+    def cache_key(self, name, text, language, emotion, output_format=None):
+        """音声キャッシュのキー（実際に読み上げるテキスト・言語・スタイル・エンジン・声のハッシュ）
+
+        正規化した後のテキストで計算するため、読み仮名辞書を更新すると読みが変わった文だけ
+        キーが変わり、それ以外の音声はそのまま使い続けられる。
+        """
+        return AudioStore.key(self.normalize(text, language), language, emotion, name,
+                              self.voice_id(name, language, output_format))
+
+    def warm_up(self, output_format=None):
+        for engine in list(self._engines.values()):
+            engine.warm_up(output_format)
+
+    def synthesize(self, name, text, language='ja', emotion='neutral', output_format=None):
+        """音声全体のバイト列（失敗時・音声が空の場合は例外）"""
+        engine = self._engine(name)
+        spoken_text = self.normalize(text, language)
+        print(f"🎤 {engine.label}で音声生成中... (言語: {language}, 感情: {emotion})")
+        started = time.perf_counter()
+        try:
+            audio_content = engine.synthesize(spoken_text, language, emotion, output_format)
+            if not audio_content:
+                raise RuntimeError(f"{engine.label}: 音声が空です")
+        except Exception:
+            self._record(name, len(spoken_text), 0, time.perf_counter() - started, False)
+            raise
+        self._record(name, len(spoken_text), len(audio_content), time.perf_counter() - started, True)
+        print(f"✅ {engine.label}音声生成成功: {len(audio_content)} バイト")
+        return audio_content
+
+    def stream(self, name, text, language='ja', emotion='neutral', chunk_size=4096):
+        """音声を届いた分から返すジェネレーター（エンジンが streaming に対応している場合のみ）"""
+        engine = self._engine(name)
+        spoken_text = self.normalize(text, language)
+        print(f"🎤 {engine.label}でストリーミング音声生成中... (言語: {language}, 感情: {emotion})")
+        started = time.perf_counter()
+        audio_bytes = 0
+        try:
+            for chunk in engine.stream(spoken_text, language, emotion, chunk_size=chunk_size):
+                audio_bytes += len(chunk)
+                yield chunk
+        except Exception:
+            self._record(name, len(spoken_text), audio_bytes, time.perf_counter() - started, False)
+            raise
+        self._record(name, len(spoken_text), audio_bytes, time.perf_counter() - started, True)
+
+    def _record(self, name, characters, audio_bytes, seconds, ok):
+        with self._lock:
+            stats = self._stats.setdefault(name, {
+                'requests': 0, 'failures': 0, 'characters': 0, 'audio_bytes': 0, 'seconds': 0.0
+            })
+            stats['requests'] += 1
+            stats['failures'] += 0 if ok else 1
+            stats['characters'] += characters
+            stats['audio_bytes'] += audio_bytes
+            stats['seconds'] += seconds
+
+    def stats(self):
+        with self._lock:
+            counts = {name: dict(stats) for name, stats in self._stats.items()}
+        return {
+            'engines': self.names(),
+            'usage': {name: dict(stats, seconds=round(stats['seconds'], 3)) for name, stats in counts.items()}
+        }
+
+    def collect_metrics(self):
+        """Prometheus形式の行（metrics.registry.add_collector 用）"""
+        usage = self.stats()['usage']
+        lines = []
+        for key, metric, kind, help_text in (
+            ('requests', 'futaba_tts_requests_total', 'counter', 'TTS synthesis requests per engine'),
+            ('failures', 'futaba_tts_failures_total', 'counter', 'Failed TTS synthesis requests per engine'),
+            ('characters', 'futaba_tts_characters_total', 'counter', 'Characters sent to each TTS engine'),
+            ('audio_bytes', 'futaba_tts_audio_bytes_total', 'counter', 'Audio bytes received from each TTS engine'),
+            ('seconds', 'futaba_tts_seconds_total', 'counter', 'Time spent synthesizing per TTS engine')
+        ):
+            lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} {kind}']
+            lines += [f'{metric}{{engine="{name}"}} {stats[key]}' for name, stats in usage.items()]
+        return lines
@@ -0,0 +1,185 @@
+# tts_pipeline.py - 文単位の音声合成パイプライン
+# LLMの生成中に文が完成するたびに音声合成を開始し、完成した音声を順番通りに送り出す
+import threading
+
+# 文の区切り（日本語・英語）
+SENTENCE_TERMINATORS = '。！？!?.'
+# 英語の区切り文字（直後が空白の場合のみ文末とみなす: "3.5" や "e.g." 対策）
+ASCII_TERMINATORS = '.!?'
+# 文末記号の直後に続く閉じ括弧類（前の文に含める）
+CLOSING_CHARS = '」』）)"\'”’'
+
+
+class SentenceSplitter:
+    """ストリーミングで届くテキストを文単位に切り出す"""
+
+    def __init__(self, min_chars=8):
+        """
+        Args:
+            min_chars: これより短い文は次の文と結合する（「はい。」だけの音声合成を避ける）
+        """
+        self.min_chars = min_chars
+        self.buffer = ''
+
+    def feed(self, text):
+        """テキストの差分を受け取り、完成した文のリストを返す"""
+        self.buffer += text
+        buf = self.buffer
+        sentences = []
+        start = 0
+        i = 0
+
+        while i < len(buf):
+            if buf[i] not in SENTENCE_TERMINATORS:
+                i += 1
+                continue
+
+            # 連続する文末記号・閉じ括弧をまとめて前の文に含める
+            end = i + 1
+            while end < len(buf) and (buf[end] in SENTENCE_TERMINATORS or buf[end] in CLOSING_CHARS):
+                end += 1
+
+            # 次の文字が届くまで文末かどうか確定できない
+            if end >= len(buf):
+                break
+
+            # 英語の区切りは直後が空白の場合のみ文末とする
+            if buf[i] in ASCII_TERMINATORS and not buf[end].isspace():
+                i = end
+                continue
+
+            sentence = buf[start:end].strip()
+            if len(sentence) >= self.min_chars:
+                sentences.append(sentence)
+                start = end
+            i = end
+
+        self.buffer = buf[start:]
+        return sentences
+
+    def flush(self):
+        """ストリーム終了時に残りのテキストを返す"""
+        remainder = self.buffer.strip()
+        self.buffer = ''
+        return remainder
+
+
+class SentenceAudioPipeline:
+    """文ごとの音声合成をワーカープールで並行実行し、完成順ではなく文の順番で通知する
+
+    on_segment(index, text, audio) は音声が得られた文ごとに順番通り呼ばれる
+    （合成に失敗した文は飛ばし、indexは通知した数で連番になる）。
+    on_complete(total) は finish() / abort() 後に全ての文の処理が終わった時点で一度だけ呼ばれる。
+    どちらもロックの外で、同時には1スレッドからだけ呼ばれる（送信の遅延・エラーで他の文の合成を止めない）。
+    """
+
+    def __init__(self, executor, synthesize, on_segment, on_complete=None, min_chars=8):
+        self.executor = executor
+        self.synthesize = synthesize
+        self.on_segment = on_segment
+        self.on_complete = on_complete
+        self.splitter = SentenceSplitter(min_chars=min_chars)
+
+        self._lock = threading.Lock()
+        self._results = {}
+        self._submitted = 0
+        self._next_index = 0
+        self._closed = False
+        self._aborted = False
+        self._completed = False
+        self._delivering = False
+        self.delivered = 0
+
+    def feed(self, delta):
+        """生成中のテキスト差分を受け取り、完成した文から音声合成を開始"""
+        for sentence in self.splitter.feed(delta):
+            self._submit(sentence)
+
+    def finish(self, final_text=None):
+        """ストリーム終了: 残りのテキストを合成に回し、以降の投入を締め切る
+
+        Args:
+            final_text: 整形後の最終テキスト。残りがこれに含まれない場合
+                        （途中で切れた文として削除された場合）は合成しない
+        """
+        remainder = self.splitter.flush()
+        if remainder and (final_text is None or remainder in final_text):
+            self._submit(remainder)
+
+        with self._lock:
+            self._closed = True
+        self._drain()
+
+    def abort(self):
+        """エラー時の終了: 未送信の文は送らずに締め切り、送信済みの数でon_completeを呼ぶ
+
+        finish() の後に呼んだ場合は何もしない。合成中の文の結果は捨てる。
+        """
+        self.splitter.flush()
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._aborted = True
+            self._results.clear()
+        self._drain()
+
+    def _submit(self, text):
+        with self._lock:
+            index = self._submitted
+            self._submitted += 1
+        self.executor.submit(self._run, index, text)
+
+    def _run(self, index, text):
+        try:
+            audio = self.synthesize(text)
+        except Exception as e:
+            print(f"❌ 文単位の音声合成エラー: {e}")
+            audio = None
+
+        with self._lock:
+            if self._aborted:
+                return
+            self._results[index] = (text, audio)
+        self._drain()
+
+    def _drain(self):
+        """先頭から連続して揃った分だけ順番通りに通知（通知中の別スレッドがあれば任せる）"""
+        with self._lock:
+            if self._delivering:
+                return
+            self._delivering = True
+
+        while True:
+            with self._lock:
+                if self._aborted or self._next_index not in self._results:
+                    # 通知の担当を降りるのと、次の結果があるかの確認は同じロックの中で行う
+                    self._delivering = False
+                    total = self._take_completion()
+                    break
+                segment_text, segment_audio = self._results.pop(self._next_index)
+                self._next_index += 1
+                if not segment_audio:
+                    continue
+                index = self.delivered
+                self.delivered += 1
+
+            try:
+                self.on_segment(index, segment_text, segment_audio)
+            except Exception as e:
+                print(f"❌ 音声セグメント送信エラー: {e}")
+
+        if total is not None and self.on_complete:
+            try:
+                self.on_complete(total)
+            except Exception as e:
+                print(f"❌ 音声セグメント完了通知エラー: {e}")
+
+    def _take_completion(self):
+        """全ての文の処理が終わっていれば通知数を返す（一度だけ。ロック内で呼び出すこと）"""
+        if self._completed or not self._closed:
+            return None
+        if not self._aborted and self._next_index < self._submitted:
+            return None
+        self._completed = True
+        return self.delivered
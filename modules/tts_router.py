@@ -0,0 +1,215 @@
+# tts_router.py - 音声合成エンジンの選択（直近のレイテンシ・エラー率によるルーティングとヘッジ）
+# エンジンごとに直近の所要時間と成否を記録し、言語のポリシーで許可されたエンジンのうち
+# 正常で速いものから使う（ポリシーの後ろのエンジンほど、十分に速くなければ前に出さない）。
+# 使ったエンジンが直近の所要時間のパーセンタイル（既定 p90）を過ぎても応答しなければ、
+# 次のエンジンにも同じ合成を依頼し（ヘッジ）、先に成功した方を使う。
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+def percentile(sorted_values, q):
+    """昇順に並んだ値のパーセンタイル（最近傍法。値がなければNone）"""
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+class EngineStats:
+    """エンジンの直近の所要時間と成否（件数・経過時間の両方で古いものを捨てる）"""
+
+    def __init__(self, window=50, max_age=300.0):
+        self.max_age = max_age
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds, ok):
+        with self._lock:
+            self._samples.append((time.monotonic(), seconds, ok))
+
+    def snapshot(self):
+        """(試行数, 失敗数, 成功した呼び出しの所要時間の昇順リスト)"""
+        cutoff = time.monotonic() - self.max_age
+        with self._lock:
+            while self._samples and self._samples[0][0] < cutoff:
+                self._samples.popleft()
+            samples = list(self._samples)
+        latencies = sorted(seconds for _, seconds, ok in samples if ok)
+        return len(samples), len(samples) - len(latencies), latencies
+
+
+class TtsRouter:
+    """音声合成エンジンの選択とヘッジ
+
+    call(engines, synthesize) はポリシー順のエンジンのリストを受け取り、
+    order() で並べ替えた順に synthesize(engine) を試して (エンジン, 結果) を返す。
+    失敗した場合（例外・空の結果）は次のエンジンで再試行し、全て失敗したら最後の例外を送出する。
+    """
+
+    def __init__(self, adaptive=True, hedging=True, hedge_percentile=0.9, min_hedge_delay=0.5,
+                 max_error_rate=0.5, min_samples=5, preference_margin=0.25,
+                 window=50, max_age=300.0, max_workers=8):
+        """
+        Args:
+            adaptive: Falseならポリシー順のまま（失敗時の再試行のみ）
+            hedging: Trueなら遅いエンジンへのヘッジを行う
+            hedge_percentile: この所要時間のパーセンタイルを過ぎたらヘッジする
+            min_hedge_delay: ヘッジまでの最短の待ち時間（秒）
+            max_error_rate: 直近のエラー率がこれを超えたエンジンは後回しにする
+            min_samples: 並べ替え・ヘッジに使うのに必要な試行数
+            preference_margin: ポリシーの1つ後ろのエンジンを前に出すのに必要な速さの差（0.25 = 25%）
+            window, max_age: エンジンごとに保持する試行の件数・秒数
+            max_workers: 合成を実行するスレッド数（ヘッジ中は1回の合成で2つ使う）
+        """
+        self.adaptive = adaptive
+        self.hedging = hedging
+        self.hedge_percentile = hedge_percentile
+        self.min_hedge_delay = min_hedge_delay
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.preference_margin = preference_margin
+        self.window = window
+        self.max_age = max_age
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='tts-router')
+        self._lock = threading.Lock()
+        self._engines = {}
+
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.retries = 0
+
+    def engine_stats(self, engine):
+        stats = self._engines.get(engine)
+        if stats is None:
+            with self._lock:
+                stats = self._engines.setdefault(engine, EngineStats(self.window, self.max_age))
+        return stats
+
+    def record(self, engine, seconds, ok):
+        """エンジンの呼び出し結果を記録（ルーター外で呼んだ場合もここに記録する）"""
+        self.engine_stats(engine).record(seconds, ok)
+
+    def _rank(self, index, engine):
+        attempts, errors, latencies = self.engine_stats(engine).snapshot()
+        if attempts >= self.min_samples and errors / attempts > self.max_error_rate:
+            return (1, 0.0, index)
+        if len(latencies) < self.min_samples:
+            # 計測が足りないエンジンは、計測済みのエンジンの後ろ（ポリシー順）
+            return (0, float('inf'), index)
+        return (0, percentile(latencies, 0.5) * (1 + self.preference_margin * index), index)
+
+    def order(self, engines):
+        """ポリシー順のエンジンを、正常なものを先に・所要時間の中央値の短い順に並べ替える"""
+        if not self.adaptive or len(engines) < 2:
+            return list(engines)
+        return [engine for _, _, _, engine in
+                sorted(self._rank(index, engine) + (engine,) for index, engine in enumerate(engines))]
+
+    def hedge_delay(self, engine):
+        """ヘッジするまでの待ち時間（秒。計測が足りなければNone = ヘッジしない）"""
+        _, _, latencies = self.engine_stats(engine).snapshot()
+        if len(latencies) < self.min_samples:
+            return None
+        return max(self.min_hedge_delay, percentile(latencies, self.hedge_percentile))
+
+    def _timed(self, engine, synthesize):
+        started = time.perf_counter()
+        try:
+            result = synthesize(engine)
+            if not result:
+                raise RuntimeError(f"{engine}: 音声が空です")
+        except Exception:
+            self.record(engine, time.perf_counter() - started, False)
+            raise
+        self.record(engine, time.perf_counter() - started, True)
+        return result
+
+    def call(self, engines, synthesize):
+        order = self.order(engines)
+        if not order:
+            raise RuntimeError("使用できる音声エンジンがありません")
+        remaining = list(order)
+        pending = {}
+        hedge_futures = set()
+        last_error = None
+
+        def launch():
+            engine = remaining.pop(0)
+            future = self._executor.submit(self._timed, engine, synthesize)
+            pending[future] = engine
+            return future
+
+        launch()
+        delay = self.hedge_delay(order[0]) if self.hedging and remaining else None
+        hedge_at = time.monotonic() + delay if delay is not None else None
+
+        while pending:
+            timeout = max(hedge_at - time.monotonic(), 0.0) if hedge_at is not None else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # 最初のエンジンが遅い → 次のエンジンにも依頼（遅い方は完了まで実行し、所要時間だけ記録する）
+                hedge_at = None
+                if remaining:
+                    self.hedges += 1
+                    print(f"⏱️ {order[0]} が {delay:.1f}秒以内に応答しないため {remaining[0]} にもヘッジ")
+                    hedge_futures.add(launch())
+                continue
+
+            for future in done:
+                engine = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"❌ 音声エンジン {engine} のエラー: {e}")
+                    last_error = e
+                    continue
+                if future in hedge_futures:
+                    self.hedge_wins += 1
+                return engine, result
+
+            if not pending and remaining:
+                self.retries += 1
+                hedge_at = None
+                launch()
+
+        raise last_error or RuntimeError("音声合成に失敗しました")
+
+    def stats(self):
+        engines = {}
+        for engine, stats in list(self._engines.items()):
+            attempts, errors, latencies = stats.snapshot()
+            engines[engine] = {
+                'samples': attempts,
+                'error_rate': round(errors / attempts, 4) if attempts else 0.0,
+                'p50_seconds': percentile(latencies, 0.5),
+                'p95_seconds': percentile(latencies, 0.95)
+            }
+        return {
+            'adaptive': self.adaptive,
+            'hedging': self.hedging,
+            'engines': engines,
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins,
+            'retries': self.retries
+        }
+
+    def collect_metrics(self):
+        """Prometheus形式の行（metrics.registry.add_collector 用）"""
+        stats = self.stats()
+        lines = [
+            '# HELP futaba_tts_router_hedges_total Hedged duplicate TTS requests',
+            '# TYPE futaba_tts_router_hedges_total counter',
+            f'futaba_tts_router_hedges_total {stats["hedges"]}',
+            '# HELP futaba_tts_router_hedge_wins_total Hedged TTS requests that finished first',
+            '# TYPE futaba_tts_router_hedge_wins_total counter',
+            f'futaba_tts_router_hedge_wins_total {stats["hedge_wins"]}',
+            '# HELP futaba_tts_router_retries_total TTS requests retried on the next engine after a failure',
+            '# TYPE futaba_tts_router_retries_total counter',
+            f'futaba_tts_router_retries_total {stats["retries"]}',
+            '# HELP futaba_tts_engine_error_rate Recent error rate per TTS engine',
+            '# TYPE futaba_tts_engine_error_rate gauge'
+        ]
+        lines += [f'futaba_tts_engine_error_rate{{engine="{engine}"}} {s["error_rate"]}'
+                  for engine, s in stats['engines'].items()]
+        return lines
@@ -490,6 +490,32 @@
         quizDeclined: false  // 🎯 新規追加: クイズを断ったフラグ
     };
     
+    // 🆕 ストリーミング応答の状態管理
+    let streamingState = {
+        messageId: null,
+        messageWrapper: null,
+        text: ''
+    };
+    
+    // 🆕 文単位の音声セグメント再生キュー
+    let segmentPlayback = {
+        messageId: null,
+        segments: {},       // index -> 音声データ
+        nextIndex: 0,       // 次に再生するindex
+        total: null,        // 全セグメント数（audio_segments_doneで確定）
+        waiting: false,     // 次のセグメントの到着待ち
+        waitTimer: null
+    };
+    
+    // 🆕 後送り音声（audio_ready）待ちの応答
+    let pendingAudioResponse = null;
+    
+    // 🆕 ストリーミング中の音声（audio_chunkをMediaSourceに追加しながら再生）
+    let audioStream = null;
+    
+    // 🆕 クリックされたサジェスチョンのID（次のメッセージ送信時にサーバーへ渡す）
+    let pendingSuggestionId = null;
+    
     // アンケート状態管理
     let surveyState = {
         isOpen: false,
@@ -518,7 +544,10 @@
         connectionStatus: 'disconnected',
         conversationCount: 0,
         interactionCount: 0,
-        userTypeSelectionTimer: null  // 🔧 追加: 属性選択UIタイマー
+        userTypeSelectionTimer: null,  // 🔧 追加: 属性選択UIタイマー
+        // 🆕 音声の受け渡し方式: 'url'（既定。音声はHTTPで取得）/ 'binary'（Socket.IOのバイナリ添付）
+        // ページのURLに ?audioTransport=binary を付けると有効になる
+        audioTransport: new URLSearchParams(window.location.search).get('audioTransport') === 'binary' ? 'binary' : 'url'
     };
     
     // 🆕 京セラCERA用: ユーザー属性管理
@@ -844,6 +873,20 @@
         }
     }
     
+    // ====== 🆕 再生できる音声形式 ======
+    // サーバーはこの中からAzure Speechの出力形式を選ぶ（Opusを再生できないブラウザにはmp3）
+    const AUDIO_FORMAT_TYPES = {
+        opus: 'audio/webm; codecs=opus',
+        ogg: 'audio/ogg; codecs=opus',
+        mp3: 'audio/mpeg',
+        wav: 'audio/wav'
+    };
+    
+    function playableAudioFormats() {
+        const probe = document.createElement('audio');
+        return Object.keys(AUDIO_FORMAT_TYPES).filter(name => probe.canPlayType(AUDIO_FORMAT_TYPES[name]) !== '');
+    }
+    
     // ====== Socket.IO接続 ======
     function initializeSocketConnection() {
         if (socket) {
@@ -864,7 +907,12 @@
                 reconnectionDelay: 1000,
                 reconnectionDelayMax: 5000,
                 timeout: 20000,
-                forceNew: true
+                forceNew: true,
+                query: {
+                    audio_transport: appState.audioTransport,  // 🆕 音声の受け渡し方式
+                    audio_formats: playableAudioFormats().join(','),  // 🆕 再生できる音声形式（Azureの出力形式の選択用）
+                    audio_stream: canStreamAudio() ? '1' : '0'  // 🆕 後送り音声を断片で受け取って再生できるか
+                }
             });
             
             window.socket = socket;
@@ -874,6 +922,15 @@
             socket.on('language_changed', handleLanguageUpdate);
             socket.on('greeting', handleGreetingMessage);
             socket.on('response', handleResponseMessage);
+            // 🆕 ストリーミング応答（テキストの逐次表示）
+            socket.on('response_chunk', handleResponseChunk);
+            socket.on('response_done', handleResponseDone);
+            // 🆕 文単位の音声セグメント
+            socket.on('audio_segment', handleAudioSegment);
+            socket.on('audio_segments_done', handleAudioSegmentsDone);
+            // 🆕 テキスト送信後に届く音声
+            socket.on('audio_ready', handleAudioReady);
+            socket.on('audio_chunk', handleAudioChunk);  // 🆕 合成中の音声の断片
             socket.on('transcription', handleTranscription);
             socket.on('error', handleErrorMessage);
             socket.on('conversation_start', handleConversationStart);
@@ -911,12 +968,12 @@
                 addMessage(data.message, false, { skipSound: true });
                 
                 // 感情を送信（音声があればtalking状態）
-                const isTalking = !!data.audio;
+                const isTalking = !!audioSourceOf(data);
                 sendEmotionToAvatar('happy', isTalking, 'survey_thanks');
                 
                 // 音声再生
-                if (data.audio) {
-                    startConversation('happy', data.audio);
+                if (audioSourceOf(data)) {
+                    startConversation('happy', audioSourceOf(data));
                 }
                 
                 // 🔧 v3.0: Masterレベルに昇格（アンケート回答完了時）
@@ -1292,7 +1349,10 @@
                 visitData: visitorManager.visitData,
                 interactionCount: appState.interactionCount,
                 relationshipLevel: relationshipManager.getCurrentLevelStyle(visitorManager.visitData.totalConversations),
-                selectedSuggestions: visitorManager.getSelectedSuggestions()
+                selectedSuggestions: visitorManager.getSelectedSuggestions(),
+                suggestionId: pendingSuggestionId,  // 🆕 サジェスチョンから送信した場合のみ
+                stream: true,  // 🆕 応答テキストをストリーミングで受信
+                deferAudio: true  // 🆕 音声はaudio_readyで後から受信
             });
             
             domElements.messageInput.value = '';
@@ -1818,7 +1878,7 @@
     }
     
     // ====== サジェスチョン表示関数(修正版) ======
-    function showSuggestions(suggestions, targetMessageWrapper = null) {
+    function showSuggestions(suggestions, targetMessageWrapper = null, suggestionIds = []) {
         if (!suggestions || suggestions.length === 0) return;
         
         // 既存のサジェスチョンを削除
@@ -1836,7 +1896,7 @@
             button.style.animationDelay = `${index * 0.1}s`;
             
             button.addEventListener('click', () => {
-                handleSuggestionClick(suggestion);
+                handleSuggestionClick(suggestion, (suggestionIds || [])[index]);
             });
             
             suggestionsContainer.appendChild(button);
@@ -1886,14 +1946,17 @@
     }
     
     // ====== サジェスチョンクリック処理(修正版) ======
-    function handleSuggestionClick(suggestion) {
+    function handleSuggestionClick(suggestion, suggestionId = null) {
         if (appState.isWaitingResponse) return;
         
         visitorManager.addSelectedSuggestion(suggestion);
         
         if (domElements.messageInput) {
             domElements.messageInput.value = suggestion;
+            // 🆕 サジェスチョンIDで事前作成済みの応答を受け取る
+            pendingSuggestionId = suggestionId || null;
             sendTextMessage();
+            pendingSuggestionId = null;
         }
         
         // クリックされたサジェスチョンを非表示にする
@@ -1980,16 +2043,23 @@
                 audioState.recorder.onstop = function() {
                     const audioBlob = new Blob(audioState.chunks, { type: 'audio/webm' });
                     
-                    convertBlobToBase64(audioBlob).then(base64data => {
+                    // 🆕 バイナリ方式ではArrayBufferのまま送信（Base64への変換なし）
+                    const encodeAudio = appState.audioTransport === 'binary' ?
+                        audioBlob.arrayBuffer() : convertBlobToBase64(audioBlob);
+                    
+                    encodeAudio.then(audioPayload => {
                         socket.emit('audio_message', { 
-                            audio: base64data,
+                            audio: audioPayload,
+                            audioFormat: audioBlob.type,
                             language: appState.currentLanguage,
                             visitorId: visitorManager.visitorId,
                             conversationHistory: conversationMemory.getRecentContext(5),
                             visitData: visitorManager.visitData,
                             interactionCount: appState.interactionCount,
                             relationshipLevel: relationshipManager.getCurrentLevelStyle(visitorManager.visitData.totalConversations),
-                            selectedSuggestions: visitorManager.getSelectedSuggestions()
+                            selectedSuggestions: visitorManager.getSelectedSuggestions(),
+                            stream: true,  // 🆕 応答テキストをストリーミングで受信
+                            deferAudio: true  // 🆕 音声はaudio_readyで後から受信
                         });
                     });
                     
@@ -2211,6 +2281,7 @@
         console.log('🎬 会話開始:', emotion);
         
         stopAllAudio();
+        resetSegmentPlayback();
         
         const conversationId = 'conv_' + Date.now() + '_' + Math.random().toString(36).substring(2, 9);
         
@@ -2263,8 +2334,50 @@
         console.log('🔇 すべての音声を停止しました');
     }
     
+    // ====== 🆕 音声の取得元（URL方式 / Base64） ======
+    /**
+     * イベントの音声（URL方式ならaudioUrl、従来方式ならBase64のaudio）
+     */
+    function audioSourceOf(data) {
+        if (!data) return null;
+        if (data.audio instanceof ArrayBuffer) {
+            // 🆕 バイナリ添付 → Blob URL（同じイベントで何度呼ばれても同じURLを返す）
+            if (!data.audioBlobUrl) {
+                const blob = new Blob([data.audio], { type: data.audioFormat || 'audio/mpeg' });
+                data.audioBlobUrl = URL.createObjectURL(blob);
+            }
+            return data.audioBlobUrl;
+        }
+        if (data.audioUrl) return data.audioUrl;
+        if (data.audio && data.audioFormat && !data.audio.startsWith('data:')) {
+            // 🆕 Base64方式でもmp3以外（Opusなど）があるため、形式付きのデータURLにする
+            return `data:${data.audioFormat};base64,${data.audio}`;
+        }
+        return data.audio || null;
+    }
+    
+    function isAudioUrl(audioData) {
+        return typeof audioData === 'string' && /^(https?:|blob:|\/)/.test(audioData);
+    }
+    
+    /**
+     * イベントの音声の長さ（秒）。サーバーが推定した値があればそれを使う
+     */
+    function audioDurationOf(data) {
+        if (data && typeof data.audioDuration === 'number') return data.audioDuration;
+        return estimateAudioDuration(data && data.audio);
+    }
+    
+    /**
+     * URL方式の音声を先に取得しておく（サーバーはimmutableで返すので再生時はHTTPキャッシュから読まれる）
+     */
+    function prefetchAudio(audioData) {
+        if (!isAudioUrl(audioData) || audioData.startsWith('blob:') || typeof fetch !== 'function') return;
+        fetch(audioData).catch(error => console.warn('⚠️ 音声の先読みに失敗:', error));
+    }
+    
     function playAudioWithLipSync(audioData, emotion) {
-        const audioSrc = audioData.startsWith('data:') ? 
+        const audioSrc = (audioData.startsWith('data:') || isAudioUrl(audioData)) ? 
             audioData : `data:audio/mp3;base64,${audioData}`;
         const audio = new Audio(audioSrc);
         audio.muted = audioState.isMuted;
@@ -2289,6 +2402,11 @@
             
             console.log('🎵 音声終了処理開始');
             
+            // 🆕 バイナリ添付から作ったBlob URLは再生が終わったら解放
+            if (audioSrc.startsWith('blob:')) {
+                URL.revokeObjectURL(audioSrc);
+            }
+            
             // 🔧 修正: audioTimersから削除してからnullにする（順序重要）
             if (playbackTimer) {
                 if (conversationState.audioTimers) {
@@ -2300,6 +2418,11 @@
                 playbackTimer = null;
             }
             
+            // 🆕 次の文の音声があれば続けて再生（会話は終了しない）
+            if (continueSegmentPlayback()) {
+                return;
+            }
+            
             if (socket && socket.connected) {
                 socket.emit('conversation_ended');
                 console.log('💬 サーバーに会話終了を通知');
@@ -2456,12 +2579,12 @@
             return;
         }
         
-        if (data && data.audio) {
+        if (audioSourceOf(data)) {
             const emotion = data.emotion || 'happy';
             introductionManager.debugLog(`🎵 音声付き自己紹介: ${emotion}`);
             
             const introTimer = setTimeout(() => {
-                startConversation(emotion, data.audio);
+                startConversation(emotion, audioSourceOf(data));
             }, 200);
             
             const completeTimer = setTimeout(() => {
@@ -2587,10 +2710,10 @@
         appState.conversationCount++;
         
         if (data.suggestions) {
-            showSuggestions(data.suggestions, messageWrapper);
+            showSuggestions(data.suggestions, messageWrapper, data.suggestionIds);
         }
         
-        startConversation(emotion, data.audio);
+        startConversation(emotion, audioSourceOf(data));
         
         // 🐶 属性選択UI表示制御（Futaba用は無効化）
         console.log(`🔍 属性選択チェック: enableUserTypeSelection=${data.enableUserTypeSelection}, userTypeSelected=${userTypeSelected}, isGreeting=${data.isGreeting}`);
@@ -2658,7 +2781,7 @@
         
         const emotion = data.emotion || 'start';
         
-        if (data.audio) {
+        if (audioSourceOf(data)) {
             console.log('🎵 音声付き挨拶メッセージ');
             
             if (isUnityFullyReady()) {
@@ -2691,7 +2814,7 @@
             const messageWrapper = addMessage(data.message, false, { isGreeting: true });
             conversationMemory.addMessage('assistant', data.message, data.emotion);
             appState.conversationCount++;
-            showSuggestions(data.suggestions, messageWrapper);
+            showSuggestions(data.suggestions, messageWrapper, data.suggestionIds);
             
             sendEmotionToAvatar('neutral', false, 'greeting_text_only');
         }
@@ -2714,9 +2837,9 @@
         // 🔧 修正: 通常の応答と同じ音声再生ロジックを使用
         let emotion = data.emotion || 'neutral';
         
-        if (data.audio) {
+        if (audioSourceOf(data)) {
             // 音声再生とリップシンク（感情同期も含む）
-            startConversation(emotion, data.audio);
+            startConversation(emotion, audioSourceOf(data));
         } else {
             console.log('🔇 音声データなし - テキストのみ応答');
             
@@ -2741,7 +2864,7 @@
         // サジェスチョン表示
         if (data.suggestions && data.suggestions.length > 0) {
             setTimeout(() => {
-                showSuggestions(data.suggestions, messageWrapper);
+                showSuggestions(data.suggestions, messageWrapper, data.suggestionIds);
             }, 500);
         }
         
@@ -2767,7 +2890,25 @@
                 media: data.media || null
             };
             
-            const messageWrapper = addMessage(data.message, false, options);
+            let messageWrapper;
+            if (data.messageId && streamingState.messageId === data.messageId && streamingState.messageWrapper) {
+                // 🆕 ストリーミング表示済みのバブルを確定させる
+                messageWrapper = streamingState.messageWrapper;
+                updateMessageText(messageWrapper, data.message);
+                
+                if (options.media) {
+                    const mediaContainer = createMediaContainer(options.media);
+                    const messageBubble = messageWrapper.querySelector('.message-bubble');
+                    if (mediaContainer && messageBubble) {
+                        messageBubble.appendChild(mediaContainer);
+                    }
+                }
+                
+                playSystemSound('end');
+                resetStreamingState();
+            } else {
+                messageWrapper = addMessage(data.message, false, options);
+            }
             
             conversationMemory.addMessage('assistant', data.message, data.emotion);
             appState.conversationCount++;
@@ -2784,31 +2925,29 @@
             
             let emotion = data.emotion || 'neutral';
             
-            if (data.audio) {
-                startConversation(emotion, data.audio);
+            if (data.audioSegmented) {
+                // 🆕 音声は文単位でaudio_segmentとして届く
+                console.log('🔊 文単位の音声セグメントで再生');
+            } else if (data.audioPending) {
+                // 🆕 音声はaudio_readyで後から届く → 表情だけ先に反映
+                pendingAudioResponse = {
+                    messageId: data.messageId,
+                    emotion: emotion,
+                    message: data.message
+                };
+                sendEmotionToAvatar(emotion, false, 'response_audio_pending');
+            } else if (audioSourceOf(data)) {
+                startConversation(emotion, audioSourceOf(data));
             } else {
                 console.log('🔇 音声データなし - テキストのみ応答');
-                
-                sendEmotionToAvatar(emotion, true, 'text_response_start');
-                
-                const textLength = data.message ? data.message.length : 20;
-                const duration = Math.min(Math.max(textLength * 100, 2000), 8000);
-                
-                const endTimer = setTimeout(() => {
-                    sendEmotionToAvatar('neutral', false, 'text_response_end');
-                    console.log(`✅ ${duration}ms後にNeutralに復帰`);
-                }, duration);
-                
-                if (conversationState.audioTimers) {
-                    conversationState.audioTimers.add(endTimer);
-                }
+                playTextOnlyResponse(emotion, data.message);
             }
             
             // 🔧 修正: 音声再生の有無に関わらず、テキスト表示後すぐにサジェスチョンを表示
             if (data.suggestions && data.suggestions.length > 0) {
                 // 常に800ms後にサジェスチョンを表示（ユーザーがテキストを読む時間を確保）
                 const suggestionTimer = setTimeout(() => {
-                    showSuggestions(data.suggestions, messageWrapper);
+                    showSuggestions(data.suggestions, messageWrapper, data.suggestionIds);
                     console.log('📋 サジェスチョン表示完了');
                 }, 800);
                 
@@ -2823,6 +2962,250 @@
         }
     }
     
+    // ====== 🆕 ストリーミング応答 ======
+    function handleResponseChunk(data) {
+        if (streamingState.messageId !== data.messageId) {
+            // 新しい応答の最初の差分 → 空のバブルを作成
+            streamingState.messageId = data.messageId;
+            streamingState.text = '';
+            streamingState.messageWrapper = addMessage('', false, { skipSound: true });
+        }
+        
+        streamingState.text += data.text;
+        updateMessageText(streamingState.messageWrapper, streamingState.text);
+    }
+    
+    function handleResponseDone(data) {
+        if (streamingState.messageId !== data.messageId || !streamingState.messageWrapper) return;
+        
+        // 感情タグ除去・整形済みの全文で置き換える
+        streamingState.text = data.message;
+        updateMessageText(streamingState.messageWrapper, data.message);
+        
+        // 音声が届く前に表情だけ先に反映（文単位の音声を再生中なら口パクを継続）
+        const isTalking = segmentPlayback.messageId === data.messageId;
+        if (isTalking) {
+            conversationState.currentEmotion = data.emotion || 'neutral';
+        }
+        sendEmotionToAvatar(data.emotion || 'neutral', isTalking, 'response_text_done');
+    }
+    
+    function updateMessageText(messageWrapper, text) {
+        if (!messageWrapper) return;
+        
+        const messageDiv = messageWrapper.querySelector('.assistant-message');
+        if (!messageDiv) return;
+        
+        messageDiv.innerHTML = linkifyUrls(escapeHtml(text));
+        
+        if (domElements.chatMessages) {
+            domElements.chatMessages.scrollTop = domElements.chatMessages.scrollHeight;
+        }
+    }
+    
+    function resetStreamingState() {
+        streamingState.messageId = null;
+        streamingState.messageWrapper = null;
+        streamingState.text = '';
+    }
+    
+    function playTextOnlyResponse(emotion, message) {
+        sendEmotionToAvatar(emotion, true, 'text_response_start');
+        
+        const textLength = message ? message.length : 20;
+        const duration = Math.min(Math.max(textLength * 100, 2000), 8000);
+        
+        const endTimer = setTimeout(() => {
+            sendEmotionToAvatar('neutral', false, 'text_response_end');
+            console.log(`✅ ${duration}ms後にNeutralに復帰`);
+        }, duration);
+        
+        if (conversationState.audioTimers) {
+            conversationState.audioTimers.add(endTimer);
+        }
+    }
+    
+    // ====== 🆕 後送り音声の再生 ======
+    function handleAudioReady(data) {
+        if (!pendingAudioResponse || pendingAudioResponse.messageId !== data.messageId) {
+            console.log('⚠️ 対応する応答のない音声を破棄:', data.messageId);
+            return;
+        }
+        
+        const pending = pendingAudioResponse;
+        pendingAudioResponse = null;
+        
+        // 🆕 ストリーミング再生中の音声
+        if (audioStream && audioStream.messageId === data.messageId) {
+            const stream = audioStream;
+            audioStream = null;
+            if (data.streamed) {
+                // 全ての断片が届いた → 残りを追加し終えたら再生終了を伝える
+                stream.done = true;
+                flushAudioStream(stream);
+                return;
+            }
+            // 途中で失敗してサーバーが合成し直した → 音声全体で再生し直す
+            console.log('⚠️ ストリーミング音声が途中で終了 - 音声全体で再生し直します');
+        }
+        
+        if (audioSourceOf(data)) {
+            startConversation(pending.emotion, audioSourceOf(data));
+        } else {
+            console.log('🔇 音声データなし - テキストのみ応答');
+            playTextOnlyResponse(pending.emotion, pending.message);
+        }
+    }
+    
+    // ====== 🆕 ストリーミング音声の再生 ======
+    function canStreamAudio() {
+        return typeof MediaSource !== 'undefined' && MediaSource.isTypeSupported('audio/mpeg');
+    }
+    
+    function handleAudioChunk(data) {
+        if (!pendingAudioResponse || pendingAudioResponse.messageId !== data.messageId) return;
+        
+        if (!audioStream || audioStream.messageId !== data.messageId) {
+            if (data.seq !== 0) return;
+            // 最初の断片 → すぐに再生開始（続きは届いた順にMediaSourceに追加）
+            audioStream = createAudioStream(data.messageId, data.audioFormat || 'audio/mpeg');
+            console.log('🔊 ストリーミング音声の再生開始');
+            startConversation(pendingAudioResponse.emotion, audioStream.url);
+        }
+        audioStream.queue.push(data.chunk);
+        flushAudioStream(audioStream);
+    }
+    
+    function createAudioStream(messageId, mimeType) {
+        const mediaSource = new MediaSource();
+        const stream = {
+            messageId: messageId,
+            mediaSource: mediaSource,
+            sourceBuffer: null,
+            queue: [],
+            done: false,
+            url: URL.createObjectURL(mediaSource)
+        };
+        // audio要素に割り当てられた後に開く
+        mediaSource.addEventListener('sourceopen', () => {
+            stream.sourceBuffer = mediaSource.addSourceBuffer(mimeType);
+            stream.sourceBuffer.addEventListener('updateend', () => flushAudioStream(stream));
+            flushAudioStream(stream);
+        }, { once: true });
+        return stream;
+    }
+    
+    function flushAudioStream(stream) {
+        const buffer = stream.sourceBuffer;
+        if (!buffer || buffer.updating || stream.mediaSource.readyState !== 'open') return;
+        try {
+            if (stream.queue.length > 0) {
+                buffer.appendBuffer(stream.queue.shift());
+            } else if (stream.done) {
+                stream.mediaSource.endOfStream();
+            }
+        } catch (error) {
+            console.error('🔊 ストリーミング音声の追加エラー:', error);
+        }
+    }
+    
+    // ====== 🆕 文単位の音声セグメント再生 ======
+    function handleAudioSegment(data) {
+        console.log(`🔊 音声セグメント受信: #${data.index}`);
+        
+        if (data.index === 0) {
+            // 最初の文 → すぐに再生開始（前回の再生キューはstartConversationでリセット）
+            startConversation('neutral', audioSourceOf(data));
+            segmentPlayback.messageId = data.messageId;
+            segmentPlayback.nextIndex = 1;
+            return;
+        }
+        
+        // 既に終了した応答のセグメントは無視
+        if (segmentPlayback.messageId !== data.messageId) return;
+        
+        segmentPlayback.segments[data.index] = audioSourceOf(data);
+        prefetchAudio(audioSourceOf(data));  // 🆕 再生順が来る前に取得しておく（HTTPキャッシュに残る）
+        if (segmentPlayback.waiting && data.index === segmentPlayback.nextIndex) {
+            continueSegmentPlayback();
+        }
+    }
+    
+    function handleAudioSegmentsDone(data) {
+        if (segmentPlayback.messageId !== data.messageId) {
+            if (data.total === 0) {
+                // 全ての文の音声合成に失敗 → テキストのみの応答として扱う
+                playTextOnlyResponse(conversationState.currentEmotion || 'neutral', streamingState.text);
+            }
+            return;
+        }
+        
+        segmentPlayback.total = data.total;
+        
+        // 再生待ちの状態で全セグメントを再生し終えていれば会話を終了
+        if (segmentPlayback.waiting && segmentPlayback.nextIndex >= data.total) {
+            finishSegmentPlayback();
+        }
+    }
+    
+    /**
+     * 次のセグメントを再生する
+     * @returns {boolean} 会話を継続する場合true（再生開始 or 到着待ち）
+     */
+    function continueSegmentPlayback() {
+        if (!segmentPlayback.messageId) return false;
+        
+        if (segmentPlayback.waitTimer) {
+            clearTimeout(segmentPlayback.waitTimer);
+            segmentPlayback.waitTimer = null;
+        }
+        
+        const index = segmentPlayback.nextIndex;
+        const audioData = segmentPlayback.segments[index];
+        
+        if (audioData) {
+            delete segmentPlayback.segments[index];
+            segmentPlayback.nextIndex = index + 1;
+            segmentPlayback.waiting = false;
+            playAudioWithLipSync(audioData, conversationState.currentEmotion);
+            return true;
+        }
+        
+        if (segmentPlayback.total !== null && index >= segmentPlayback.total) {
+            resetSegmentPlayback();
+            return false;
+        }
+        
+        // 次のセグメントがまだ届いていない → 口パクを止めずに待つ（最大10秒）
+        segmentPlayback.waiting = true;
+        segmentPlayback.waitTimer = setTimeout(() => {
+            console.log('⏰ 音声セグメント待ちタイムアウト');
+            finishSegmentPlayback();
+        }, 10000);
+        return true;
+    }
+    
+    function finishSegmentPlayback() {
+        resetSegmentPlayback();
+        
+        if (socket && socket.connected) {
+            socket.emit('conversation_ended');
+        }
+        endConversation();
+    }
+    
+    function resetSegmentPlayback() {
+        if (segmentPlayback.waitTimer) {
+            clearTimeout(segmentPlayback.waitTimer);
+        }
+        segmentPlayback.messageId = null;
+        segmentPlayback.segments = {};
+        segmentPlayback.nextIndex = 0;
+        segmentPlayback.total = null;
+        segmentPlayback.waiting = false;
+        segmentPlayback.waitTimer = null;
+    }
+    
     function handleTranscription(data) {
         addMessage(data.text, true);
         conversationMemory.addMessage('user', data.text, null);
@@ -3107,8 +3490,8 @@
         sendEmotionToAvatar(data.emotion, true, 'quiz_proposal');
         
         // 音声再生
-        if (data.audio) {
-            startConversation(data.emotion, data.audio);
+        if (audioSourceOf(data)) {
+            startConversation(data.emotion, audioSourceOf(data));
         }
         
         // 選択ボタンを表示
@@ -3134,8 +3517,8 @@
         sendEmotionToAvatar('neutraltalking', true, 'quiz_question');
         
         // 音声再生
-        if (data.audio) {
-            startConversation('neutraltalking', data.audio);
+        if (audioSourceOf(data)) {
+            startConversation('neutraltalking', audioSourceOf(data));
         }
         
         // 選択肢ボタンを表示
@@ -3150,7 +3533,7 @@
      * @returns {number} - 推定される音声の長さ（秒）
      */
     function estimateAudioDuration(audioBase64) {
-        if (!audioBase64) return 0;
+        if (!audioBase64 || isAudioUrl(audioBase64)) return 0;
         
         try {
             // Base64のデータ部分を取得（data:audio/wav;base64, を除く）
@@ -3197,16 +3580,16 @@
             addMessage(explanationMessage, false, {});
             
             // 音声再生
-            if (data.audio) {
-                startConversation(data.emotion, data.audio);
+            if (audioSourceOf(data)) {
+                startConversation(data.emotion, audioSourceOf(data));
             }
             
         }, 1000);
         
         // 🎯 修正: 音声長に基づいて次の処理までの遅延時間を計算
         let delayTime = 3000;  // デフォルト3秒
-        if (data.audio) {
-            const audioDuration = estimateAudioDuration(data.audio);
+        if (audioSourceOf(data)) {
+            const audioDuration = audioDurationOf(data);
             // 音声長 + 余裕時間（2秒）をミリ秒に変換
             delayTime = Math.max(3000, (audioDuration + 2) * 1000);
             console.log(`⏱️ 次の処理まで ${(delayTime / 1000).toFixed(1)}秒待ちます`);
@@ -3244,12 +3627,12 @@
         addMessage(data.message, false, { skipSound: true });
         
         // 感情をアバターに送信（常にhappy、音声があればtalking状態）
-        const isTalking = !!data.audio;
+        const isTalking = !!audioSourceOf(data);
         sendEmotionToAvatar('happy', isTalking, data.allCorrect ? 'quiz_perfect' : 'quiz_finished');
         
         // 音声再生
-        if (data.audio) {
-            startConversation('happy', data.audio);
+        if (audioSourceOf(data)) {
+            startConversation('happy', audioSourceOf(data));
         }
         
         // クイズ完了フラグをlocalStorageに永続化
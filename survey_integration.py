@@ -6,6 +6,8 @@ from datetime import datetime
 from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from modules import backends
+from modules import circuit_breaker
 
 class SurveyManager:
     """アンケート管理クラス (Googleスプレッドシート連携)"""
@@ -29,6 +31,15 @@ class SurveyManager:
     def _initialize(self):
         """Google Sheets APIサービスを初期化"""
         try:
+            # 🧪 スタブバックエンド使用時は認証なしでスタブに接続
+            stub_kwargs = backends.sheets_build_kwargs()
+            if stub_kwargs:
+                self.spreadsheet_id = self.spreadsheet_id or 'stub-spreadsheet'
+                self.service = build('sheets', 'v4', **stub_kwargs)
+                self.enabled = True
+                print(f"🧪 Google Sheets: スタブに接続 ({backends.STUB_BACKENDS_URL})")
+                return
+            
             # 認証情報ファイルの存在確認
             if not os.path.exists(self.credentials_path):
                 print(f"⚠️ 認証情報ファイルが見つかりません: {self.credentials_path}")
@@ -104,13 +115,14 @@ class SurveyManager:
             body = {'values': values}
             
             # スプレッドシートに追加
-            result = self.service.spreadsheets().values().append(
-                spreadsheetId=self.spreadsheet_id,
-                range='シート1!A:I',  # A列からI列まで（9列）🐶 1列増加
-                valueInputOption='RAW',
-                insertDataOption='INSERT_ROWS',
-                body=body
-            ).execute()
+            with circuit_breaker.guard('google_sheets'):
+                result = self.service.spreadsheets().values().append(
+                    spreadsheetId=self.spreadsheet_id,
+                    range='シート1!A:I',  # A列からI列まで（9列）🐶 1列増加
+                    valueInputOption='RAW',
+                    insertDataOption='INSERT_ROWS',
+                    body=body
+                ).execute()
             
             print(f"✅ アンケート保存成功: {result.get('updates').get('updatedRows')}行追加")
             print(f"🐶 アバター: {survey_data.get('avatar_name')}")
@@ -138,10 +150,11 @@ class SurveyManager:
         
         try:
             # スプレッドシートからデータを取得
-            result = self.service.spreadsheets().values().get(
-                spreadsheetId=self.spreadsheet_id,
-                range='シート1!A:H'
-            ).execute()
+            with circuit_breaker.guard('google_sheets'):
+                result = self.service.spreadsheets().values().get(
+                    spreadsheetId=self.spreadsheet_id,
+                    range='シート1!A:H'
+                ).execute()
             
             values = result.get('values', [])
             